@@ -11,6 +11,10 @@ from datetime import datetime
 from config.settings import config
 from database.models import download_manager, user_manager, DownloadStatus
 from bot.services.log_channel import LogChannelService
+from bot.services.ytdlp_pool import ytdlp_pool
+from bot.services.cancellation import CancelToken, cancel_registry
+from bot.services.scheduler import download_scheduler
+from bot.services.quota import quota_tracker
 from bot.utils.helpers import (
     format_file_size, format_duration, extract_platform_from_url,
     detect_file_type, sanitize_filename, create_download_stats
@@ -67,8 +71,25 @@ class EnhancedDownloadHandler:
                 download_id, DownloadStatus.DOWNLOADING
             )
             
-            # Determine download method based on URL
-            success, result = await self._download_file(url, quality, status_msg)
+            # Over quota: wait for the window to free up instead of refusing
+            delay = quota_tracker.retry_in(user_id)
+            if delay > 0:
+                await status_msg.edit_text(
+                    f"🧮 **Download Quota Reached**\n\n"
+                    f"**Platform:** {platform}\n"
+                    f"**Status:** Starts automatically in ~{int(delay // 60) + 1} min"
+                )
+            await quota_tracker.admit(user_id)
+            
+            # Single links take a download slot ahead of any batch
+            await download_scheduler.acquire_interactive()
+            try:
+                # Determine download method based on URL
+                success, result = await self._download_file(url, quality, status_msg)
+            finally:
+                download_scheduler.release_interactive()
+            if success and os.path.exists(result):
+                quota_tracker.record(user_id, nbytes=os.path.getsize(result))
             
             if success:
                 # Upload file and log to channels
@@ -121,8 +142,13 @@ class EnhancedDownloadHandler:
             f"**Status:** Initializing..."
         )
         
+        # /stop cancels this batch (and the item in flight) without touching others
+        token = cancel_registry.register(CancelToken("batch", chat_id=message.chat.id, user_id=user_id))
+        
         # Process each link
         for i, link_data in enumerate(links[start_index-1:], start_index):
+            if token.cancelled:
+                break
             try:
                 # Extract URL and name from link data
                 if isinstance(link_data, list) and len(link_data) >= 2:
@@ -139,9 +165,16 @@ class EnhancedDownloadHandler:
                 )
                 
                 # Download file
-                download_result = await self._process_batch_item(
+                job = token.attach(asyncio.create_task(self._process_batch_item(
                     message, url, name, i, batch_stats
-                )
+                )))
+                try:
+                    download_result = await job
+                except asyncio.CancelledError:
+                    # Stopped by /stop (the token is set); anything else cancelled this handler
+                    if not token.cancelled:
+                        raise
+                    break
                 
                 batch_stats['downloads'].append(download_result)
                 
@@ -158,6 +191,8 @@ class EnhancedDownloadHandler:
                     'error': str(e)
                 })
         
+        cancel_registry.unregister(token)
+        
         # Finalize batch
         batch_stats['end_time'] = datetime.now()
         batch_stats['total_time'] = batch_stats['end_time'] - batch_stats['start_time']
@@ -224,7 +259,7 @@ class EnhancedDownloadHandler:
         """Download ClassPlus DRM content"""
         try:
             # Use existing ClassPlus logic
-            mpd, keys = helper.get_mps_and_keys(url)
+            mpd, keys = await helper.get_mps_and_keys(url)
             if not mpd or not keys:
                 return False, "Failed to get MPD or keys"
             
@@ -254,26 +289,16 @@ class EnhancedDownloadHandler:
             name = f"document_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             
             if "cwmediabkt99" in url:
-                # Use cloudscraper for specific domains
-                import cloudscraper
-                scraper = cloudscraper.create_scraper()
-                response = scraper.get(url.replace(" ", "%20"))
-                
-                if response.status_code == 200:
-                    filename = f"{name}.pdf"
-                    with open(filename, 'wb') as f:
-                        f.write(response.content)
-                    return True, filename
-                else:
-                    return False, f"HTTP {response.status_code}"
+                # Use cloudscraper for specific domains, streamed to disk
+                filename = await helper.scraper_download(url.replace(" ", "%20"), f"{name}.pdf")
+                return True, filename
             else:
                 # Use yt-dlp for other PDFs
-                cmd = f'yt-dlp -o "{name}.pdf" "{url}"'
-                result = os.system(cmd)
-                if result == 0:
+                result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.pdf", url])
+                if result.ok:
                     return True, f"{name}.pdf"
                 else:
-                    return False, f"Download failed with code {result}"
+                    return False, f"Download {result.reason}"
                     
         except Exception as e:
             return False, str(e)
@@ -297,17 +322,15 @@ class EnhancedDownloadHandler:
         """Download generic file"""
         try:
             name = f"file_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            cmd = f'yt-dlp -o "{name}.%(ext)s" "{url}"'
-            
-            result = os.system(cmd)
-            if result == 0:
+            result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.%(ext)s", url])
+            if result.ok:
                 # Find the downloaded file
                 for ext in ['.mp4', '.mkv', '.pdf', '.zip', '.mp3']:
                     if os.path.exists(f"{name}{ext}"):
                         return True, f"{name}{ext}"
                 return False, "Downloaded file not found"
             else:
-                return False, f"Download failed with code {result}"
+                return False, f"Download {result.reason}"
                 
         except Exception as e:
             return False, str(e)
@@ -0,0 +1,299 @@
+"""
+aria2 RPC - One shared aria2c daemon driven over JSON-RPC on localhost
+"""
+import asyncio
+import os
+import secrets
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from config.settings import config
+from bot.services.http_session import http_session
+from bot.services.process_supervisor import process_supervisor
+from bot.services.progress import DownloadProgress, ProgressTracker
+
+class Aria2Error(Exception):
+    """Raised when aria2 fails a download or its RPC interface is unreachable"""
+
+@dataclass
+class Aria2Stats:
+    """Latest known state of one download in the daemon"""
+    gid: str
+    url: str
+    host: str
+    path: str
+    connections_granted: int
+    status: str = "active"
+    completed_bytes: int = 0
+    total_bytes: int = 0
+    speed: int = 0
+    connections: int = 0
+    started: float = field(default_factory=time.time)
+
+class ConnectionBudget:
+    """Grants connections under a global and a per-host ceiling"""
+
+    def __init__(self, total: int, per_host: int):
+        self.total = max(1, total)
+        self.per_host = max(1, per_host)
+        self.in_use = 0
+        self.by_host: Dict[str, int] = {}
+        self._changed: Optional[asyncio.Condition] = None
+
+    def _available(self, host: str) -> int:
+        return min(self.total - self.in_use, self.per_host - self.by_host.get(host, 0))
+
+    async def acquire(self, host: str, want: int) -> int:
+        """Wait until at least one connection is free and take up to ``want``"""
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._available(host) > 0)
+            granted = min(want, self._available(host))
+            self.in_use += granted
+            self.by_host[host] = self.by_host.get(host, 0) + granted
+            return granted
+
+    async def release(self, host: str, granted: int):
+        async with self._changed:
+            self.in_use -= granted
+            self.by_host[host] -= granted
+            if not self.by_host[host]:
+                del self.by_host[host]
+            self._changed.notify_all()
+
+class Aria2Daemon:
+    """Long-running ``aria2c --enable-rpc`` shared by every download
+
+    Instead of one aria2c (with up to 16 connections) per item, all transfers
+    go through a single daemon. Connections are handed out from a global and
+    a per-host budget, so concurrent items share a host's connections rather
+    than multiplying them. Unfinished downloads are kept in a session file
+    and partial files in aria2 control files, so an item retried after a
+    restart continues where it stopped.
+    """
+
+    _STATUS_KEYS = ["gid", "status", "completedLength", "totalLength", "downloadSpeed",
+                    "connections", "errorCode", "errorMessage"]
+
+    def __init__(self, enabled: bool = True, port: int = 6800, max_connections: int = 64,
+                 max_connections_per_host: int = 16, split: int = 16,
+                 session_file: str = "aria2.session", timeout: Optional[float] = None,
+                 stall_timeout: Optional[float] = None, poll_interval: float = 1.0):
+        self.enabled = enabled
+        self.port = port
+        self.split = split
+        self.session_file = os.path.abspath(session_file)
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.poll_interval = poll_interval
+        self.budget = ConnectionBudget(max_connections, max_connections_per_host)
+        self.active: Dict[str, Aria2Stats] = {}  # gid -> stats
+        self._secret = secrets.token_hex(16)
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._resumable: Dict[str, str] = {}  # path -> gid of paused session entry
+
+    @property
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None
+
+    async def start(self) -> bool:
+        """Start the daemon once; returns False when aria2 is unavailable"""
+        if not self.enabled:
+            return False
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.running:
+                return True
+            binary = shutil.which("aria2c")
+            if binary is None:
+                print("⚠️ aria2c not found, downloads will use yt-dlp's own downloader")
+                self.enabled = False
+                return False
+
+            if not os.path.exists(self.session_file):
+                open(self.session_file, "a").close()
+            self._proc = await asyncio.create_subprocess_exec(
+                binary,
+                "--enable-rpc",
+                "--rpc-listen-all=false",
+                f"--rpc-listen-port={self.port}",
+                f"--rpc-secret={self._secret}",
+                f"--input-file={self.session_file}",
+                f"--save-session={self.session_file}",
+                "--save-session-interval=30",
+                # Session entries wait for their item to be retried instead of
+                # restarting on their own with URLs that may have expired
+                "--pause=true",
+                f"--max-concurrent-downloads={self.budget.total}",
+                f"--max-connection-per-server={min(16, self.split)}",
+                "--min-split-size=1M",
+                "--continue=true",
+                "--auto-file-renaming=false",
+                "--allow-overwrite=true",
+                "--file-allocation=none",
+                "--quiet=true",
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True
+            )
+
+            for _ in range(40):
+                try:
+                    await self._call("aria2.getVersion")
+                    break
+                except Aria2Error:
+                    if self._proc.returncode is not None:
+                        break
+                    await asyncio.sleep(0.25)
+            else:
+                await process_supervisor.kill_group(self._proc)
+
+            if not self.running:
+                print("⚠️ aria2c RPC daemon failed to start, downloads will use yt-dlp's own downloader")
+                self.enabled = False
+                self._proc = None
+                return False
+
+            await self._load_resumable()
+            print(f"✅ aria2c RPC daemon listening on 127.0.0.1:{self.port}")
+            return True
+
+    async def _call(self, method: str, *params):
+        session = await http_session.get()
+        payload = {"jsonrpc": "2.0", "id": "bot", "method": method,
+                   "params": [f"token:{self._secret}", *params]}
+        try:
+            async with session.post(f"http://127.0.0.1:{self.port}/jsonrpc", json=payload) as resp:
+                data = await resp.json(content_type=None)
+        except Exception as e:
+            raise Aria2Error(f"aria2 RPC {method} failed: {e}")
+        if "error" in data:
+            raise Aria2Error(data["error"].get("message", str(data["error"])))
+        return data.get("result")
+
+    async def _load_resumable(self):
+        """Index paused session entries by target path"""
+        self._resumable.clear()
+        waiting = await self._call("aria2.tellWaiting", 0, 1000, ["gid", "files"])
+        for entry in waiting or []:
+            files = entry.get("files") or []
+            if files and files[0].get("path"):
+                self._resumable[os.path.abspath(files[0]["path"])] = entry["gid"]
+
+    async def _discard(self, gid: str):
+        for method in ("aria2.forceRemove", "aria2.removeDownloadResult"):
+            try:
+                await self._call(method, gid)
+            except Aria2Error:
+                pass
+
+    async def download(self, url: str, path: str, headers: Optional[Dict[str, str]] = None,
+                       progress: Optional[ProgressTracker] = None) -> str:
+        """Download ``url`` to ``path`` through the daemon and return the path"""
+        if not await self.start():
+            raise Aria2Error("aria2c daemon is not available")
+
+        path = os.path.abspath(path)
+        host = urlparse(url).hostname or ""
+        granted = await self.budget.acquire(host, self.split)
+        gid = None
+        try:
+            stale = self._resumable.pop(path, None)
+            if stale:
+                # Drop the stale entry; the .aria2 control file lets the new one continue
+                await self._discard(stale)
+
+            options = {
+                "dir": os.path.dirname(path),
+                "out": os.path.basename(path),
+                "split": str(granted),
+                "max-connection-per-server": str(min(16, granted)),
+                "pause": "false",
+                "header": [f"{key}: {value}" for key, value in (headers or {}).items()]
+            }
+            gid = await self._call("aria2.addUri", [url], options)
+            stats = Aria2Stats(gid=gid, url=url, host=host, path=path, connections_granted=granted)
+            self.active[gid] = stats
+            return await self._wait(stats, progress)
+        except asyncio.CancelledError:
+            if gid:
+                await asyncio.shield(self._discard(gid))
+            raise
+        finally:
+            if gid:
+                self.active.pop(gid, None)
+                try:
+                    await self._call("aria2.removeDownloadResult", gid)
+                except Aria2Error:
+                    pass
+            await self.budget.release(host, granted)
+
+    async def _wait(self, stats: Aria2Stats, progress: Optional[ProgressTracker]) -> str:
+        deadline = time.time() + self.timeout if self.timeout else None
+        last_advance = time.time()
+        while True:
+            status = await self._call("aria2.tellStatus", stats.gid, self._STATUS_KEYS)
+            completed = int(status.get("completedLength") or 0)
+            if completed > stats.completed_bytes:
+                last_advance = time.time()
+            stats.status = status.get("status", "")
+            stats.completed_bytes = completed
+            stats.total_bytes = int(status.get("totalLength") or 0)
+            stats.speed = int(status.get("downloadSpeed") or 0)
+            stats.connections = int(status.get("connections") or 0)
+
+            if progress is not None and stats.total_bytes:
+                progress.update(DownloadProgress(
+                    downloaded_bytes=stats.completed_bytes,
+                    total_bytes=stats.total_bytes,
+                    speed=float(stats.speed),
+                    eta=int((stats.total_bytes - completed) / stats.speed) if stats.speed else None,
+                    connections=stats.connections,
+                    source="aria2c"
+                ))
+
+            if stats.status == "complete":
+                return stats.path
+            if stats.status in ("error", "removed"):
+                raise Aria2Error(f"aria2 {stats.status}: {status.get('errorMessage') or status.get('errorCode')}")
+            if deadline is not None and time.time() >= deadline:
+                await self._discard(stats.gid)
+                raise Aria2Error("aria2 download timed out")
+            if self.stall_timeout and time.time() - last_advance >= self.stall_timeout:
+                await self._discard(stats.gid)
+                raise Aria2Error("aria2 download stalled (no progress)")
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> List[Aria2Stats]:
+        """Snapshot of the downloads currently running in the daemon"""
+        return list(self.active.values())
+
+    async def close(self):
+        """Save the session and stop the daemon"""
+        if not self.running:
+            return
+        try:
+            await self._call("aria2.saveSession")
+            await self._call("aria2.shutdown")
+            await asyncio.wait_for(self._proc.wait(), 10)
+        except (Aria2Error, asyncio.TimeoutError):
+            await process_supervisor.kill_group(self._proc)
+        self._proc = None
+
+# Global aria2 daemon shared by all video downloads
+aria2_daemon = Aria2Daemon(
+    enabled=config.config.aria2_rpc_enabled,
+    port=config.config.aria2_rpc_port,
+    max_connections=config.config.aria2_max_connections,
+    max_connections_per_host=config.config.aria2_max_connections_per_host,
+    split=config.config.aria2_split,
+    session_file=config.config.aria2_session_file,
+    timeout=config.config.download_timeout,
+    stall_timeout=config.config.progress_stall_timeout
+)
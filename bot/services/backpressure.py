@@ -0,0 +1,88 @@
+"""
+Backpressure - Pauses new downloads while finished files wait for upload
+"""
+import asyncio
+import os
+import time
+from typing import Callable, Optional
+from config.settings import config
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 when unknown)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+class Backpressure:
+    """Admission control between the download and upload stages
+
+    Downloaded files count against ``backlog_budget`` until they are
+    uploaded. New downloads wait while the backlog is over budget or the
+    process RSS is over ``rss_limit``, and resume as uploads drain. The
+    download an upload worker is waiting for is always let through, so a
+    batch can never stall on its own backlog.
+    """
+
+    def __init__(self, backlog_budget: int = 0, rss_limit: int = 0, poll_interval: float = 2.0):
+        self.backlog_budget = backlog_budget
+        self.rss_limit = rss_limit
+        self.poll_interval = poll_interval
+        self.backlog_bytes = 0
+        self.paused_seconds = 0.0
+        self._drained: Optional[asyncio.Event] = None
+
+    def add(self, nbytes: int):
+        """A downloaded file is now waiting for upload"""
+        self.backlog_bytes += nbytes
+
+    def remove(self, nbytes: int):
+        """A waiting file was uploaded or discarded"""
+        self.backlog_bytes = max(0, self.backlog_bytes - nbytes)
+        if self._drained is not None:
+            self._drained.set()
+
+    def over_limit(self) -> Optional[str]:
+        """Why new downloads should wait, or None"""
+        if self.backlog_budget and self.backlog_bytes > self.backlog_budget:
+            return "upload backlog"
+        if self.rss_limit:
+            rss = current_rss()
+            if rss > self.rss_limit:
+                return "memory"
+        return None
+
+    async def wait(self, bypass: Callable[[], bool] = lambda: False) -> float:
+        """Wait until there is room for another download, returns seconds paused"""
+        if bypass() or self.over_limit() is None:
+            return 0.0
+
+        started = time.time()
+        while not bypass() and self.over_limit() is not None:
+            if self._drained is None or self._drained.is_set():
+                self._drained = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._drained.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        paused = time.time() - started
+        self.paused_seconds += paused
+        return paused
+
+    @staticmethod
+    def file_size(path: Optional[str]) -> int:
+        try:
+            return os.path.getsize(path) if path else 0
+        except OSError:
+            return 0
+
+# Global backpressure shared by every batch (disk and memory are shared too)
+backpressure = Backpressure(
+    backlog_budget=config.config.upload_backlog_mb * 1024 * 1024,
+    rss_limit=config.config.max_rss_mb * 1024 * 1024
+)
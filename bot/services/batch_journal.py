@@ -0,0 +1,201 @@
+"""
+Batch Journal - Crash-safe record of batch progress so interrupted batches can resume
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from config.settings import config
+from bot.utils.helpers import normalize_url
+
+def item_fingerprint(link: List[str], quality: str) -> str:
+    """Identity of one parsed link: its name, normalized URL and the requested quality"""
+    name, url = link[0], link[1] if len(link) > 1 else ""
+    key = f"{name.strip().lower()}\n{normalize_url(url)}\n{quality}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+class BatchJournal:
+    """SQLite journal of every batch and the state of each of its items
+
+    A batch row keeps the parsed links and the answers given to /drm, and
+    each item row keeps the latest state of one task (downloading,
+    completed, failed, uploaded, upload_failed) with its file path and the
+    id of the published message. Writes go through SQLite's WAL, so a
+    crash, deploy or /stop restart loses at most the transition in flight.
+    Finished batches are deleted; anything still marked running on startup
+    was interrupted.
+
+    Every published item is also archived by its fingerprint (name,
+    normalized URL and quality) with the message it was published as, and
+    that outlives the batch: when the same list is submitted again, the
+    archived messages are forwarded in bulk and only new or failed items
+    are downloaded.
+    """
+
+    def __init__(self, path: str = "batches.db"):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    user_id INTEGER,
+                    name TEXT,
+                    links TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    start_index INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS items (
+                    batch_id INTEGER NOT NULL REFERENCES batches(id) ON DELETE CASCADE,
+                    idx INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    file_path TEXT,
+                    message_id INTEGER,
+                    error TEXT,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (batch_id, idx)
+                );
+                CREATE TABLE IF NOT EXISTS archive (
+                    item TEXT PRIMARY KEY,
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    created REAL NOT NULL
+                );
+            """)
+        return self._db
+
+    def start_batch(self, chat_id: int, user_id: Optional[int], name: str,
+                    links: List, batch_config: Dict, start_index: int) -> Optional[int]:
+        """Record a new batch and return its id (None when journaling is off)"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO batches (chat_id, user_id, name, links, config, start_index, created, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (chat_id, user_id, name, json.dumps(links), json.dumps(batch_config), start_index, now, now)
+        )
+        return cursor.lastrowid
+
+    def record(self, batch_id: Optional[int], index: int, status: str, file_path: Optional[str] = None,
+               message_id: Optional[int] = None, error: Optional[str] = None):
+        """Store the latest state of one item; unset fields keep their previous value"""
+        if batch_id is None:
+            return
+        now = time.time()
+        db = self._conn()
+        db.execute(
+            "INSERT INTO items (batch_id, idx, status, file_path, message_id, error, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (batch_id, idx) DO UPDATE SET status = excluded.status, "
+            "file_path = COALESCE(excluded.file_path, file_path), "
+            "message_id = COALESCE(excluded.message_id, message_id), "
+            "error = excluded.error, updated = excluded.updated",
+            (batch_id, index, status, file_path, message_id, error, now)
+        )
+        db.execute("UPDATE batches SET updated = ? WHERE id = ?", (now, batch_id))
+
+    def finish_batch(self, batch_id: Optional[int]):
+        """Forget a batch that ran to the end"""
+        if batch_id is None:
+            return
+        db = self._conn()
+        db.execute("DELETE FROM items WHERE batch_id = ?", (batch_id,))
+        db.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+
+    discard = finish_batch
+
+    def archive(self, item: str, chat_id: int, message_id: int):
+        """Remember the message an item was published as"""
+        if not self.enabled:
+            return
+        self._conn().execute(
+            "INSERT OR REPLACE INTO archive (item, chat_id, message_id, created) VALUES (?, ?, ?, ?)",
+            (item, chat_id, message_id, time.time())
+        )
+
+    def archived(self, items: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+        """(chat id, message id) of every archived item among ``items``"""
+        items = list(items)
+        if not self.enabled or not items:
+            return {}
+        found = {}
+        db = self._conn()
+        for start in range(0, len(items), 500):  # below SQLite's host parameter limit
+            chunk = items[start:start + 500]
+            rows = db.execute(
+                f"SELECT item, chat_id, message_id FROM archive WHERE item IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            found.update({row["item"]: (row["chat_id"], row["message_id"]) for row in rows})
+        return found
+
+    def unarchive(self, items: Iterable[str]):
+        """Forget items whose archived message is gone"""
+        if not self.enabled:
+            return
+        self._conn().executemany("DELETE FROM archive WHERE item = ?", [(item,) for item in items])
+
+    def interrupted(self) -> List[Dict]:
+        """Batches that were still running when the bot stopped"""
+        if not self.enabled or not os.path.exists(self.path):
+            return []
+        rows = self._conn().execute(
+            "SELECT b.id, b.chat_id, b.user_id, b.name, b.links, b.start_index, b.updated, "
+            "SUM(i.status = 'uploaded') AS uploaded "
+            "FROM batches b LEFT JOIN items i ON i.batch_id = b.id "
+            "WHERE b.status = 'running' GROUP BY b.id ORDER BY b.id"
+        ).fetchall()
+        return [{
+            "id": row["id"],
+            "chat_id": row["chat_id"],
+            "user_id": row["user_id"],
+            "name": row["name"],
+            "total": len(json.loads(row["links"])) - row["start_index"] + 1,
+            "uploaded": row["uploaded"] or 0,
+            "updated": row["updated"]
+        } for row in rows]
+
+    def load(self, batch_id: int) -> Optional[Dict]:
+        """Everything needed to resume a batch, with item states by index"""
+        db = self._conn()
+        row = db.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        items = db.execute("SELECT * FROM items WHERE batch_id = ?", (batch_id,)).fetchall()
+        return {
+            "id": row["id"],
+            "chat_id": row["chat_id"],
+            "user_id": row["user_id"],
+            "name": row["name"],
+            "links": json.loads(row["links"]),
+            "config": json.loads(row["config"]),
+            "start_index": row["start_index"],
+            "items": {item["idx"]: dict(item) for item in items}
+        }
+
+    def close(self):
+        """Flush the WAL into the database file and close it"""
+        if self._db is not None:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._db.close()
+            self._db = None
+
+# Global journal shared by every batch
+batch_journal = BatchJournal(path=config.config.batch_journal_path)
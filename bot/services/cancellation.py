@@ -0,0 +1,111 @@
+"""
+Cancellation - Cancel tokens for batches and their items
+"""
+import asyncio
+import itertools
+from typing import Callable, Dict, List, Optional, Set
+
+class CancelToken:
+    """Cancels a unit of work and every task and child token registered under it
+
+    A batch gets one token, each of its items a child token. Cancelling a
+    token cancels the asyncio tasks attached to it; the process supervisor
+    and the yt-dlp pool kill the process group of a cancelled download, so
+    yt-dlp, ffmpeg and aria2c stop with it. Cancelling an item leaves its
+    batch running; cancelling a batch cancels all of its items.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, label: str = "", chat_id: Optional[int] = None, user_id: Optional[int] = None,
+                 parent: Optional["CancelToken"] = None):
+        self.id = next(self._ids)
+        self.label = label
+        self.chat_id = chat_id if chat_id is not None or parent is None else parent.chat_id
+        self.user_id = user_id if user_id is not None or parent is None else parent.user_id
+        self.cancelled = False
+        self.reason = ""
+        self._tasks: Set[asyncio.Task] = set()
+        self._children: Set["CancelToken"] = set()
+        self._callbacks: List[Callable[[], None]] = []
+        self._parent = parent
+        if parent is not None:
+            parent._children.add(self)
+
+    def child(self, label: str = "") -> "CancelToken":
+        """Token for one part of this unit of work"""
+        token = CancelToken(label, parent=self)
+        if self.cancelled:
+            token.cancel(self.reason)
+        return token
+
+    def attach(self, task: asyncio.Task) -> asyncio.Task:
+        """Cancel ``task`` together with this token"""
+        if self.cancelled:
+            task.cancel()
+        else:
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return task
+
+    def detach(self, task: asyncio.Task):
+        """Stop cancelling ``task`` with this token"""
+        self._tasks.discard(task)
+        task.remove_done_callback(self._tasks.discard)
+
+    def find(self, label: str) -> Optional["CancelToken"]:
+        """Running child token with the given label"""
+        return next((child for child in self._children if child.label == label), None)
+
+    def on_cancel(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+    def close(self):
+        """Detach a finished child from its parent"""
+        if self._parent is not None:
+            self._parent._children.discard(self)
+
+    def cancel(self, reason: str = "cancelled"):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.reason = reason
+        for callback in self._callbacks:
+            callback()
+        for child in list(self._children):
+            child.cancel(reason)
+        for task in list(self._tasks):
+            task.cancel()
+
+class CancelRegistry:
+    """Running batches by id, so a user can cancel theirs without touching others"""
+
+    def __init__(self):
+        self.tokens: Dict[int, CancelToken] = {}
+
+    def register(self, token: CancelToken) -> CancelToken:
+        self.tokens[token.id] = token
+        return token
+
+    def unregister(self, token: CancelToken):
+        self.tokens.pop(token.id, None)
+
+    def find(self, chat_id: Optional[int] = None, user_id: Optional[int] = None) -> List[CancelToken]:
+        """Running tokens in a chat and/or started by a user"""
+        return [
+            token for token in self.tokens.values()
+            if not token.cancelled
+            and (chat_id is None or token.chat_id == chat_id)
+            and (user_id is None or token.user_id == user_id)
+        ]
+
+    def cancel(self, chat_id: Optional[int] = None, user_id: Optional[int] = None,
+               reason: str = "cancelled") -> List[CancelToken]:
+        """Cancel matching tokens and return them"""
+        tokens = self.find(chat_id, user_id)
+        for token in tokens:
+            token.cancel(reason)
+        return tokens
+
+# Global registry of running batches
+cancel_registry = CancelRegistry()
@@ -0,0 +1,97 @@
+"""
+Adaptive Concurrency - AIMD controller for the number of parallel downloads
+"""
+import asyncio
+import time
+from typing import Optional
+
+class AdaptiveConcurrency:
+    """Additive-increase / multiplicative-decrease download concurrency
+
+    Workers take a slot with ``acquire`` before starting a download and give
+    it back with ``release``. Every interval the owner calls ``adjust`` with
+    the bytes downloaded so far and the upload queue depth. The limit grows
+    by one while aggregate throughput keeps rising and every slot is busy,
+    and is cut by ``decrease`` when downloads fail, throughput stalls or the
+    upload queue keeps growing. It always stays between ``minimum`` and
+    ``maximum``; lowering it never interrupts running downloads.
+    """
+
+    def __init__(self, minimum: int = 2, maximum: int = 8, decrease: float = 0.5,
+                 error_threshold: float = 0.2, growth_margin: float = 0.05):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.decrease = decrease
+        self.error_threshold = error_threshold
+        self.growth_margin = growth_margin
+        self.limit = self.minimum
+        self.peak = self.limit
+        self.active = 0
+        self.throughput = 0.0  # bytes/s over the last interval
+        self._succeeded = 0
+        self._failed = 0
+        self._last_bytes: Optional[int] = None
+        self._last_time = 0.0
+        self._last_backlog = 0
+        self._changed: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def acquire(self):
+        """Wait for a free slot under the current limit"""
+        async with self._condition():
+            await self._changed.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self, success: Optional[bool] = None):
+        """Free a slot; ``success`` is the download outcome (None = no download ran)"""
+        if success is True:
+            self._succeeded += 1
+        elif success is False:
+            self._failed += 1
+        async with self._condition():
+            self.active -= 1
+            self._changed.notify_all()
+
+    async def adjust(self, total_bytes: int, upload_backlog: int) -> Optional[str]:
+        """Re-evaluate the limit; returns why it changed, or None"""
+        now = time.monotonic()
+        if self._last_bytes is None:
+            self._last_bytes, self._last_time = total_bytes, now
+            self._last_backlog = upload_backlog
+            return None
+
+        throughput = max(0, total_bytes - self._last_bytes) / max(now - self._last_time, 1e-6)
+        previous = self.throughput
+        failed = self._failed
+        finished = self._succeeded + failed
+        error_rate = failed / finished if finished else 0.0
+        backlog_growing = upload_backlog > self._last_backlog and upload_backlog >= self.limit
+
+        self._last_bytes, self._last_time = total_bytes, now
+        self._last_backlog = upload_backlog
+        self._succeeded = self._failed = 0
+        self.throughput = throughput
+
+        if failed and error_rate >= self.error_threshold:
+            return await self._set_limit(int(self.limit * self.decrease), f"errors ({error_rate:.0%})")
+        if backlog_growing:
+            return await self._set_limit(int(self.limit * self.decrease), "upload backlog growing")
+        if previous > 0 and throughput == 0 and self.active:
+            return await self._set_limit(int(self.limit * self.decrease), "throughput stalled")
+        if self.active >= self.limit and throughput > previous * (1 + self.growth_margin):
+            return await self._set_limit(self.limit + 1, "throughput rising")
+        return None
+
+    async def _set_limit(self, limit: int, reason: str) -> Optional[str]:
+        limit = min(self.maximum, max(self.minimum, limit))
+        if limit == self.limit:
+            return None
+        self.limit = limit
+        self.peak = max(self.peak, limit)
+        async with self._condition():
+            self._changed.notify_all()
+        return reason
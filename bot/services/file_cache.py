@@ -0,0 +1,238 @@
+"""
+File Cache - Remembers the Telegram file_id of every published item so repeats are resent instantly
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+from pyrogram import Client
+from pyrogram.types import Message
+from config.settings import config
+from bot.utils.helpers import normalize_url
+from bot.services.http_downloader import http_downloader
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Optional backend
+    redis = None
+
+MEDIA_KINDS = ("video", "document", "photo", "audio")
+
+@dataclass
+class CachedFile:
+    """A file already on Telegram"""
+    media: str       # video, document, photo or audio
+    file_id: str
+    file_name: str   # name it was uploaded under; captions use its extension
+    created: float
+
+def cached_file(message: Optional[Message], file_name: str) -> Optional[CachedFile]:
+    """The media of a published message, ready to be sent again"""
+    media = next((m for m in MEDIA_KINDS if getattr(message, m, None)), None)
+    if media is None:
+        return None
+    return CachedFile(media, getattr(message, media).file_id, file_name, time.time())
+
+class FileCache:
+    """Persistent map of (normalized URL, quality, kind) to a Telegram file_id
+
+    When a batch item was published before, by any user or batch, it is
+    sent again by file_id: no download, no upload. Entries older than
+    ``ttl`` seconds (0 = never) are ignored, and ``invalidate`` drops one
+    URL or everything. Entries live in SQLite, or in Redis when
+    ``redis_url`` is set and the client is installed, so several bot
+    instances can share them.
+
+    A second index maps the SHA-256 of a file's bytes to its file_id, so an
+    item whose URL is new but whose content was already published (a CDN
+    mirror, the same PDF shared twice) is sent without uploading it again.
+    """
+
+    def __init__(self, path: str = "file_cache.db", ttl: int = 0, redis_url: str = ""):
+        self.path = path
+        self.ttl = ttl
+        self.redis_url = redis_url if redis is not None else ""
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0  # new URLs whose bytes were already published
+        self._db: Optional[sqlite3.Connection] = None
+        self._redis = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.redis_url)
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files (url TEXT NOT NULL, quality TEXT NOT NULL, kind TEXT NOT NULL, "
+                "media TEXT NOT NULL, file_id TEXT NOT NULL, file_name TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (url, quality, kind))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS contents (digest TEXT PRIMARY KEY, media TEXT NOT NULL, "
+                "file_id TEXT NOT NULL, file_name TEXT NOT NULL, created REAL NOT NULL)"
+            )
+        return self._db
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    @staticmethod
+    def _redis_key(url: str) -> str:
+        return f"file_cache:{url}"
+
+    def _expired(self, entry: CachedFile) -> bool:
+        return bool(self.ttl) and time.time() - entry.created > self.ttl
+
+    async def get(self, url: str, quality: str, kind: str) -> Optional[CachedFile]:
+        """The cached file for an item, or None"""
+        if not self.enabled or not url:
+            return None
+        url = normalize_url(url)
+        try:
+            if self.redis_url:
+                raw = await self._client().hget(self._redis_key(url), f"{quality}|{kind}")
+                entry = CachedFile(**json.loads(raw)) if raw else None
+            else:
+                row = self._conn().execute(
+                    "SELECT media, file_id, file_name, created FROM files WHERE url = ? AND quality = ? AND kind = ?",
+                    (url, quality, kind)
+                ).fetchone()
+                entry = CachedFile(*row) if row else None
+        except Exception as e:
+            print(f"⚠️ File cache lookup failed: {e}")
+            entry = None
+
+        if entry is None or self._expired(entry):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    async def put(self, url: str, quality: str, kind: str, message: Message, file_name: str):
+        """Remember the media of a published message"""
+        entry = cached_file(message, file_name)
+        if not self.enabled or not url or entry is None:
+            return
+        url = normalize_url(url)
+        try:
+            if self.redis_url:
+                key = self._redis_key(url)
+                await self._client().hset(key, f"{quality}|{kind}", json.dumps(asdict(entry)))
+                if self.ttl:
+                    await self._client().expire(key, self.ttl)
+            else:
+                self._conn().execute(
+                    "INSERT OR REPLACE INTO files (url, quality, kind, media, file_id, file_name, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (url, quality, kind, entry.media, entry.file_id, entry.file_name, entry.created)
+                )
+        except Exception as e:
+            print(f"⚠️ File cache store failed: {e}")
+
+    async def invalidate(self, url: Optional[str] = None) -> int:
+        """Forget one URL (every quality and kind), or everything when ``url`` is None"""
+        if not self.enabled:
+            return 0
+        if self.redis_url:
+            client = self._client()
+            if url is not None:
+                return await client.delete(self._redis_key(normalize_url(url)))
+            keys = [key async for key in client.scan_iter(self._redis_key("*"))]
+            return await client.delete(*keys) if keys else 0
+        if url is not None:
+            return self._conn().execute("DELETE FROM files WHERE url = ?", (normalize_url(url),)).rowcount
+        self._conn().execute("DELETE FROM contents")
+        return self._conn().execute("DELETE FROM files").rowcount
+
+    @staticmethod
+    async def digest(path: str) -> str:
+        """SHA-256 of a downloaded file, taken from the download stream when it was hashed there"""
+        streamed = http_downloader.take_digest(path)
+        if streamed:
+            return streamed
+
+        def read():
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            return digest.hexdigest()
+
+        # Written by yt-dlp, aria2c or ranged segments: one sequential read off the loop
+        return await asyncio.to_thread(read)
+
+    async def get_content(self, digest: str) -> Optional[CachedFile]:
+        """The published file with exactly these bytes, or None"""
+        if not self.enabled or not digest:
+            return None
+        try:
+            if self.redis_url:
+                raw = await self._client().get(self._redis_key(f"sha256:{digest}"))
+                entry = CachedFile(**json.loads(raw)) if raw else None
+            else:
+                row = self._conn().execute(
+                    "SELECT media, file_id, file_name, created FROM contents WHERE digest = ?", (digest,)
+                ).fetchone()
+                entry = CachedFile(*row) if row else None
+        except Exception as e:
+            print(f"⚠️ Content index lookup failed: {e}")
+            return None
+        if entry is None or self._expired(entry):
+            return None
+        self.duplicates += 1
+        return entry
+
+    async def put_content(self, digest: str, message: Message, file_name: str):
+        """Remember the file_id a file with these bytes was published as"""
+        entry = cached_file(message, file_name)
+        if not self.enabled or not digest or entry is None:
+            return
+        try:
+            if self.redis_url:
+                await self._client().set(self._redis_key(f"sha256:{digest}"), json.dumps(asdict(entry)),
+                                         ex=self.ttl or None)
+            else:
+                self._conn().execute(
+                    "INSERT OR REPLACE INTO contents (digest, media, file_id, file_name, created) VALUES (?, ?, ?, ?, ?)",
+                    (digest, entry.media, entry.file_id, entry.file_name, entry.created)
+                )
+        except Exception as e:
+            print(f"⚠️ Content index store failed: {e}")
+
+    async def invalidate_content(self, digest: str):
+        if not self.enabled:
+            return
+        if self.redis_url:
+            await self._client().delete(self._redis_key(f"sha256:{digest}"))
+        else:
+            self._conn().execute("DELETE FROM contents WHERE digest = ?", (digest,))
+
+    @staticmethod
+    async def send(bot: Client, chat_id: int, entry: CachedFile, caption: str) -> Message:
+        """Send a cached file by its file_id"""
+        send = getattr(bot, f"send_{entry.media}")  # send_video, send_document, ...
+        return await send(chat_id, entry.file_id, caption=caption)
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+# Global cache shared by every batch
+file_cache = FileCache(
+    path=config.config.file_cache_path,
+    ttl=config.config.file_cache_ttl_days * 24 * 3600,
+    redis_url=config.config.file_cache_redis_url
+)
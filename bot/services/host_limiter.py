@@ -0,0 +1,130 @@
+"""
+Host Limiter - Per-host download slots and a per-host circuit breaker
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlparse
+from config.settings import config
+
+@dataclass
+class HostState:
+    """Slots in use and breaker state for one host"""
+    active: int = 0
+    failures: int = 0          # consecutive failed downloads
+    trips: int = 0             # consecutive times the breaker opened
+    opened_at: Optional[float] = None
+    probing: bool = False      # a half-open probe download is running
+
+class HostLimiter:
+    """Caps concurrent downloads per host and stops hammering failing hosts
+
+    After ``failure_threshold`` consecutive failures a host's breaker opens
+    and its remaining tasks are held back. Once ``cooldown`` seconds pass, a
+    single probe download is let through (half-open): success closes the
+    breaker, failure opens it again. After ``max_trips`` openings in a row the
+    host is considered down and its remaining tasks fail fast.
+    """
+
+    def __init__(self, default_limit: int = 3, limits: Optional[Dict[str, int]] = None,
+                 failure_threshold: int = 3, cooldown: float = 60, max_trips: int = 3):
+        self.default_limit = max(1, default_limit)
+        self.limits = limits or {}
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+        self.hosts: Dict[str, HostState] = {}
+        self._changed: Optional[asyncio.Event] = None
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        host = (urlparse(url if "://" in url else f"https://{url}").hostname or "").lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def _state(self, host: str) -> HostState:
+        return self.hosts.setdefault(host, HostState())
+
+    def limit_for(self, host: str) -> int:
+        for pattern, limit in self.limits.items():
+            if host == pattern or host.endswith(f".{pattern}"):
+                return limit
+        return self.default_limit
+
+    def is_down(self, host: str) -> bool:
+        """The breaker kept reopening; tasks for the host fail fast until the next probe"""
+        state = self._state(host)
+        return bool(self.max_trips) and state.trips >= self.max_trips and self.retry_in(host) > 0
+
+    def retry_in(self, host: str) -> float:
+        """Seconds until an open breaker allows a probe (0 when closed)"""
+        state = self._state(host)
+        if state.opened_at is None:
+            return 0.0
+        return max(0.0, state.opened_at + self.cooldown - time.time())
+
+    def can_start(self, host: str) -> bool:
+        state = self._state(host)
+        if state.opened_at is not None:
+            # Half-open: exactly one probe once the cooldown has passed
+            return not state.probing and state.active == 0 and self.retry_in(host) == 0
+        return state.active < self.limit_for(host)
+
+    def acquire(self, host: str):
+        """Take a slot; call only after ``can_start`` returned True"""
+        state = self._state(host)
+        state.active += 1
+        if state.opened_at is not None:
+            state.probing = True
+
+    def release(self, host: str, success: Optional[bool]):
+        """Free a slot and record the download outcome (None = cancelled, no outcome)"""
+        state = self._state(host)
+        state.active -= 1
+        if success:
+            state.failures = 0
+            state.trips = 0
+            state.opened_at = None
+        elif success is False:
+            state.failures += 1
+            if state.probing or state.failures >= self.failure_threshold:
+                if state.opened_at is None or state.probing:
+                    state.trips += 1
+                    print(f"⚠️ Circuit opened for {host or 'unknown host'} after {state.failures} failures")
+                state.opened_at = time.time()
+        state.probing = False
+        self._notify()
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def wait_for_change(self, timeout: Optional[float] = None):
+        """Sleep until a slot is released (or ``timeout`` passes)"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def snapshot(self) -> Dict[str, str]:
+        """Human readable state per host, for stats"""
+        summary = {}
+        for host, state in self.hosts.items():
+            if state.opened_at is not None:
+                breaker = "down" if self.is_down(host) else f"open ({int(self.retry_in(host))}s)"
+            else:
+                breaker = "closed"
+            summary[host] = f"{state.active}/{self.limit_for(host)} active, breaker {breaker}"
+        return summary
+
+# Global limiter shared by every batch
+host_limiter = HostLimiter(
+    default_limit=config.config.host_concurrency_default,
+    limits=config.config.host_concurrency_limits,
+    failure_threshold=config.config.host_failure_threshold,
+    cooldown=config.config.host_breaker_cooldown,
+    max_trips=config.config.host_breaker_max_trips
+)
@@ -0,0 +1,310 @@
+"""
+HTTP Downloader - Multi-connection ranged downloads for direct file links
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+import aiohttp
+from config.settings import config
+from bot.services.http_session import http_session
+from bot.services.progress import DownloadProgress, ProgressTracker
+
+class HttpDownloadError(Exception):
+    """Raised when a direct HTTP download cannot be completed"""
+
+class FileTooLargeError(HttpDownloadError):
+    """Raised when a download exceeds the configured maximum file size"""
+
+class ChunkWriter:
+    """Coalesces network chunks into one reusable buffer before writing to disk
+
+    Memory held per download is the buffer itself, whatever the file size.
+    Chunks are hashed as they pass, so the file's SHA-256 is known without
+    reading it back.
+    """
+
+    def __init__(self, file, buffer: bytearray, max_bytes: int = 0):
+        self.file = file
+        self.view = memoryview(buffer)
+        self.max_bytes = max_bytes
+        self.filled = 0
+        self.total = 0
+        self.hasher = hashlib.sha256()
+
+    def write(self, chunk: bytes):
+        self.total += len(chunk)
+        if self.max_bytes and self.total > self.max_bytes:
+            raise FileTooLargeError(f"File exceeds the {self.max_bytes // (1024 * 1024)} MB limit")
+        self.hasher.update(chunk)
+        data = memoryview(chunk)
+        while data:
+            take = min(len(data), len(self.view) - self.filled)
+            self.view[self.filled:self.filled + take] = data[:take]
+            self.filled += take
+            data = data[take:]
+            if self.filled == len(self.view):
+                self.flush()
+
+    def flush(self):
+        if self.filled:
+            self.file.write(self.view[:self.filled])
+            self.filled = 0
+
+class _Segment:
+    """Byte range [start, end] of the target file and how much of it is written"""
+
+    def __init__(self, start: int, end: int, written: int = 0):
+        self.start = start
+        self.end = end
+        self.written = written
+
+    @property
+    def done(self) -> bool:
+        return self.start + self.written > self.end
+
+class HttpDownloader:
+    """Downloads plain HTTP(S) files without spawning a process
+
+    When the server supports ranges and the file is large enough, the file is
+    split into ``connections`` byte ranges fetched in parallel and written in
+    place into a preallocated ``<name>.part`` file. Segment offsets are kept in
+    a ``<name>.part.json`` sidecar, so a retry resumes where the previous
+    attempt stopped (as long as the server still reports the same file).
+    Servers without range support get a single streamed request.
+
+    Every path streams in bounded chunks: ``inflight_limit`` caps the bytes a
+    single task holds in memory (split across its range connections) and
+    ``max_file_size`` rejects files that are too large to upload anyway.
+    """
+
+    def __init__(self, connections: int = 4, min_split_size: int = 8 * 1024 * 1024,
+                 chunk_size: int = 1024 * 1024, segment_retries: int = 3,
+                 read_timeout: Optional[float] = 60, inflight_limit: int = 8 * 1024 * 1024,
+                 max_file_size: int = 0):
+        self.connections = max(1, connections)
+        self.min_split_size = min_split_size
+        self.chunk_size = max(64 * 1024, min(chunk_size, inflight_limit or chunk_size))
+        self.segment_retries = segment_retries
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=30, sock_read=read_timeout)
+        self.inflight_limit = inflight_limit
+        self.max_file_size = max_file_size
+        self._buffers: List[bytearray] = []
+        self._digests: Dict[str, str] = {}  # SHA-256 of sequentially streamed files, by path
+
+    def _remember_digest(self, path: str, writer: ChunkWriter):
+        self._digests[os.path.abspath(path)] = writer.hasher.hexdigest()
+        if len(self._digests) > 256:
+            # Nobody asked for the oldest ones
+            self._digests.pop(next(iter(self._digests)))
+
+    def take_digest(self, path: str) -> Optional[str]:
+        """SHA-256 computed while ``path`` was streamed, if it was downloaded in one stream"""
+        return self._digests.pop(os.path.abspath(path), None)
+
+    def _take_buffer(self) -> bytearray:
+        return self._buffers.pop() if self._buffers else bytearray(self.chunk_size)
+
+    def _give_buffer(self, buffer: bytearray):
+        if len(self._buffers) < 8:
+            self._buffers.append(buffer)
+
+    def _check_size(self, total: Optional[int]):
+        if self.max_file_size and total and total > self.max_file_size:
+            raise FileTooLargeError(
+                f"File is {total // (1024 * 1024)} MB, over the {self.max_file_size // (1024 * 1024)} MB limit"
+            )
+
+    async def download(self, url: str, path: str, headers: Optional[Dict[str, str]] = None,
+                       progress: Optional[ProgressTracker] = None) -> str:
+        """Download ``url`` to ``path`` and return the path"""
+        headers = dict(headers or {})
+        session = await http_session.get()
+        async with session.get(url, headers={**headers, "Range": "bytes=0-0"}, timeout=self.timeout) as resp:
+            if resp.status >= 400 and resp.status != 416:
+                raise HttpDownloadError(f"HTTP {resp.status}: {resp.reason}")
+            if resp.status == 200:
+                # Range ignored: this response already carries the whole body
+                return await self.stream_response(resp, path, progress)
+            total = self._total_from_range(resp)
+            validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified") or ""
+
+        if not total:
+            async with session.get(url, headers=headers, timeout=self.timeout) as resp:
+                if resp.status >= 400:
+                    raise HttpDownloadError(f"HTTP {resp.status}: {resp.reason}")
+                return await self.stream_response(resp, path, progress)
+
+        self._check_size(total)
+        return await self._ranged(session, url, headers, path, total, validator, progress)
+
+    @staticmethod
+    def _total_from_range(resp: aiohttp.ClientResponse) -> Optional[int]:
+        content_range = resp.headers.get("Content-Range", "")
+        if resp.status != 206 or "/" not in content_range:
+            return None
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+
+    async def stream_response(self, resp: aiohttp.ClientResponse, path: str,
+                              progress: Optional[ProgressTracker] = None) -> str:
+        """Stream an open response body to ``path`` in bounded chunks"""
+        part_path = f"{path}.part"
+        total = resp.content_length
+        self._check_size(total)
+        started = time.time()
+        buffer = self._take_buffer()
+        try:
+            with open(part_path, "wb") as f:
+                writer = ChunkWriter(f, buffer, self.max_file_size)
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    writer.write(chunk)
+                    self._report(progress, writer.total, total, started)
+                writer.flush()
+        finally:
+            self._give_buffer(buffer)
+        if total is not None and writer.total < total:
+            raise HttpDownloadError(f"Connection closed after {writer.total} of {total} bytes")
+        os.replace(part_path, path)
+        self._remember_digest(path, writer)
+        return path
+
+    def save_chunks(self, chunks: Iterable[bytes], path: str, total: Optional[int] = None) -> str:
+        """Blocking variant of ``stream_response`` for requests-style iterators (run it in a thread)"""
+        self._check_size(total)
+        part_path = f"{path}.part"
+        buffer = bytearray(self.chunk_size)
+        with open(part_path, "wb") as f:
+            writer = ChunkWriter(f, buffer, self.max_file_size)
+            for chunk in chunks:
+                if chunk:
+                    writer.write(chunk)
+            writer.flush()
+        os.replace(part_path, path)
+        self._remember_digest(path, writer)
+        return path
+
+    def _load_segments(self, sidecar: str, url: str, total: int, validator: str) -> Optional[List[_Segment]]:
+        try:
+            with open(sidecar) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("url") != url or state.get("total") != total or state.get("validator") != validator:
+            return None
+        return [_Segment(*segment) for segment in state.get("segments", [])]
+
+    def _save_segments(self, sidecar: str, url: str, total: int, validator: str, segments: List[_Segment]):
+        state = {
+            "url": url,
+            "total": total,
+            "validator": validator,
+            "segments": [[s.start, s.end, s.written] for s in segments]
+        }
+        with open(sidecar, "w") as f:
+            json.dump(state, f)
+
+    def _plan_segments(self, total: int) -> List[_Segment]:
+        count = self.connections if total >= self.min_split_size else 1
+        size = -(-total // count)
+        return [_Segment(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+    async def _ranged(self, session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                      path: str, total: int, validator: str,
+                      progress: Optional[ProgressTracker]) -> str:
+        part_path = f"{path}.part"
+        sidecar = f"{part_path}.json"
+
+        segments = None
+        if os.path.exists(part_path) and os.path.getsize(part_path) == total:
+            segments = self._load_segments(sidecar, url, total, validator)
+        if segments is None:
+            segments = self._plan_segments(total)
+            with open(part_path, "wb") as f:
+                if total and hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(f.fileno(), 0, total)
+                else:
+                    f.truncate(total)
+            self._save_segments(sidecar, url, total, validator, segments)
+
+        started = time.time()
+        resumed = sum(s.written for s in segments)
+        active = sum(1 for s in segments if not s.done) or 1
+        # Keep the task's in-flight bytes under the cap across all connections
+        read_size = max(64 * 1024, min(self.chunk_size, self.inflight_limit // active if self.inflight_limit else self.chunk_size))
+        fd = os.open(part_path, os.O_WRONLY)
+        last_save = time.time()
+
+        def on_chunk():
+            nonlocal last_save
+            downloaded = sum(s.written for s in segments)
+            self._report(progress, downloaded, total, started, resumed)
+            if time.time() - last_save >= 1:
+                self._save_segments(sidecar, url, total, validator, segments)
+                last_save = time.time()
+
+        try:
+            results = await asyncio.gather(
+                *(self._fetch_segment(session, url, headers, fd, segment, read_size, on_chunk)
+                  for segment in segments if not segment.done),
+                return_exceptions=True
+            )
+        finally:
+            os.close(fd)
+            self._save_segments(sidecar, url, total, validator, segments)
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result if isinstance(result, HttpDownloadError) else HttpDownloadError(str(result))
+
+        os.replace(part_path, path)
+        os.remove(sidecar)
+        return path
+
+    async def _fetch_segment(self, session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                             fd: int, segment: _Segment, read_size: int, on_chunk):
+        for attempt in range(self.segment_retries):
+            try:
+                range_header = f"bytes={segment.start + segment.written}-{segment.end}"
+                async with session.get(url, headers={**headers, "Range": range_header}, timeout=self.timeout) as resp:
+                    if resp.status != 206:
+                        raise HttpDownloadError(f"Range request answered with HTTP {resp.status}")
+                    async for chunk in resp.content.iter_chunked(read_size):
+                        chunk = chunk[:segment.end + 1 - segment.start - segment.written]
+                        os.pwrite(fd, chunk, segment.start + segment.written)
+                        segment.written += len(chunk)
+                        on_chunk()
+                if segment.done:
+                    return
+                raise HttpDownloadError(f"Range {range_header} ended early")
+            except (aiohttp.ClientError, asyncio.TimeoutError, HttpDownloadError) as e:
+                if attempt == self.segment_retries - 1:
+                    raise HttpDownloadError(f"Segment {segment.start}-{segment.end} failed: {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    @staticmethod
+    def _report(progress: Optional[ProgressTracker], downloaded: int, total: Optional[int],
+                started: float, resumed: int = 0):
+        if progress is None:
+            return
+        elapsed = time.time() - started
+        speed = (downloaded - resumed) / elapsed if elapsed > 0 else 0.0
+        progress.update(DownloadProgress(
+            downloaded_bytes=downloaded,
+            total_bytes=total,
+            speed=speed,
+            eta=int((total - downloaded) / speed) if total and speed else None,
+            source="http"
+        ))
+
+# Global downloader for direct file links (PDF, images, audio, .ws pages)
+http_downloader = HttpDownloader(
+    connections=config.config.http_download_connections,
+    min_split_size=config.config.http_split_min_size_mb * 1024 * 1024,
+    chunk_size=config.config.chunk_size,
+    read_timeout=config.config.progress_stall_timeout or None,
+    inflight_limit=config.config.max_inflight_mb_per_task * 1024 * 1024,
+    max_file_size=config.config.max_file_size_mb * 1024 * 1024
+)
@@ -0,0 +1,59 @@
+"""
+HTTP Session Manager - One pooled aiohttp session shared by the whole bot
+"""
+import asyncio
+from typing import Optional
+import aiohttp
+from config.settings import config
+
+class HttpSessionManager:
+    """Owns the process-wide aiohttp session
+
+    Reusing one session keeps TCP/TLS connections alive between requests to
+    the same CDN and caches DNS answers, instead of paying for a new
+    connector, lookup and handshake on every item.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 16, dns_ttl: int = 300,
+                 keepalive_timeout: float = 30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Create the session (done at bot start, or lazily on first use)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_ttl,
+                    keepalive_timeout=self.keepalive_timeout
+                )
+                self._session = aiohttp.ClientSession(connector=connector)
+            return self._session
+
+    async def get(self) -> aiohttp.ClientSession:
+        """Return the shared session"""
+        if self._session is not None and not self._session.closed:
+            return self._session
+        return await self.start()
+
+    async def close(self):
+        """Close the session and its pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+# Global session manager
+http_session = HttpSessionManager(
+    limit=config.config.http_pool_limit,
+    limit_per_host=config.config.http_pool_limit_per_host,
+    dns_ttl=config.config.http_dns_cache_ttl,
+    keepalive_timeout=config.config.http_keepalive_timeout
+)
@@ -0,0 +1,76 @@
+"""
+Job Runner - Runs long batch jobs as background tasks instead of on Pyrogram's handler workers
+"""
+import asyncio
+import itertools
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Coroutine, Dict, List, Optional
+
+@dataclass
+class Job:
+    """One submitted job and its lifecycle"""
+    id: int
+    name: str
+    chat_id: Optional[int] = None
+    user_id: Optional[int] = None
+    status: str = "running"    # running, finished, failed, cancelled
+    started: float = field(default_factory=time.time)
+    task: Optional[asyncio.Task] = None
+
+class JobRunner:
+    """Supervises background jobs submitted by command handlers
+
+    Pyrogram dispatches updates on a handful of workers, and a handler that
+    runs a whole batch keeps its worker for hours, so other commands go
+    unanswered. Handlers submit the job here and return right away. A job
+    that raises is logged instead of being lost with its task, and jobs
+    still running at shutdown are cancelled.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+
+    def submit(self, coro: Coroutine, name: str, chat_id: Optional[int] = None,
+               user_id: Optional[int] = None) -> Job:
+        """Start ``coro`` in the background and return its job"""
+        job = Job(id=next(self._ids), name=name, chat_id=chat_id, user_id=user_id)
+        job.task = asyncio.create_task(coro, name=f"job-{job.id}-{name}")
+        job.task.add_done_callback(lambda task: self._finished(job, task))
+        self.jobs[job.id] = job
+        return job
+
+    def _finished(self, job: Job, task: asyncio.Task):
+        self.jobs.pop(job.id, None)
+        if task.cancelled():
+            job.status = "cancelled"
+            return
+        error = task.exception()
+        if error is None:
+            job.status = "finished"
+            return
+        job.status = "failed"
+        print(f"❌ Job {job.name} ({job.id}) failed after {time.time() - job.started:.0f}s: {error}")
+        traceback.print_exception(type(error), error, error.__traceback__)
+
+    def running(self, chat_id: Optional[int] = None, user_id: Optional[int] = None) -> List[Job]:
+        """Running jobs in a chat and/or started by a user"""
+        return [
+            job for job in self.jobs.values()
+            if (chat_id is None or job.chat_id == chat_id)
+            and (user_id is None or job.user_id == user_id)
+        ]
+
+    async def shutdown(self, timeout: float = 5):
+        """Cancel the jobs still running and wait up to ``timeout`` for them to unwind"""
+        tasks = [job.task for job in self.jobs.values()]
+        if not tasks:
+            return
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks, timeout=timeout)
+
+# Global runner for every long-running command
+job_runner = JobRunner()
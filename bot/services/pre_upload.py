@@ -0,0 +1,151 @@
+"""
+Pre-Upload Service - Pushes file parts to Telegram in parallel and publishes in order
+"""
+import asyncio
+import heapq
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+from pyrogram import Client, raw, types, utils
+from pyrogram.errors import FilePartMissing, FloodWait
+
+@dataclass
+class PreparedUpload:
+    """File parts already saved on Telegram, ready to be sent as a message"""
+    kind: str  # document, video, photo
+    path: str
+    file: Any
+    thumb: Any = None
+    thumb_path: Optional[str] = None
+    file_name: Optional[str] = None
+    mime_type: Optional[str] = None
+    duration: int = 0
+    width: int = 0
+    height: int = 0
+
+class PreUploadService:
+    """Uploads several files' bytes at once while the send calls stay ordered
+
+    ``save_file`` does the heavy part of an upload (pushing the parts), so it
+    runs on up to ``lanes`` files concurrently. Lanes are granted to the lowest
+    waiting index first, which keeps the file the publisher needs next at the
+    front of the line. ``publish`` then issues the cheap SendMedia call.
+    """
+
+    def __init__(self, client: Client, lanes: int = 1):
+        self.client = client
+        self.lanes = max(1, lanes)
+        self._free = self.lanes
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Parallel pre-upload only makes sense with more than one lane"""
+        return self.lanes > 1
+
+    async def _acquire(self, index: int):
+        if self._free > 0 and not self._waiting:
+            self._free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._counter += 1
+        heapq.heappush(self._waiting, (index, self._counter, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+
+    async def prepare(self, index: int, kind: str, path: str, thumb_path: Optional[str] = None,
+                      file_name: Optional[str] = None, duration: int = 0,
+                      width: int = 0, height: int = 0) -> PreparedUpload:
+        """Save the file (and thumbnail) parts on Telegram without sending a message"""
+        await self._acquire(index)
+        try:
+            file = await self._save(path)
+            thumb = None
+            if thumb_path and os.path.isfile(thumb_path):
+                thumb = await self._save(thumb_path)
+        finally:
+            self._release()
+
+        return PreparedUpload(
+            kind=kind,
+            path=path,
+            file=file,
+            thumb=thumb,
+            thumb_path=thumb_path,
+            file_name=file_name or os.path.basename(path),
+            mime_type=self.client.guess_mime_type(path),
+            duration=duration,
+            width=width,
+            height=height
+        )
+
+    async def _save(self, path: str, file_id: int = None, file_part: int = 0):
+        while True:
+            try:
+                return await self.client.save_file(path, file_id=file_id, file_part=file_part)
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+
+    def _build_media(self, prepared: PreparedUpload):
+        if prepared.kind == "photo":
+            return raw.types.InputMediaUploadedPhoto(file=prepared.file)
+
+        attributes = [raw.types.DocumentAttributeFilename(file_name=prepared.file_name)]
+        if prepared.kind == "video":
+            attributes.insert(0, raw.types.DocumentAttributeVideo(
+                supports_streaming=True,
+                duration=prepared.duration,
+                w=prepared.width,
+                h=prepared.height
+            ))
+
+        return raw.types.InputMediaUploadedDocument(
+            mime_type=prepared.mime_type or ("video/mp4" if prepared.kind == "video" else "application/zip"),
+            file=prepared.file,
+            thumb=prepared.thumb,
+            attributes=attributes
+        )
+
+    async def publish(self, chat_id: int, prepared: PreparedUpload, caption: str = "",
+                      reply_markup=None) -> Optional[types.Message]:
+        """Send a prepared upload as a message in the target chat"""
+        media = self._build_media(prepared)
+
+        while True:
+            try:
+                r = await self.client.invoke(
+                    raw.functions.messages.SendMedia(
+                        peer=await self.client.resolve_peer(chat_id),
+                        media=media,
+                        random_id=self.client.rnd_id(),
+                        reply_markup=await reply_markup.write(self.client) if reply_markup else None,
+                        **await utils.parse_text_entities(self.client, caption, None, None)
+                    )
+                )
+            except FilePartMissing as e:
+                # Telegram dropped a part; re-send just that part and try again
+                await self._save(prepared.path, file_id=prepared.file.id, file_part=e.value)
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            else:
+                for update in r.updates:
+                    if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                        return await types.Message._parse(
+                            self.client, update.message,
+                            {u.id: u for u in r.users},
+                            {c.id: c for c in r.chats}
+                        )
+                return None
@@ -0,0 +1,196 @@
+"""
+Process Supervisor - Runs yt-dlp/ffmpeg/aria2c without blocking the event loop
+"""
+import asyncio
+import os
+import re
+import signal
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+from config.settings import config
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_LINE_SPLIT = re.compile(r"[\r\n]+")
+
+@dataclass
+class ProcessResult:
+    """Outcome of a supervised process"""
+    returncode: Optional[int]
+    output: str = ""
+    timed_out: bool = False
+    stalled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not (self.timed_out or self.stalled)
+
+    @property
+    def reason(self) -> str:
+        """Short human readable failure reason"""
+        if self.timed_out:
+            return "timed out"
+        if self.stalled:
+            return "stalled (no progress)"
+        return f"exited with code {self.returncode}"
+
+class ProcessSupervisor:
+    """Spawns processes with exec (no shell) in their own process group
+
+    Every process gets a wall-clock timeout and a stall timeout (no output for
+    too long). When the caller parses progress, a shorter progress stall
+    timeout also fires if progress lines keep arriving without the download
+    moving forward (e.g. a transfer sitting at 0 B/s). On timeout, stall or
+    task cancellation the whole process group is killed, so helpers like
+    ffmpeg or aria2c started by yt-dlp die with it.
+    Optional RLIMIT caps bound the memory and CPU time of each process.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, stall_timeout: Optional[float] = None,
+                 progress_stall_timeout: Optional[float] = None, memory_limit_mb: int = 0, cpu_limit_seconds: int = 0, kill_grace: float = 5.0,
+                 output_lines: int = 50):
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.progress_stall_timeout = progress_stall_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.cpu_limit_seconds = cpu_limit_seconds
+        self.kill_grace = kill_grace
+        self.output_lines = output_lines
+        self.running = {}  # pid -> argv
+
+    def _apply_limits(self, pid: int):
+        """Cap memory and CPU time of the freshly spawned process (inherited by its children)"""
+        if resource is None or not hasattr(resource, "prlimit"):
+            return
+        try:
+            if self.memory_limit_mb > 0:
+                limit = self.memory_limit_mb * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+            if self.cpu_limit_seconds > 0:
+                resource.prlimit(pid, resource.RLIMIT_CPU, (self.cpu_limit_seconds, self.cpu_limit_seconds))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not apply resource limits to {pid}: {e}")
+
+    async def kill_group(self, proc: asyncio.subprocess.Process):
+        """Terminate the whole process group, escalating to SIGKILL"""
+        if proc.returncode is not None:
+            return
+        for sig, wait in ((signal.SIGTERM, self.kill_grace), (signal.SIGKILL, None)):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(proc.wait(), wait)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    async def run(self, argv: Sequence[str], timeout: Optional[float] = ...,
+                  stall_timeout: Optional[float] = ..., progress_stall_timeout: Optional[float] = ...,
+                  cwd: Optional[str] = None,
+                  on_output: Optional[Callable[[str], Optional[bool]]] = None) -> ProcessResult:
+        """Run a command and wait for it without blocking the event loop
+
+        ``on_output`` receives every output line (stdout and stderr, split on
+        both ``\\r`` and ``\\n`` so progress lines arrive as they are drawn).
+        It returns ``True`` for a progress line that moved forward, ``False``
+        for a progress line that did not, and ``None`` for any other output.
+        While the latest line was a progress line, the progress stall timer
+        runs from the last forward movement.
+        """
+        timeout = self.timeout if timeout is ... else timeout
+        stall_timeout = self.stall_timeout if stall_timeout is ... else stall_timeout
+        if progress_stall_timeout is ...:
+            progress_stall_timeout = self.progress_stall_timeout
+
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=cwd,
+            start_new_session=True
+        )
+        self.running[proc.pid] = list(argv)
+        self._apply_limits(proc.pid)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        last_activity = loop.time()
+        last_advance = last_activity
+        in_progress = False
+        tail = deque(maxlen=self.output_lines)
+        pending = ""
+        result = ProcessResult(returncode=None)
+
+        try:
+            while True:
+                now = loop.time()
+                waits = []
+                if deadline is not None:
+                    waits.append(deadline - now)
+                if stall_timeout:
+                    waits.append(last_activity + stall_timeout - now)
+                if progress_stall_timeout and in_progress:
+                    waits.append(last_advance + progress_stall_timeout - now)
+                wait = min(waits) if waits else None
+
+                if wait is not None and wait <= 0:
+                    if deadline is not None and now >= deadline:
+                        result.timed_out = True
+                    else:
+                        result.stalled = True
+                    await self.kill_group(proc)
+                    break
+
+                try:
+                    chunk = await asyncio.wait_for(proc.stdout.read(65536), wait)
+                except asyncio.TimeoutError:
+                    continue
+                if not chunk:
+                    break
+
+                pending += chunk.decode(errors="replace")
+                *lines, pending = _LINE_SPLIT.split(pending)
+                last_activity = loop.time()
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    tail.append(line)
+                    advanced = on_output(line) if on_output is not None else None
+                    if advanced is False:
+                        if not in_progress:
+                            last_advance = last_activity
+                        in_progress = True
+                    else:
+                        in_progress = advanced is True
+                        last_advance = last_activity
+
+            if pending.strip():
+                tail.append(pending)
+                if on_output is not None:
+                    on_output(pending)
+            result.returncode = await proc.wait()
+
+        except asyncio.CancelledError:
+            await self.kill_group(proc)
+            raise
+        finally:
+            self.running.pop(proc.pid, None)
+
+        result.output = "\n".join(tail)
+        return result
+
+# Global supervisor used for every download/merge subprocess
+process_supervisor = ProcessSupervisor(
+    timeout=config.config.download_timeout,
+    stall_timeout=config.config.process_stall_timeout,
+    progress_stall_timeout=config.config.progress_stall_timeout,
+    memory_limit_mb=config.config.process_memory_limit_mb,
+    cpu_limit_seconds=config.config.process_cpu_limit_seconds
+)
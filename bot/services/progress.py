@@ -0,0 +1,194 @@
+"""
+Download Progress - Parses yt-dlp/aria2c/ffmpeg output into structured progress events
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+_UNITS = {
+    "": 1, "b": 1,
+    "k": 1000, "kb": 1000, "kib": 1024,
+    "m": 1000 ** 2, "mb": 1000 ** 2, "mib": 1024 ** 2,
+    "g": 1000 ** 3, "gb": 1000 ** 3, "gib": 1024 ** 3,
+    "t": 1000 ** 4, "tb": 1000 ** 4, "tib": 1024 ** 4,
+}
+
+_SIZE = r"~?\s*(?P<{name}>[\d.]+)\s*(?P<{name}_unit>[KMGT]?i?B)"
+
+# [download]  45.3% of ~ 1.20GiB at  2.50MiB/s ETA 00:30 (frag 12/100)
+_YTDLP_RE = re.compile(
+    r"\[download\]\s+(?P<percent>[\d.]+)%\s+of\s+" + _SIZE.format(name="total")
+    + r"(?:\s+at\s+(?:" + _SIZE.format(name="speed") + r"/s|Unknown B/s|\s*Unknown speed))?"
+    + r"(?:\s+ETA\s+(?P<eta>[\d:]+|Unknown|--:--(?::--)?))?"
+    + r"(?:.*?\(frag\s+(?P<frag>\d+)/(?P<frags>\d+)\))?",
+    re.IGNORECASE
+)
+
+# [download]   1.00MiB at  500.00KiB/s (00:00:02)  -- total size unknown
+_YTDLP_NOTOTAL_RE = re.compile(
+    r"\[download\]\s+" + _SIZE.format(name="done") + r"\s+at\s+" + _SIZE.format(name="speed") + r"/s",
+    re.IGNORECASE
+)
+
+# [#7ae3f1 12MiB/345MiB(3%) CN:16 DL:5.1MiB ETA:1m5s]
+_ARIA2_RE = re.compile(
+    r"\[#\w+\s+" + _SIZE.format(name="done") + r"/" + _SIZE.format(name="total")
+    + r"(?:\(\d+%\))?(?:\s+CN:\d+)?(?:\s+DL:" + _SIZE.format(name="speed") + r")?"
+    + r"(?:\s+ETA:(?P<eta>[\dhms]+))?",
+    re.IGNORECASE
+)
+
+# frame= 1234 fps= 50 q=-1.0 size=   12345kB time=00:01:02.00 bitrate= ... speed=1.2x
+_FFMPEG_RE = re.compile(r"size=\s*(?P<done>\d+)\s*(?P<done_unit>[kKmM]i?B)\s+time=", re.IGNORECASE)
+
+def _to_bytes(value: Optional[str], unit: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    unit = (unit or "").lower()
+    # ffmpeg reports kB but means KiB
+    if unit == "kb" and value.isdigit():
+        unit = "kib"
+    try:
+        return int(float(value) * _UNITS.get(unit, 1))
+    except ValueError:
+        return None
+
+def _to_seconds(eta: Optional[str]) -> Optional[int]:
+    if not eta or not any(c.isdigit() for c in eta):
+        return None
+    if ":" in eta:
+        seconds = 0
+        for part in eta.split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    seconds = 0
+    for amount, unit in re.findall(r"(\d+)([hms])", eta):
+        seconds += int(amount) * {"h": 3600, "m": 60, "s": 1}[unit]
+    return seconds
+
+@dataclass
+class DownloadProgress:
+    """One progress event for a download"""
+    downloaded_bytes: int = 0
+    total_bytes: Optional[int] = None
+    speed: float = 0.0  # bytes per second
+    eta: Optional[int] = None  # seconds
+    fragment_index: Optional[int] = None
+    fragment_count: Optional[int] = None
+    connections: Optional[int] = None
+    source: str = ""  # yt-dlp, aria2c, ffmpeg, http
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def percent(self) -> Optional[float]:
+        if not self.total_bytes:
+            return None
+        return min(100.0, self.downloaded_bytes * 100 / self.total_bytes)
+
+def parse_progress_line(line: str) -> Optional[DownloadProgress]:
+    """Parse one output line, returns None when it is not a progress line"""
+    match = _YTDLP_RE.search(line)
+    if match:
+        total = _to_bytes(match.group("total"), match.group("total_unit"))
+        percent = float(match.group("percent"))
+        return DownloadProgress(
+            downloaded_bytes=int(total * percent / 100) if total else 0,
+            total_bytes=total,
+            speed=float(_to_bytes(match.group("speed"), match.group("speed_unit")) or 0),
+            eta=_to_seconds(match.group("eta")),
+            fragment_index=int(match.group("frag")) if match.group("frag") else None,
+            fragment_count=int(match.group("frags")) if match.group("frags") else None,
+            source="yt-dlp"
+        )
+
+    match = _YTDLP_NOTOTAL_RE.search(line)
+    if match:
+        return DownloadProgress(
+            downloaded_bytes=_to_bytes(match.group("done"), match.group("done_unit")) or 0,
+            speed=float(_to_bytes(match.group("speed"), match.group("speed_unit")) or 0),
+            source="yt-dlp"
+        )
+
+    match = _ARIA2_RE.search(line)
+    if match:
+        total = _to_bytes(match.group("total"), match.group("total_unit"))
+        return DownloadProgress(
+            downloaded_bytes=_to_bytes(match.group("done"), match.group("done_unit")) or 0,
+            total_bytes=total or None,
+            speed=float(_to_bytes(match.group("speed"), match.group("speed_unit")) or 0),
+            eta=_to_seconds(match.group("eta")),
+            source="aria2c"
+        )
+
+    match = _FFMPEG_RE.search(line)
+    if match:
+        return DownloadProgress(
+            downloaded_bytes=_to_bytes(match.group("done"), match.group("done_unit")) or 0,
+            source="ffmpeg"
+        )
+
+    return None
+
+def progress_from_hook(status: dict) -> Optional[DownloadProgress]:
+    """Build a progress event from a yt-dlp ``progress_hooks`` status dict"""
+    if status.get("status") != "downloading":
+        return None
+    return DownloadProgress(
+        downloaded_bytes=int(status.get("downloaded_bytes") or 0),
+        total_bytes=int(status.get("total_bytes") or status.get("total_bytes_estimate") or 0) or None,
+        speed=float(status.get("speed") or 0),
+        eta=int(status["eta"]) if status.get("eta") is not None else None,
+        fragment_index=status.get("fragment_index"),
+        fragment_count=status.get("fragment_count"),
+        source="yt-dlp"
+    )
+
+class ProgressTracker:
+    """Feeds process output into progress events for one download task
+
+    ``feed`` is meant to be passed as ``on_output`` to the process supervisor:
+    it returns ``True`` when a progress line shows forward movement, ``False``
+    for a progress line that shows none (0 B/s) and ``None`` for other output.
+    """
+
+    def __init__(self, on_event: Optional[Callable[[DownloadProgress], None]] = None):
+        self.on_event = on_event
+        self.current: Optional[DownloadProgress] = None
+        self.last_advance = time.time()
+
+    def _advanced(self, progress: DownloadProgress) -> bool:
+        previous = self.current
+        if previous is None or previous.source != progress.source:
+            return progress.downloaded_bytes > 0 or bool(progress.fragment_index)
+        if progress.downloaded_bytes > previous.downloaded_bytes:
+            return True
+        if progress.total_bytes != previous.total_bytes:
+            # A new file (e.g. audio after video) restarts the counters
+            return True
+        return (progress.fragment_index or 0) > (previous.fragment_index or 0)
+
+    def feed(self, line: str) -> Optional[bool]:
+        progress = parse_progress_line(line)
+        if progress is None:
+            return None
+        return self.update(progress)
+
+    def update(self, progress: DownloadProgress) -> bool:
+        """Record a progress event, returns whether the download moved forward"""
+        advanced = self._advanced(progress)
+        if advanced:
+            self.last_advance = progress.timestamp
+        self.current = progress
+
+        if self.on_event:
+            try:
+                self.on_event(progress)
+            except Exception as e:
+                print(f"⚠️ Progress listener failed: {e}")
+        return advanced
+
+    @property
+    def stalled_for(self) -> float:
+        """Seconds since the download last moved forward"""
+        return time.time() - self.last_advance
@@ -0,0 +1,148 @@
+"""
+Quota - Per-user item and byte quotas over sliding windows, enforced per download
+"""
+import asyncio
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from config.settings import config
+
+HOUR = 3600
+DAY = 24 * HOUR
+BUCKET = 60  # usage is kept per minute
+
+class QuotaTracker:
+    """Counts each user's downloads and bytes per minute and defers work over quota
+
+    Limits come from ``config.get_download_limits``: items and megabytes per
+    hour and per day, with 0 meaning no limit. Usage is stored as one row
+    per user and minute (a day of heavy use is at most 1440 rows per user),
+    so the sliding windows survive a restart. A batch item over quota waits
+    until enough usage ages out of the window instead of failing, and the
+    owner is never limited.
+    """
+
+    def __init__(self, path: str = "quota.db", limits: Optional[Callable[[int], Dict]] = None,
+                 exempt: Tuple[int, ...] = ()):
+        self.path = path
+        self.limits = limits or config.get_download_limits
+        self.exempt = set(exempt)
+        self.usage: Dict[int, Dict[int, List[int]]] = {}  # user -> minute -> [items, bytes]
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS usage (user_id INTEGER NOT NULL, minute INTEGER NOT NULL, "
+                "items INTEGER NOT NULL, bytes INTEGER NOT NULL, PRIMARY KEY (user_id, minute))"
+            )
+            self._db.execute("DELETE FROM usage WHERE minute < ?", (self._minute() - DAY // BUCKET,))
+        return self._db
+
+    @staticmethod
+    def _minute(now: Optional[float] = None) -> int:
+        return int((now or time.time()) // BUCKET)
+
+    def _buckets(self, user_id: int) -> Dict[int, List[int]]:
+        """The user's minutes within the last day, loaded from the store once"""
+        buckets = self.usage.get(user_id)
+        if buckets is None:
+            buckets = {}
+            db = self._conn()
+            if db is not None:
+                rows = db.execute("SELECT minute, items, bytes FROM usage WHERE user_id = ? AND minute >= ?",
+                                  (user_id, self._minute() - DAY // BUCKET))
+                buckets = {minute: [items, size] for minute, items, size in rows}
+            self.usage[user_id] = buckets
+        oldest = self._minute() - DAY // BUCKET
+        for minute in [m for m in buckets if m < oldest]:
+            del buckets[minute]
+        return buckets
+
+    def record(self, user_id: int, items: int = 0, nbytes: int = 0):
+        """Count downloads started and bytes downloaded for a user"""
+        if user_id in self.exempt or not (items or nbytes):
+            return
+        minute = self._minute()
+        bucket = self._buckets(user_id).setdefault(minute, [0, 0])
+        bucket[0] += items
+        bucket[1] += nbytes
+        db = self._conn()
+        if db is not None:
+            db.execute(
+                "INSERT INTO usage (user_id, minute, items, bytes) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, minute) DO UPDATE SET items = items + excluded.items, "
+                "bytes = bytes + excluded.bytes",
+                (user_id, minute, items, nbytes)
+            )
+
+    def _windows(self, user_id: int) -> List[Tuple[int, int, int]]:
+        """(window seconds, column, limit) for every configured limit"""
+        limits = self.limits(user_id)
+        windows = [(HOUR, 0, limits.get("hourly", 0)), (DAY, 0, limits.get("daily", 0)),
+                   (HOUR, 1, limits.get("hourly_mb", 0) * 1024 * 1024),
+                   (DAY, 1, limits.get("daily_mb", 0) * 1024 * 1024)]
+        return [window for window in windows if window[2] > 0]
+
+    def retry_in(self, user_id: int) -> float:
+        """Seconds until the user is back under every quota (0 = may start now)"""
+        if user_id in self.exempt:
+            return 0.0
+        now = time.time()
+        buckets = sorted(self._buckets(user_id).items())
+        wait = 0.0
+        for window, column, limit in self._windows(user_id):
+            start = self._minute(now - window)
+            inside = [(minute, bucket[column]) for minute, bucket in buckets if minute >= start]
+            used = sum(amount for _, amount in inside)
+            # Age out the oldest minutes until one more item fits
+            for minute, amount in inside:
+                if used < limit:
+                    break
+                used -= amount
+                wait = max(wait, (minute + 1) * BUCKET + window - now)
+        return wait
+
+    def usage_of(self, user_id: int) -> Dict[str, int]:
+        """Items and bytes used in the current hour and day windows"""
+        start_hour = self._minute(time.time() - HOUR)
+        buckets = self._buckets(user_id)
+        return {
+            "hourly": sum(b[0] for m, b in buckets.items() if m >= start_hour),
+            "daily": sum(b[0] for b in buckets.values()),
+            "hourly_bytes": sum(b[1] for m, b in buckets.items() if m >= start_hour),
+            "daily_bytes": sum(b[1] for b in buckets.values())
+        }
+
+    async def admit(self, user_id: int, on_wait: Optional[Callable[[float], None]] = None,
+                    poll: float = 60, charge: bool = True) -> float:
+        """Wait until the user may start another download; returns seconds deferred
+
+        With ``charge`` the download is counted right away, before yielding,
+        so parallel callers cannot overshoot the quota. Callers that may not
+        download after all (a batch item can turn out cached) pass False and
+        record the item once the download really starts.
+        """
+        started = None
+        while True:
+            delay = self.retry_in(user_id)
+            if delay <= 0:
+                if charge:
+                    self.record(user_id, items=1)
+                return time.monotonic() - started if started else 0.0
+            started = started or time.monotonic()
+            if on_wait:
+                on_wait(delay)
+            await asyncio.sleep(min(delay, poll))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+# Global quotas shared by every batch and single download
+quota_tracker = QuotaTracker(path=config.config.quota_store_path, exempt=(config.config.owner,))
@@ -0,0 +1,95 @@
+"""
+Reorder Buffer - Releases out-of-order results strictly in index order
+"""
+import asyncio
+import heapq
+import itertools
+from typing import Any, List, Optional, Set, Tuple
+
+class ReorderBuffer:
+    """Heap-backed reorder buffer with per-index tombstones
+
+    Producers call ``put`` for finished items and ``skip`` for indices that
+    will never produce an item (failed or skipped tasks). The consumer awaits
+    ``get`` and is only woken when the next expected index is ready, so a
+    failed index never holds back the items behind it.
+    """
+
+    def __init__(self, start_index: int = 1, end_index: Optional[int] = None):
+        self.next_index = start_index
+        self.end_index = end_index
+        self._heap: List[Tuple[int, int, Any]] = []
+        self._tombstones: Set[int] = set()
+        self._counter = itertools.count()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._release_gaps = True
+
+    def put(self, index: int, item: Any):
+        """Store a finished item for its index"""
+        if index < self.next_index:
+            return
+        heapq.heappush(self._heap, (index, next(self._counter), item))
+        self._wake()
+
+    def skip(self, index: int):
+        """Mark an index as permanently empty"""
+        if index < self.next_index:
+            return
+        self._tombstones.add(index)
+        self._wake()
+
+    def close(self, release_gaps: bool = True):
+        """Signal that no more items or tombstones will arrive
+
+        With ``release_gaps`` False, ``get`` stops at the first missing index
+        instead of releasing the items behind it.
+        """
+        self._closed = True
+        self._release_gaps = release_gaps
+        self._ready.set()
+
+    @property
+    def pending(self) -> int:
+        """Number of items waiting for an earlier index"""
+        return len(self._heap)
+
+    def _advance(self):
+        """Move past tombstoned indices and drop stale heap entries"""
+        while self.next_index in self._tombstones:
+            self._tombstones.discard(self.next_index)
+            self.next_index += 1
+        while self._heap and self._heap[0][0] < self.next_index:
+            heapq.heappop(self._heap)
+
+    def _next_ready(self) -> bool:
+        self._advance()
+        return bool(self._heap) and self._heap[0][0] == self.next_index
+
+    def _finished(self) -> bool:
+        return self.end_index is not None and self.next_index > self.end_index
+
+    def _wake(self):
+        if self._next_ready() or self._finished():
+            self._ready.set()
+
+    async def get(self) -> Optional[Any]:
+        """Wait for the next item in order, or None once the buffer is drained"""
+        while True:
+            if self._next_ready():
+                _, _, item = heapq.heappop(self._heap)
+                self.next_index += 1
+                return item
+
+            if self._finished():
+                return None
+
+            if self._closed:
+                if not self._heap or not self._release_gaps:
+                    return None
+                # A producer never reported the gap; release what is left in order
+                self.next_index = self._heap[0][0]
+                continue
+
+            self._ready.clear()
+            await self._ready.wait()
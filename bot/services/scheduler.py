@@ -0,0 +1,244 @@
+"""
+Scheduler - Process-wide fair sharing of download slots between batches and users
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+from config.settings import config
+
+@dataclass
+class BatchTicket:
+    """One registered batch and its share of the global slots"""
+    id: int
+    owner: str                 # user (or chat) the batch is accounted to
+    name: str
+    weight: float = 1.0
+    admitted: bool = False
+    running: int = 0           # global slots currently held
+    small_running: int = 0     # ...of which by small (fast lane) items
+    granted: int = 0           # slots granted over the batch's lifetime
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+    small_waiters: Deque[asyncio.Future] = field(default_factory=deque)
+    admitted_event: asyncio.Event = field(default_factory=asyncio.Event)
+
+class FairScheduler:
+    """Global download ceiling with weighted fair queuing per owner
+
+    At most ``max_active_batches`` batches run at once; later batches wait in
+    arrival order and can report their queue position. Admitted batches
+    request one slot per download, and free slots go to the owner with the
+    lowest virtual time, which advances by ``1 / weight`` per grant. A user
+    running two batches therefore gets the same share as a user running one,
+    and no more than ``global_limit`` downloads run in the whole process.
+
+    Interactive downloads (a single pasted link) have strict priority over
+    batches, and ``interactive_slots`` of the global slots are never given
+    to batches, so a single link starts at once while batches keep going.
+    Interactive waits longer than ``latency_target`` seconds are counted
+    as misses.
+
+    Small batch items (the fast lane) take batch slots like everything
+    else, but ``small_slots`` of them are never given to large items, so
+    a PDF does not wait for a free slot behind hour-long videos.
+    """
+
+    def __init__(self, global_limit: int = 10, max_active_batches: int = 2,
+                 weights: Optional[Dict[str, int]] = None, interactive_slots: int = 1,
+                 latency_target: float = 10, small_slots: int = 2):
+        self.global_limit = max(1, global_limit)
+        self.max_active_batches = max(1, max_active_batches)
+        self.weights = weights or {}
+        self.bulk_limit = max(1, self.global_limit - max(0, interactive_slots))
+        self.large_limit = max(1, self.bulk_limit - max(0, small_slots))
+        self.latency_target = latency_target
+        self.running = 0
+        self.small_running = 0
+        self.interactive_running = 0
+        self.interactive_waiters: Deque[asyncio.Future] = deque()
+        self.interactive_stats = {'served': 0, 'missed': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+        self.batches: Dict[int, BatchTicket] = {}
+        self.virtual_time: Dict[str, float] = {}
+        self._ids = itertools.count(1)
+
+    def register(self, owner, name: str = "") -> BatchTicket:
+        """Add a batch to the admission queue"""
+        owner = str(owner)
+        ticket = BatchTicket(id=next(self._ids), owner=owner, name=name,
+                             weight=max(1, self.weights.get(owner, 1)))
+        self.batches[ticket.id] = ticket
+        self._admit()
+        return ticket
+
+    def unregister(self, ticket: BatchTicket):
+        """Remove a finished batch and hand its admission to the next one"""
+        self.batches.pop(ticket.id, None)
+        for waiter in (*ticket.waiters, *ticket.small_waiters):
+            waiter.cancel()
+        ticket.waiters.clear()
+        ticket.small_waiters.clear()
+        self.running -= ticket.running
+        self.small_running -= ticket.small_running
+        ticket.running = ticket.small_running = 0
+        if not any(b.owner == ticket.owner for b in self.batches.values()):
+            self.virtual_time.pop(ticket.owner, None)
+        self._admit()
+        self._dispatch()
+
+    def position(self, ticket: BatchTicket) -> int:
+        """1-based place in the admission queue (0 once admitted)"""
+        if ticket.admitted:
+            return 0
+        waiting = [b for b in self.batches.values() if not b.admitted]
+        return waiting.index(ticket) + 1 if ticket in waiting else 0
+
+    async def wait_admitted(self, ticket: BatchTicket, timeout: Optional[float] = None) -> bool:
+        """Wait until the batch may start downloading (or ``timeout`` passes)"""
+        try:
+            await asyncio.wait_for(ticket.admitted_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return ticket.admitted
+
+    def _admit(self):
+        active = sum(1 for b in self.batches.values() if b.admitted)
+        for ticket in self.batches.values():
+            if active >= self.max_active_batches:
+                break
+            if not ticket.admitted:
+                ticket.admitted = True
+                ticket.admitted_event.set()
+                active += 1
+
+    async def acquire(self, ticket: BatchTicket, small: bool = False):
+        """Wait for a global download slot for one of the batch's downloads (``small`` for the fast lane)"""
+        waiter = asyncio.get_running_loop().create_future()
+        if not self._owner_busy(ticket.owner):
+            self._activate(ticket.owner)
+        waiters = ticket.small_waiters if small else ticket.waiters
+        waiters.append(waiter)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(ticket, small)
+            elif waiter in waiters:
+                waiters.remove(waiter)
+            raise
+
+    def release(self, ticket: BatchTicket, small: bool = False):
+        """Give back a slot taken with ``acquire``"""
+        if ticket.running > 0:
+            ticket.running -= 1
+            self.running -= 1
+        if small and ticket.small_running > 0:
+            ticket.small_running -= 1
+            self.small_running -= 1
+        self._dispatch()
+
+    async def acquire_interactive(self) -> float:
+        """Wait for a slot for a single-link download; returns the seconds waited"""
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self.interactive_waiters.append(waiter)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release_interactive()
+            elif waiter in self.interactive_waiters:
+                self.interactive_waiters.remove(waiter)
+            raise
+        waited = time.monotonic() - started
+        stats = self.interactive_stats
+        stats['served'] += 1
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+        if waited > self.latency_target:
+            stats['missed'] += 1
+        return waited
+
+    def release_interactive(self):
+        """Give back a slot taken with ``acquire_interactive``"""
+        if self.interactive_running > 0:
+            self.interactive_running -= 1
+            self.running -= 1
+        self._dispatch()
+
+    def _activate(self, owner: str):
+        """An owner with nothing running starts at the current virtual time, not with saved credit"""
+        busy = [self.virtual_time[o] for o in self.virtual_time if o != owner and self._owner_busy(o)]
+        floor = min(busy, default=0.0)
+        self.virtual_time[owner] = max(self.virtual_time.get(owner, 0.0), floor)
+
+    def _owner_busy(self, owner: str) -> bool:
+        return any(b.owner == owner and (b.running or b.waiters or b.small_waiters) for b in self.batches.values())
+
+    def _dispatch(self):
+        while self.running < self.global_limit and self.interactive_waiters:
+            waiter = self.interactive_waiters.popleft()
+            if waiter.cancelled():
+                continue
+            waiter.set_result(None)
+            self.interactive_running += 1
+            self.running += 1
+
+        # Small items first: they may use any batch slot, large items all but the reserved ones
+        for small in (True, False):
+            while self._bulk_free(small):
+                candidates = [b for b in self.batches.values()
+                              if b.admitted and (b.small_waiters if small else b.waiters)]
+                if not candidates:
+                    break
+                ticket = min(candidates, key=lambda b: (self.virtual_time[b.owner], b.granted, b.id))
+                waiter = (ticket.small_waiters if small else ticket.waiters).popleft()
+                if waiter.cancelled():
+                    continue
+                waiter.set_result(None)
+                ticket.running += 1
+                ticket.granted += 1
+                self.running += 1
+                if small:
+                    ticket.small_running += 1
+                    self.small_running += 1
+                self.virtual_time[ticket.owner] += 1 / ticket.weight
+
+    def _bulk_free(self, small: bool) -> bool:
+        """Whether a batch slot is free for a small or a large item"""
+        bulk = self.running - self.interactive_running
+        if self.running >= self.global_limit or bulk >= self.bulk_limit:
+            return False
+        return small or bulk - self.small_running < self.large_limit
+
+    def snapshot(self) -> List[str]:
+        """Human readable state per batch, for stats"""
+        lines = []
+        for ticket in self.batches.values():
+            state = f"{ticket.running} running" if ticket.admitted else f"queued #{self.position(ticket)}"
+            lines.append(f"{ticket.name or ticket.id} ({ticket.owner}): {state}")
+        stats = self.interactive_stats
+        average = stats['wait_total'] / stats['served'] if stats['served'] else 0.0
+        lines.append(
+            f"single links: {self.interactive_running} running, {len(self.interactive_waiters)} waiting, "
+            f"{stats['served']} served, avg wait {average:.1f}s (max {stats['wait_max']:.1f}s), "
+            f"{stats['missed']} over {self.latency_target:g}s"
+        )
+        lines.append(
+            f"batches: {self.running - self.interactive_running}/{self.bulk_limit} slots "
+            f"({self.small_running} small, {self.bulk_limit - self.large_limit} kept for them)"
+        )
+        return lines
+
+# Global scheduler shared by every batch
+download_scheduler = FairScheduler(
+    global_limit=config.config.global_max_downloads,
+    max_active_batches=config.config.max_active_batches,
+    weights=config.config.scheduler_weights,
+    interactive_slots=config.config.interactive_slots,
+    latency_target=config.config.interactive_latency_target,
+    small_slots=config.config.fast_lane_slots if config.config.fast_lane_workers > 0 else 0
+)
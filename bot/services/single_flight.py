@@ -0,0 +1,101 @@
+"""
+Single Flight - One download per item across batches; later requesters share its file
+"""
+import asyncio
+import itertools
+import os
+import shutil
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+class Flight:
+    """An in-flight download and the batches waiting for its file"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, key: Hashable):
+        self.id = next(self._ids)
+        self.key = key
+        self.followers: List[Tuple[str, asyncio.Future]] = []  # (file name stem, its future)
+        self.published: Any = None  # CachedFile once the leader has uploaded it
+
+class SingleFlight:
+    """Process-wide registry that coalesces identical downloads
+
+    The first batch to ask for an item (by normalized URL, quality and
+    kind) leads and downloads it; batches asking for the same item while it
+    is in flight follow. When the leader's download lands, each follower
+    gets its own hard link to the file (a copy when linking fails), so
+    every batch uploads or deletes its file independently and names never
+    clash. Once the leader has published the file, followers can send its
+    file_id instead of uploading again. If the leader fails, followers
+    download it themselves.
+    """
+
+    def __init__(self):
+        self.flights: Dict[Hashable, Flight] = {}
+        self.coalesced = 0
+
+    def join(self, key: Hashable) -> Tuple[Flight, bool]:
+        """The flight for ``key`` and whether the caller leads it"""
+        flight = self.flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = self.flights[key] = Flight(key)
+        return flight, True
+
+    async def follow(self, flight: Flight, stem: str) -> Optional[str]:
+        """Wait for the leader; returns the follower's own path to the file, or None if the leader failed
+
+        The path is ``stem`` plus the extension of the leader's file, next to it.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        flight.followers.append((stem, waiter))
+        try:
+            result = await waiter
+        except asyncio.CancelledError:
+            if (stem, waiter) in flight.followers:
+                flight.followers.remove((stem, waiter))
+            raise
+        if result:
+            self.coalesced += 1
+        return result
+
+    def land(self, flight: Flight, source: str):
+        """The leader's download finished: give every follower its own link to ``source``"""
+        self._close(flight)
+        folder, ext = os.path.dirname(source), os.path.splitext(source)[1]
+        for n, (stem, waiter) in enumerate(flight.followers):
+            if waiter.done():
+                continue
+            if not os.path.isfile(source):
+                # Nothing on disk to share (a ZIP link is published as a button)
+                waiter.set_result(source)
+                continue
+            path = os.path.join(folder, f"{stem}{ext}")
+            if os.path.exists(path):
+                path = os.path.join(folder, f"{stem}.{flight.id}-{n}{ext}")
+            try:
+                try:
+                    os.link(source, path)
+                except OSError:
+                    shutil.copyfile(source, path)
+                waiter.set_result(path)
+            except OSError as e:
+                print(f"⚠️ Could not share {source} as {path}: {e}")
+                waiter.set_result(None)
+        flight.followers.clear()
+
+    def abort(self, flight: Flight):
+        """The leader failed or was cancelled; followers download on their own"""
+        self._close(flight)
+        for _, waiter in flight.followers:
+            if not waiter.done():
+                waiter.set_result(None)
+        flight.followers.clear()
+
+    def _close(self, flight: Flight):
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+
+# Global registry shared by every batch
+single_flight = SingleFlight()
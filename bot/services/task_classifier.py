@@ -0,0 +1,53 @@
+"""
+Task Classifier - Tells cheap batch items (documents, images, audio) from long videos
+"""
+from typing import Dict, Tuple
+from config.settings import config
+
+# Same URL checks the batch downloader uses to pick a non-video download path
+SMALL_MARKERS = (".pdf", ".zip", ".jpg", ".jpeg", ".png", ".mp3", ".wav", ".m4a")
+
+class TaskClassifier:
+    """Guesses whether a batch item is cheap enough for the fast lane
+
+    Items whose URL marks them as a document, image, audio file or ZIP link
+    are small. Other items are small when earlier downloads of the same kind
+    from the same host finished within ``small_seconds`` on average (after
+    ``min_samples`` downloads), so quick short clips move over too while
+    long streams stay on the normal workers.
+    """
+
+    def __init__(self, small_seconds: float = 30, min_samples: int = 3, alpha: float = 0.3):
+        self.small_seconds = small_seconds
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.history: Dict[Tuple[str, str], Tuple[float, int]] = {}  # (host, kind) -> (avg seconds, samples)
+
+    @staticmethod
+    def kind(url: str) -> str:
+        url = url.lower()
+        if "drive" in url:
+            return "drive"
+        if ".ws" in url and url.endswith(".ws"):
+            return "small"
+        if any(marker in url for marker in SMALL_MARKERS):
+            return "small"
+        if url.endswith(".m3u8"):
+            return "hls"
+        return "video"
+
+    def is_small(self, url: str, host: str) -> bool:
+        kind = self.kind(url)
+        if kind == "small":
+            return True
+        average, samples = self.history.get((host, kind), (0.0, 0))
+        return samples >= self.min_samples and average <= self.small_seconds
+
+    def record(self, url: str, host: str, seconds: float):
+        """Remember how long a successful download took"""
+        key = (host, self.kind(url))
+        average, samples = self.history.get(key, (seconds, 0))
+        self.history[key] = (average + self.alpha * (seconds - average), samples + 1)
+
+# Global classifier; its history carries over between batches
+task_classifier = TaskClassifier(small_seconds=config.config.fast_lane_max_seconds)
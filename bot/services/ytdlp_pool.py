@@ -0,0 +1,258 @@
+"""
+yt-dlp Pool - Warm yt-dlp worker processes shared by every download
+"""
+import asyncio
+import json
+import os
+import sys
+from typing import List, Optional, Sequence, Tuple
+from config.settings import config
+from bot.services.process_supervisor import ProcessResult, process_supervisor
+from bot.services.progress import ProgressTracker, progress_from_hook
+from bot.services.ytdlp_worker import direct_download
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_FRAGMENTED = (".m3u8", ".mpd")  # links that never resolve to a single file
+
+class _Worker:
+    """One running ``bot.services.ytdlp_worker`` process"""
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self.jobs = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def read_message(self) -> Optional[dict]:
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                return None
+            try:
+                return json.loads(line)
+            except ValueError:
+                continue
+
+class YtDlpPool:
+    """Runs yt-dlp jobs in long-lived worker processes
+
+    A fresh ``yt-dlp`` CLI pays interpreter startup, extractor imports and a
+    cookie file read on every file. Workers keep all of that loaded and take
+    jobs with the usual CLI arguments. A worker is replaced after
+    ``max_jobs`` jobs to keep memory bounded, and is killed together with its
+    ffmpeg/aria2c children on timeout, stall or cancellation. With no workers
+    configured, or for anything that is not a yt-dlp command, jobs fall back
+    to the process supervisor.
+
+    The pool never limits how many jobs run: how many downloads run at once
+    is up to the download scheduler, the adaptive limit and the host limits.
+    When all ``workers`` are busy a job runs as a supervised CLI process
+    right away instead of waiting for a worker.
+    """
+
+    def __init__(self, workers: int = 0, max_jobs: int = 50, timeout: Optional[float] = None,
+                 progress_stall_timeout: Optional[float] = None):
+        self.size = max(0, workers)
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.progress_stall_timeout = progress_stall_timeout
+        self._idle: List[_Worker] = []
+        self._busy = 0  # workers running a job
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def _spawn(self) -> Optional[_Worker]:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "bot.services.ytdlp_worker",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=_PROJECT_ROOT,
+            start_new_session=True
+        )
+        worker = _Worker(proc)
+        message = await worker.read_message()
+        if not message or message.get("event") != "ready":
+            await process_supervisor.kill_group(proc)
+            return None
+        return worker
+
+    async def _acquire(self) -> Optional[_Worker]:
+        """An idle or new worker, or None when all are busy or one cannot start (use the CLI)"""
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.alive:
+                self._busy += 1
+                return worker
+        if self._busy >= self.size:
+            return None
+        self._busy += 1
+        try:
+            worker = await self._spawn()
+        except BaseException:
+            self._busy -= 1
+            raise
+        if worker is None:
+            self._busy -= 1
+            print("⚠️ yt-dlp worker failed to start, falling back to the CLI")
+        return worker
+
+    async def _release(self, worker: _Worker, healthy: bool):
+        self._busy -= 1
+        if healthy and worker.alive and worker.jobs < self.max_jobs:
+            self._idle.append(worker)
+        elif healthy and worker.alive:
+            # Retire: closing stdin ends the worker's job loop
+            worker.proc.stdin.close()
+            asyncio.create_task(worker.proc.wait())
+        else:
+            await process_supervisor.kill_group(worker.proc)
+
+    async def run(self, argv: Sequence[str], cwd: Optional[str] = None,
+                  progress: Optional[ProgressTracker] = None) -> ProcessResult:
+        """Run a yt-dlp command line in a warm worker"""
+        if not self.enabled or not argv or argv[0] != "yt-dlp":
+            return await process_supervisor.run(argv, cwd=cwd, on_output=progress.feed if progress else None)
+
+        worker = await self._acquire()
+        if worker is None:
+            return await process_supervisor.run(argv, cwd=cwd, on_output=progress.feed if progress else None)
+
+        result, _ = await self._submit(worker, {"argv": list(argv), "cwd": cwd or os.getcwd()}, progress)
+        return result
+
+    async def resolve(self, argv: Sequence[str], cwd: Optional[str] = None) -> Optional[dict]:
+        """Resolve a yt-dlp command line to a single direct file without downloading
+
+        Returns ``{"url", "http_headers", "filename"}`` when the selected format
+        is one plain HTTP(S) file, otherwise None (HLS/DASH, merges, errors).
+        Like ``run``, it never waits for a busy pool.
+        """
+        worker = await self._acquire() if self.enabled else None
+        if worker is None:
+            return await self._resolve_cli(argv, cwd)
+
+        result, message = await self._submit(worker, {"argv": list(argv), "cwd": cwd or os.getcwd(), "resolve": True}, None)
+        return message.get("info") if result.ok else None
+
+    async def fetch(self, argv: Sequence[str], cwd: Optional[str] = None,
+                    progress: Optional[ProgressTracker] = None) -> Tuple[Optional[ProcessResult], Optional[dict]]:
+        """Extract a yt-dlp command line once and either hand back a direct file or download it
+
+        Returns ``(None, target)`` when the selected format is one plain
+        HTTP(S) file, left for an external downloader, and ``(result, None)``
+        once yt-dlp downloaded anything else itself. A warm worker does both
+        from one extraction; the CLI fallback only resolves first when the
+        link could be a single file, since that costs a second extraction.
+        """
+        worker = await self._acquire() if self.enabled else None
+        if worker is None:
+            if not any(marker in arg for arg in argv for marker in _FRAGMENTED):
+                target = await self._resolve_cli(argv, cwd)
+                if target:
+                    return None, target
+            return await process_supervisor.run(argv, cwd=cwd, on_output=progress.feed if progress else None), None
+
+        job = {"argv": list(argv), "cwd": cwd or os.getcwd(), "resolve": True, "download": True}
+        result, message = await self._submit(worker, job, progress)
+        if result.ok and message.get("info"):
+            return None, message["info"]
+        return result, None
+
+    async def _resolve_cli(self, argv: Sequence[str], cwd: Optional[str]) -> Optional[dict]:
+        result = await process_supervisor.run([*argv, "-j", "--no-warnings"], cwd=cwd)
+        if not result.ok:
+            return None
+        for line in reversed(result.output.splitlines()):
+            if line.startswith("{"):
+                try:
+                    info = json.loads(line)
+                except ValueError:
+                    return None
+                return direct_download(info, info.get("filename") or info.get("_filename"))
+        return None
+
+    async def _submit(self, worker: _Worker, job: dict,
+                      progress: Optional[ProgressTracker]) -> Tuple[ProcessResult, dict]:
+        healthy = False
+        try:
+            result, message = await self._run_job(worker, job, progress)
+            healthy = not (result.timed_out or result.stalled) and result.returncode is not None
+            return result, message
+        finally:
+            await self._release(worker, healthy)
+
+    async def _run_job(self, worker: _Worker, job: dict,
+                       progress: Optional[ProgressTracker]) -> Tuple[ProcessResult, dict]:
+        worker.jobs += 1
+        worker.proc.stdin.write((json.dumps(job) + "\n").encode())
+        await worker.proc.stdin.drain()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout if self.timeout else None
+        last_advance = loop.time()
+        in_progress = False
+        result = ProcessResult(returncode=None)
+
+        while True:
+            now = loop.time()
+            waits = []
+            if deadline is not None:
+                waits.append(deadline - now)
+            if self.progress_stall_timeout and in_progress:
+                waits.append(last_advance + self.progress_stall_timeout - now)
+            wait = min(waits) if waits else None
+
+            if wait is not None and wait <= 0:
+                if deadline is not None and now >= deadline:
+                    result.timed_out = True
+                else:
+                    result.stalled = True
+                return result, {}
+
+            try:
+                message = await asyncio.wait_for(worker.read_message(), wait)
+            except asyncio.TimeoutError:
+                continue
+
+            if message is None:
+                result.output = "yt-dlp worker exited unexpectedly"
+                return result, {}
+
+            if message.get("event") == "done":
+                result.returncode = message.get("returncode")
+                result.output = message.get("output", "")
+                return result, message
+
+            if message.get("event") == "progress":
+                event = progress_from_hook(message.get("status") or {})
+                if event is None:
+                    in_progress = False
+                    continue
+                advanced = progress.update(event) if progress else True
+                if advanced or not in_progress:
+                    last_advance = loop.time()
+                in_progress = True
+
+    async def close(self):
+        """Stop all idle workers"""
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.alive:
+                worker.proc.stdin.close()
+                try:
+                    await asyncio.wait_for(worker.proc.wait(), 5)
+                except asyncio.TimeoutError:
+                    await process_supervisor.kill_group(worker.proc)
+
+# Global pool used by the yt-dlp based download helpers
+ytdlp_pool = YtDlpPool(
+    workers=config.config.ytdlp_pool_workers,
+    max_jobs=config.config.ytdlp_worker_max_jobs,
+    timeout=config.config.download_timeout,
+    progress_stall_timeout=config.config.progress_stall_timeout
+)
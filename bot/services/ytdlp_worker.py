@@ -0,0 +1,156 @@
+"""
+yt-dlp Worker - Long-lived yt-dlp process that runs download jobs read from stdin
+
+Started by the yt-dlp pool as ``python -m bot.services.ytdlp_worker``. Each
+stdin line is a JSON job ``{"argv": [...], "cwd": "..."}`` using the same
+arguments as the yt-dlp CLI. A job with ``"resolve": true`` only extracts
+the media URL instead of downloading; adding ``"download": true`` downloads
+from that same extraction unless it resolved to a single direct file. Progress and results go back as JSON
+lines on the original stdout; anything yt-dlp or its helpers print is sent
+to stderr.
+"""
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import yt_dlp
+from yt_dlp.cookies import YoutubeDLCookieJar
+
+PROGRESS_INTERVAL = 0.5  # seconds between progress messages
+
+def direct_download(info: dict, filename: str):
+    """Describe a resolved video as a single plain HTTP(S) file, or None
+
+    Playlists, separate video+audio formats (need a merge) and fragmented
+    protocols (HLS/DASH) are left to yt-dlp itself.
+    """
+    if not info or info.get("_type") in ("playlist", "multi_video"):
+        return None
+    if info.get("requested_formats"):
+        return None
+    if info.get("protocol") not in ("http", "https") or not info.get("url") or not filename:
+        return None
+    return {
+        "url": info["url"],
+        # HTTPHeaderDict does not serialize as a plain dict
+        "http_headers": {key: value for key, value in (info.get("http_headers") or {}).items()},
+        "filename": filename
+    }
+
+class _Logger:
+    """Keeps the last warnings/errors so they can be returned with the result"""
+
+    def __init__(self):
+        self.lines = deque(maxlen=20)
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        self.lines.append(msg)
+
+    def error(self, msg):
+        self.lines.append(msg)
+
+class Worker:
+    """Runs jobs one at a time, reusing loaded extractors and cookie jars"""
+
+    def __init__(self, proto):
+        self.proto = proto
+        self.home = os.getcwd()
+        self.cookie_jars = {}  # path -> (mtime, YoutubeDLCookieJar)
+        self._last_progress = 0.0
+
+    def send(self, **message):
+        self.proto.write(json.dumps(message) + "\n")
+        self.proto.flush()
+
+    def _progress_hook(self, status: dict):
+        now = time.monotonic()
+        if status.get("status") == "downloading" and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self.send(event="progress", status={
+            key: status.get(key) for key in (
+                "status", "downloaded_bytes", "total_bytes", "total_bytes_estimate",
+                "speed", "eta", "fragment_index", "fragment_count"
+            )
+        })
+
+    def _cookie_jar(self, cookie_file: str):
+        """Load a cookie file once and reuse it until the file changes"""
+        path = os.path.abspath(cookie_file)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self.cookie_jars.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        jar = YoutubeDLCookieJar(path)
+        jar.load()
+        self.cookie_jars[path] = (mtime, jar)
+        return jar
+
+    def run(self, job: dict):
+        logger = _Logger()
+        result = {}
+        os.chdir(job.get("cwd") or self.home)
+        try:
+            parsed = yt_dlp.parse_options(job["argv"][1:])
+            opts = dict(parsed.ydl_opts)
+            opts.update(quiet=True, noprogress=True, logger=logger,
+                        progress_hooks=[self._progress_hook])
+
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                cookie_file = opts.get("cookiefile")
+                jar = self._cookie_jar(cookie_file) if cookie_file else None
+                if jar is not None:
+                    # cookiejar is a cached_property; prime it with the warm jar
+                    ydl.__dict__["cookiejar"] = jar
+                if job.get("resolve"):
+                    info = ydl.extract_info(parsed.urls[0], download=False)
+                    result["info"] = direct_download(info, ydl.prepare_filename(info) if info else None)
+                    returncode = 0
+                    if info and not result["info"] and job.get("download"):
+                        # HLS/DASH or a merge: download it without extracting again
+                        ydl.process_ie_result(info, download=True)
+                        returncode = ydl._download_retcode
+                else:
+                    returncode = ydl.download(parsed.urls)
+
+            if jar is not None:
+                # Saving on close touched the file; keep the cache valid
+                path = os.path.abspath(cookie_file)
+                self.cookie_jars[path] = (os.path.getmtime(path), jar)
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 2
+            logger.lines.append(str(e))
+        except Exception as e:
+            returncode = 1
+            logger.lines.append(str(e))
+        finally:
+            os.chdir(self.home)
+
+        self.send(event="done", returncode=returncode, output="\n".join(logger.lines), **result)
+
+def main():
+    # Keep the real stdout for the protocol; yt-dlp, ffmpeg and aria2c
+    # inherit fd 1 pointing at stderr so they cannot corrupt it
+    proto = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    worker = Worker(proto)
+    worker.send(event="ready")
+    for line in sys.stdin:
+        if line.strip():
+            worker.run(json.loads(line))
+
+if __name__ == "__main__":
+    main()
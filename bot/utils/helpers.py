@@ -7,7 +7,7 @@ import asyncio
 import aiofiles
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qsl, urlencode
 import mimetypes
 
 def format_user_info(user_id: int, username: str = None, 
@@ -230,6 +230,50 @@ def validate_url(url: str) -> Tuple[bool, str]:
     except Exception as e:
         return False, f"Invalid URL: {str(e)}"
 
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL, so the same link written differently compares equal
+    
+    Lowercases the scheme and host, drops default ports, fragments and
+    trailing slashes, and sorts the query parameters.
+    """
+    url = url.strip()
+    try:
+        parsed = urlparse(url if "://" in url else f"https://{url}")
+        port = parsed.port
+    except ValueError:
+        return url
+    
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or "").lower()
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        netloc = f"{netloc}:{port}"
+    path = parsed.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{scheme}://{netloc}{path}" + (f"?{query}" if query else "")
+
+TRACKING_PARAMS = {"modestbranding", "fbclid", "gclid", "si", "feature", "usp"}
+
+def clean_link(url: str) -> str:
+    """Rewrite a batch link into its downloadable form and drop tracking parameters
+    
+    Applies the Google Drive and youtube-nocookie rewrites and removes
+    query parameters that only track the click (utm_*, fbclid, si, ...).
+    The remaining parameters are kept byte for byte, since signed URLs
+    break when they are re-encoded. Works with or without a scheme.
+    """
+    url = (url.strip().replace("file/d/", "uc?export=download&id=")
+           .replace("www.youtube-nocookie.com/embed", "youtu.be").replace("/view?usp=sharing", ""))
+    base, sep, query = url.partition("?")
+    if not sep:
+        return url
+    query, hash_sep, fragment = query.partition("#")
+    kept = [
+        param for param in query.split("&")
+        if param and param.split("=", 1)[0].lower() not in TRACKING_PARAMS
+        and not param.lower().startswith("utm_")
+    ]
+    return base + ("?" + "&".join(kept) if kept else "") + hash_sep + fragment
+
 def create_download_stats(downloads: List[Dict[str, Any]]) -> Dict[str, Any]:
     """Create statistics from download list"""
     if not downloads:
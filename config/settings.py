@@ -2,7 +2,7 @@
 Configuration management for Medusa Bot
 """
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional
 from dataclasses import dataclass
 
 @dataclass
@@ -24,6 +24,48 @@ class BotConfig:
     max_file_size_mb: int
     download_timeout: int
     max_concurrent_downloads: int
+    min_concurrent_downloads: int
+    concurrency_adjust_interval: int
+    global_max_downloads: int
+    max_active_batches: int
+    scheduler_weights: Dict[str, int]
+    interactive_slots: int
+    interactive_latency_target: int
+    fast_lane_workers: int
+    fast_lane_max_seconds: int
+    fast_lane_slots: int
+    batch_journal_path: str
+    batch_replay: bool
+    shutdown_grace_seconds: int
+    file_cache_path: str
+    file_cache_ttl_days: int
+    file_cache_redis_url: str
+    process_stall_timeout: int
+    progress_stall_timeout: int
+    process_memory_limit_mb: int
+    process_cpu_limit_seconds: int
+    ytdlp_pool_workers: int
+    ytdlp_worker_max_jobs: int
+    http_download_connections: int
+    http_split_min_size_mb: int
+    http_pool_limit: int
+    http_pool_limit_per_host: int
+    http_dns_cache_ttl: int
+    http_keepalive_timeout: int
+    max_inflight_mb_per_task: int
+    aria2_rpc_enabled: bool
+    aria2_rpc_port: int
+    aria2_max_connections: int
+    aria2_max_connections_per_host: int
+    aria2_split: int
+    aria2_session_file: str
+    host_concurrency_default: int
+    host_concurrency_limits: Dict[str, int]
+    host_failure_threshold: int
+    host_breaker_cooldown: int
+    host_breaker_max_trips: int
+    upload_backlog_mb: int
+    max_rss_mb: int
     
     # Log Channel Settings
     log_channels: List[int]
@@ -33,6 +75,7 @@ class BotConfig:
     chunk_size: int
     retry_attempts: int
     retry_delay: int
+    parallel_upload_lanes: int
     
     # Feature Flags
     enable_analytics: bool
@@ -43,6 +86,10 @@ class BotConfig:
     # Rate Limiting
     max_downloads_per_user_per_hour: int
     max_downloads_per_user_per_day: int
+    max_mb_per_user_per_hour: int
+    max_mb_per_user_per_day: int
+    quota_store_path: str
+    batch_quota: bool
     
     # Quality Settings
     default_video_quality: str
@@ -72,7 +119,49 @@ class ConfigManager:
             cookies_file_path=os.getenv("COOKIES_FILE_PATH", "youtube_cookies.txt"),
             max_file_size_mb=int(os.getenv("MAX_FILE_SIZE_MB", "2000")),  # 2GB Telegram limit
             download_timeout=int(os.getenv("DOWNLOAD_TIMEOUT", "3600")),  # 1 hour
-            max_concurrent_downloads=int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "5")),
+            max_concurrent_downloads=int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "8")),  # adaptive ceiling
+            min_concurrent_downloads=int(os.getenv("MIN_CONCURRENT_DOWNLOADS", "2")),  # adaptive floor and start
+            concurrency_adjust_interval=int(os.getenv("CONCURRENCY_ADJUST_INTERVAL", "5")),  # seconds
+            global_max_downloads=int(os.getenv("GLOBAL_MAX_DOWNLOADS", "10")),  # across all batches
+            max_active_batches=int(os.getenv("MAX_ACTIVE_BATCHES", "2")),  # later batches queue
+            scheduler_weights=self._parse_int_map(os.getenv("SCHEDULER_WEIGHTS", "")),  # user_id:weight
+            interactive_slots=int(os.getenv("INTERACTIVE_SLOTS", "1")),  # kept free for single links
+            interactive_latency_target=int(os.getenv("INTERACTIVE_LATENCY_TARGET", "10")),  # seconds to start
+            fast_lane_workers=int(os.getenv("FAST_LANE_WORKERS", "2")),  # small items per batch, 0 = off
+            fast_lane_max_seconds=int(os.getenv("FAST_LANE_MAX_SECONDS", "30")),  # typical time of a small item
+            fast_lane_slots=int(os.getenv("FAST_LANE_SLOTS", "2")),  # global slots large items never take
+            batch_journal_path=os.getenv("BATCH_JOURNAL_PATH", "batches.db"),  # empty = no resume
+            batch_replay=os.getenv("BATCH_REPLAY", "true").lower() == "true",  # forward archived items again
+            shutdown_grace_seconds=int(os.getenv("SHUTDOWN_GRACE_SECONDS", "25")),  # drain time on SIGTERM
+            file_cache_path=os.getenv("FILE_CACHE_PATH", "file_cache.db"),  # empty = no cache
+            file_cache_ttl_days=int(os.getenv("FILE_CACHE_TTL_DAYS", "30")),  # 0 = keep forever
+            file_cache_redis_url=os.getenv("FILE_CACHE_REDIS_URL", ""),  # shared cache instead of SQLite
+            process_stall_timeout=int(os.getenv("PROCESS_STALL_TIMEOUT", "300")),  # seconds without output
+            progress_stall_timeout=int(os.getenv("PROGRESS_STALL_TIMEOUT", "60")),  # seconds at 0 B/s
+            process_memory_limit_mb=int(os.getenv("PROCESS_MEMORY_LIMIT_MB", "0")),  # 0 = no limit
+            process_cpu_limit_seconds=int(os.getenv("PROCESS_CPU_LIMIT_SECONDS", "0")),  # 0 = no limit
+            ytdlp_pool_workers=int(os.getenv("YTDLP_POOL_WORKERS", "2")),  # 0 = spawn the yt-dlp CLI per file
+            ytdlp_worker_max_jobs=int(os.getenv("YTDLP_WORKER_MAX_JOBS", "50")),  # recycle worker after N jobs
+            http_download_connections=int(os.getenv("HTTP_DOWNLOAD_CONNECTIONS", "4")),  # ranges per direct file
+            http_split_min_size_mb=int(os.getenv("HTTP_SPLIT_MIN_SIZE_MB", "8")),  # smaller files use one range
+            http_pool_limit=int(os.getenv("HTTP_POOL_LIMIT", "100")),  # open connections in total
+            http_pool_limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "16")),
+            http_dns_cache_ttl=int(os.getenv("HTTP_DNS_CACHE_TTL", "300")),  # seconds
+            http_keepalive_timeout=int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30")),  # seconds
+            max_inflight_mb_per_task=int(os.getenv("MAX_INFLIGHT_MB_PER_TASK", "8")),  # buffered bytes per download
+            aria2_rpc_enabled=os.getenv("ARIA2_RPC_ENABLED", "true").lower() == "true",
+            aria2_rpc_port=int(os.getenv("ARIA2_RPC_PORT", "6800")),
+            aria2_max_connections=int(os.getenv("ARIA2_MAX_CONNECTIONS", "64")),  # across all downloads
+            aria2_max_connections_per_host=int(os.getenv("ARIA2_MAX_CONNECTIONS_PER_HOST", "16")),
+            aria2_split=int(os.getenv("ARIA2_SPLIT", "16")),  # connections wanted per download
+            aria2_session_file=os.getenv("ARIA2_SESSION_FILE", "aria2.session"),
+            host_concurrency_default=int(os.getenv("HOST_CONCURRENCY_DEFAULT", "3")),  # downloads per host
+            host_concurrency_limits=self._parse_int_map(os.getenv("HOST_CONCURRENCY_LIMITS", "")),
+            host_failure_threshold=int(os.getenv("HOST_FAILURE_THRESHOLD", "3")),  # failures before breaker opens
+            host_breaker_cooldown=int(os.getenv("HOST_BREAKER_COOLDOWN", "60")),  # seconds before a probe
+            host_breaker_max_trips=int(os.getenv("HOST_BREAKER_MAX_TRIPS", "3")),  # then fail the host's tasks fast
+            upload_backlog_mb=int(os.getenv("UPLOAD_BACKLOG_MB", "2048")),  # downloaded bytes waiting for upload
+            max_rss_mb=int(os.getenv("MAX_RSS_MB", "0")),  # pause downloads above this RSS (0 = off)
             
             # Log Channel Settings
             log_channels=self._parse_int_list(os.getenv("LOG_CHANNELS", "")),
@@ -82,6 +171,7 @@ class ConfigManager:
             chunk_size=int(os.getenv("CHUNK_SIZE", "1048576")),  # 1MB chunks
             retry_attempts=int(os.getenv("RETRY_ATTEMPTS", "3")),
             retry_delay=int(os.getenv("RETRY_DELAY", "2")),  # seconds
+            parallel_upload_lanes=int(os.getenv("PARALLEL_UPLOAD_LANES", "1")),  # 1 = sequential uploads
             
             # Feature Flags
             enable_analytics=os.getenv("ENABLE_ANALYTICS", "true").lower() == "true",
@@ -92,6 +182,10 @@ class ConfigManager:
             # Rate Limiting
             max_downloads_per_user_per_hour=int(os.getenv("MAX_DOWNLOADS_PER_USER_PER_HOUR", "50")),
             max_downloads_per_user_per_day=int(os.getenv("MAX_DOWNLOADS_PER_USER_PER_DAY", "200")),
+            max_mb_per_user_per_hour=int(os.getenv("MAX_MB_PER_USER_PER_HOUR", "0")),  # 0 = no limit
+            max_mb_per_user_per_day=int(os.getenv("MAX_MB_PER_USER_PER_DAY", "0")),  # 0 = no limit
+            quota_store_path=os.getenv("QUOTA_STORE_PATH", "quota.db"),  # empty = in memory only
+            batch_quota=os.getenv("BATCH_QUOTA", "false").lower() == "true",  # also limit /drm batch items
             
             # Quality Settings
             default_video_quality=os.getenv("DEFAULT_VIDEO_QUALITY", "720"),
@@ -107,6 +201,15 @@ class ConfigManager:
         except:
             return []
     
+    def _parse_int_map(self, value: str) -> Dict[str, int]:
+        """Parse comma-separated key:number pairs to a dict"""
+        result = {}
+        for item in self._parse_string_list(value):
+            key, _, number = item.rpartition(':')
+            if key and number.isdigit():
+                result[key.strip().lower()] = int(number)
+        return result
+    
     def _parse_string_list(self, value: str) -> List[str]:
         """Parse comma-separated string to list of strings"""
         if not value:
@@ -126,7 +229,9 @@ class ConfigManager:
         # Could be extended to have different limits for different users
         return {
             "hourly": self.config.max_downloads_per_user_per_hour,
-            "daily": self.config.max_downloads_per_user_per_day
+            "daily": self.config.max_downloads_per_user_per_day,
+            "hourly_mb": self.config.max_mb_per_user_per_hour,
+            "daily_mb": self.config.max_mb_per_user_per_day
         }
     
     def get_quality_options(self) -> List[str]:
@@ -149,6 +254,18 @@ class ConfigManager:
         if self.config.max_concurrent_downloads > 10:
             issues.append("MAX_CONCURRENT_DOWNLOADS should not exceed 10 for stability")
         
+        if self.config.min_concurrent_downloads > self.config.max_concurrent_downloads:
+            issues.append("MIN_CONCURRENT_DOWNLOADS cannot exceed MAX_CONCURRENT_DOWNLOADS")
+        
+        if self.config.interactive_slots >= self.config.global_max_downloads:
+            issues.append("INTERACTIVE_SLOTS must be lower than GLOBAL_MAX_DOWNLOADS or batches cannot run")
+        
+        if self.config.interactive_slots + self.config.fast_lane_slots >= self.config.global_max_downloads:
+            issues.append("INTERACTIVE_SLOTS + FAST_LANE_SLOTS must be lower than GLOBAL_MAX_DOWNLOADS or videos cannot run")
+        
+        if self.config.parallel_upload_lanes > 8:
+            issues.append("PARALLEL_UPLOAD_LANES should not exceed 8 to avoid flood waits")
+        
         if self.config.retry_attempts > 5:
             issues.append("RETRY_ATTEMPTS should not exceed 5")
         
@@ -8,7 +8,9 @@ import aiofiles
 import asyncio
 import logging
 import requests
+import cloudscraper
 import tgcrypto
+import shlex
 import subprocess
 import concurrent.futures
 from math import ceil
@@ -20,6 +22,11 @@ from pathlib import Path
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
 from base64 import b64decode
+from bot.services.process_supervisor import process_supervisor
+from bot.services.ytdlp_pool import ytdlp_pool
+from bot.services.http_downloader import http_downloader
+from bot.services.http_session import http_session
+from bot.services.aria2_rpc import Aria2Error, aria2_daemon
 
 # Initialize global variable to prevent NameError
 failed_counter = 0
@@ -32,18 +39,26 @@ def duration(filename):
         stderr=subprocess.STDOUT)
     return float(result.stdout)
 
-def get_mps_and_keys(api_url):
+async def get_duration(filename):
+    """Async ffprobe duration lookup that does not block the event loop"""
+    result = await process_supervisor.run(["ffprobe", "-v", "error", "-show_entries",
+                                           "format=duration", "-of",
+                                           "default=noprint_wrappers=1:nokey=1", filename])
+    return float(result.output.strip().splitlines()[-1])
+
+async def get_mps_and_keys(api_url):
     try:
         if not api_url:
             print("Error: api_url is None or empty")
             return None, None
             
-        response = requests.get(api_url)
-        if response.status_code != 200:
-            print(f"Error: API request failed with status {response.status_code}")
-            return None, None
+        session = await http_session.get()
+        async with session.get(api_url) as response:
+            if response.status != 200:
+                print(f"Error: API request failed with status {response.status}")
+                return None, None
+            response_json = await response.json(content_type=None)
             
-        response_json = response.json()
         if not response_json:
             print("Error: Empty response from API")
             return None, None
@@ -71,34 +86,42 @@ def pull_run(work, cmds):
         fut = executor.map(exec,cmds)
 async def aio(url,name):
     k = f'{name}.pdf'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                f = await aiofiles.open(k, mode='wb')
-                await f.write(await resp.read())
-                await f.close()
+    session = await http_session.get()
+    async with session.get(url) as resp:
+        if resp.status == 200:
+            await http_downloader.stream_response(resp, k)
     return k
 
 
 async def download(url,name):
     ka = f'{name}.pdf'
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                f = await aiofiles.open(ka, mode='wb')
-                await f.write(await resp.read())
-                await f.close()
+    session = await http_session.get()
+    async with session.get(url) as resp:
+        if resp.status == 200:
+            await http_downloader.stream_response(resp, ka)
     return ka
 
+async def scraper_download(url, file_name):
+    """Stream a cloudscraper download to disk without holding the body in memory"""
+    scraper = cloudscraper.create_scraper()
+    response = await asyncio.to_thread(scraper.get, url, stream=True)
+    try:
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.reason}")
+        total = int(response.headers.get("Content-Length") or 0) or None
+        return await asyncio.to_thread(
+            http_downloader.save_chunks,
+            response.iter_content(chunk_size=http_downloader.chunk_size),
+            file_name,
+            total
+        )
+    finally:
+        response.close()
+
 async def pdf_download(url, file_name, chunk_size=1024 * 10):
     if os.path.exists(file_name):
         os.remove(file_name)
-    r = requests.get(url, allow_redirects=True, stream=True)
-    with open(file_name, 'wb') as fd:
-        for chunk in r.iter_content(chunk_size=chunk_size):
-            if chunk:
-                fd.write(chunk)
-    return file_name   
+    return await http_downloader.download(url, file_name)
    
 
 def parse_vid_info(info):
@@ -149,14 +172,16 @@ def vid_info(info):
     return new_info
 
 
-async def decrypt_and_merge_video(mpd_url, keys_string, output_path, output_name, quality="720"):
+async def decrypt_and_merge_video(mpd_url, keys_string, output_path, output_name, quality="720", progress=None):
     try:
         output_path = Path(output_path)
         output_path.mkdir(parents=True, exist_ok=True)
 
-        cmd1 = f'yt-dlp -f "bv[height<={quality}]+ba/b" -o "{output_path}/file.%(ext)s" --allow-unplayable-format --no-check-certificate --external-downloader aria2c "{mpd_url}"'
-        print(f"Running command: {cmd1}")
-        os.system(cmd1)
+        # DASH is fragmented; with the shared aria2 daemon yt-dlp fetches fragments itself
+        downloader = ["--concurrent-fragments", "8"] if aria2_daemon.enabled else ["--external-downloader", "aria2c"]
+        cmd1 = ["yt-dlp", "-f", f"bv[height<={quality}]+ba/b", "-o", f"{output_path}/file.%(ext)s", "--allow-unplayable-format", "--no-check-certificate", *downloader, mpd_url]
+        print(f"Running command: {shlex.join(cmd1)}")
+        await ytdlp_pool.run(cmd1, progress=progress)
         
         avDir = list(output_path.iterdir())
         print(f"Downloaded files: {avDir}")
@@ -167,16 +192,16 @@ async def decrypt_and_merge_video(mpd_url, keys_string, output_path, output_name
 
         for data in avDir:
             if data.suffix == ".mp4" and not video_decrypted:
-                cmd2 = f'mp4decrypt {keys_string} --show-progress "{data}" "{output_path}/video.mp4"'
-                print(f"Running command: {cmd2}")
-                os.system(cmd2)
+                cmd2 = ["mp4decrypt", *shlex.split(keys_string), "--show-progress", str(data), f"{output_path}/video.mp4"]
+                print(f"Running command: {shlex.join(cmd2)}")
+                await process_supervisor.run(cmd2)
                 if (output_path / "video.mp4").exists():
                     video_decrypted = True
                 data.unlink()
             elif data.suffix == ".m4a" and not audio_decrypted:
-                cmd3 = f'mp4decrypt {keys_string} --show-progress "{data}" "{output_path}/audio.m4a"'
-                print(f"Running command: {cmd3}")
-                os.system(cmd3)
+                cmd3 = ["mp4decrypt", *shlex.split(keys_string), "--show-progress", str(data), f"{output_path}/audio.m4a"]
+                print(f"Running command: {shlex.join(cmd3)}")
+                await process_supervisor.run(cmd3)
                 if (output_path / "audio.m4a").exists():
                     audio_decrypted = True
                 data.unlink()
@@ -184,9 +209,9 @@ async def decrypt_and_merge_video(mpd_url, keys_string, output_path, output_name
         if not video_decrypted or not audio_decrypted:
             raise FileNotFoundError("Decryption failed: video or audio file not found.")
 
-        cmd4 = f'ffmpeg -i "{output_path}/video.mp4" -i "{output_path}/audio.m4a" -c copy "{output_path}/{output_name}.mp4"'
-        print(f"Running command: {cmd4}")
-        os.system(cmd4)
+        cmd4 = ["ffmpeg", "-i", f"{output_path}/video.mp4", "-i", f"{output_path}/audio.m4a", "-c", "copy", f"{output_path}/{output_name}.mp4"]
+        print(f"Running command: {shlex.join(cmd4)}")
+        await process_supervisor.run(cmd4)
         if (output_path / "video.mp4").exists():
             (output_path / "video.mp4").unlink()
         if (output_path / "audio.m4a").exists():
@@ -197,8 +222,8 @@ async def decrypt_and_merge_video(mpd_url, keys_string, output_path, output_name
         if not filename.exists():
             raise FileNotFoundError("Merged video file not found.")
 
-        cmd5 = f'ffmpeg -i "{filename}" 2>&1 | grep "Duration"'
-        duration_info = os.popen(cmd5).read()
+        probe = await process_supervisor.run(["ffmpeg", "-i", str(filename)])
+        duration_info = "\n".join(line for line in probe.output.splitlines() if "Duration" in line)
         print(f"Duration info: {duration_info}")
 
         return str(filename)
@@ -251,22 +276,54 @@ def time_name():
     return f"{date} {current_time}.mp4"
 
 
-async def download_video(url, cmd, name):
+async def download_with_aria2(cmd, progress=None):
+    """Download a yt-dlp command from one extraction, fetching a single direct file with the aria2 daemon
+
+    Returns ``(path, None)`` when aria2 fetched the file, or ``(None, result)``
+    when yt-dlp downloaded it itself (HLS/DASH, separate video+audio) from
+    the same extraction. ``(None, None)`` means aria2 failed on the direct
+    file and nothing was downloaded.
+    """
+    result, target = await ytdlp_pool.fetch(shlex.split(cmd), progress=progress)
+    if not target:
+        return None, result
+    try:
+        return await aria2_daemon.download(target["url"], target["filename"], target["http_headers"], progress=progress), None
+    except Aria2Error as e:
+        print(f"aria2 download failed, falling back to yt-dlp: {e}")
+        return None, None
+
+
+async def download_video(url, cmd, name, progress=None):
     if not cmd or not name:
         print("Error: cmd or name is None/empty")
         return None
 
-    download_cmd = f'{cmd} -R 25 --fragment-retries 25 --external-downloader aria2c --downloader-args "aria2c: -x 16 -j 32"'
+    if aria2_daemon.enabled:
+        # Fragmented formats: yt-dlp's native downloader, no aria2c per item
+        download_cmd = f'{cmd} -R 25 --fragment-retries 25 --concurrent-fragments 8'
+    else:
+        download_cmd = f'{cmd} -R 25 --fragment-retries 25 --external-downloader aria2c --downloader-args "aria2c: -x 16 -j 32"'
     global failed_counter
     print(download_cmd)
     logging.info(download_cmd)
 
     try:
-        k = subprocess.run(download_cmd, shell=True)
-        if "visionias" in cmd and k.returncode != 0 and failed_counter <= 10:
+        k = None
+        if aria2_daemon.enabled and await aria2_daemon.start():
+            # Single files go to the aria2 daemon; anything else is downloaded from the same extraction
+            path, k = await download_with_aria2(download_cmd, progress=progress)
+            if path and os.path.isfile(path):
+                return path
+        if k is None:
+            # Exec without a shell so the event loop keeps serving other downloads
+            k = await ytdlp_pool.run(shlex.split(download_cmd), progress=progress)
+        if not k.ok:
+            print(f"Download process for {name} {k.reason}")
+        if "visionias" in cmd and not k.ok and failed_counter <= 10:
             failed_counter += 1
             await asyncio.sleep(5)
-            return await download_video(url, cmd, name)
+            return await download_video(url, cmd, name, progress=progress)
         failed_counter = 0
 
         # Check for downloaded files
@@ -315,8 +372,8 @@ def decrypt_file(file_path, key):
                 mmapped_file[i] ^= ord(key[i]) if i < len(key) else i
     return True
 
-async def download_and_decrypt_video(url, cmd, name, key):
-    video_path = await download_video(url, cmd, name)
+async def download_and_decrypt_video(url, cmd, name, key, progress=None):
+    video_path = await download_video(url, cmd, name, progress=progress)
 
     if video_path:
         decrypted = decrypt_file(video_path, key)
@@ -327,6 +384,12 @@ async def download_and_decrypt_video(url, cmd, name, key):
             print(f"Failed to decrypt {video_path}.")
             return None
 
+async def generate_thumbnail(filename):
+    """Grab a frame at 10s as the video thumbnail, returns its path or None"""
+    await process_supervisor.run(["ffmpeg", "-i", filename, "-ss", "00:00:10", "-vframes", "1", f"{filename}.jpg"])
+    thumbnail = f"{filename}.jpg"
+    return thumbnail if os.path.exists(thumbnail) else None
+
 async def send_vid(bot: Client, m: Message, cc, filename, thumb, name, prog):
     try:
         if not filename or not os.path.exists(filename):
@@ -334,7 +397,7 @@ async def send_vid(bot: Client, m: Message, cc, filename, thumb, name, prog):
             return
 
         # Generate thumbnail
-        subprocess.run(f'ffmpeg -i "{filename}" -ss 00:00:10 -vframes 1 "{filename}.jpg"', shell=True)
+        await generate_thumbnail(filename)
 
         if prog:
             await prog.delete()
@@ -352,7 +415,7 @@ async def send_vid(bot: Client, m: Message, cc, filename, thumb, name, prog):
             thumbnail = None
 
         try:
-            dur = int(duration(filename))
+            dur = int(await get_duration(filename))
         except Exception as e:
             print(f"Duration error: {str(e)}")
             dur = 0
@@ -360,10 +423,10 @@ async def send_vid(bot: Client, m: Message, cc, filename, thumb, name, prog):
         start_time = time.time()
 
         try:
-            await m.reply_video(filename, caption=cc, supports_streaming=True, height=720, width=1280, thumb=thumbnail, duration=dur, progress=progress_bar, progress_args=(reply, start_time))
+            return await m.reply_video(filename, caption=cc, supports_streaming=True, height=720, width=1280, thumb=thumbnail, duration=dur, progress=progress_bar, progress_args=(reply, start_time))
         except Exception as e:
             print(f"Video upload failed, trying as document: {str(e)}")
-            await m.reply_document(filename, caption=cc, progress=progress_bar, progress_args=(reply, start_time))
+            return await m.reply_document(filename, caption=cc, progress=progress_bar, progress_args=(reply, start_time))
 
     except Exception as e:
         await m.reply_text(f"❌ Error in send_vid: {str(e)}")
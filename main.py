@@ -5,6 +5,7 @@ import m3u8
 import json
 import time
 import pytz
+import glob
 import asyncio
 import requests
 import subprocess
@@ -21,14 +22,21 @@ from bs4 import BeautifulSoup
 import handler as helper
 from utils import progress_bar
 from vars import API_ID, API_HASH, BOT_TOKEN, OWNER, OWNER_USERNAME, CREDIT, LOG_CHANNELS, BACKUP_LOG_CHANNELS, ALL_LOG_CHANNELS
+from config.settings import config as bot_config
+from bot.services.process_supervisor import process_supervisor
+from bot.services.ytdlp_pool import ytdlp_pool
+from bot.services.http_downloader import http_downloader
+from bot.services.http_session import http_session
+from bot.services.aria2_rpc import aria2_daemon
+from database.models import db_manager
 from aiohttp import ClientSession
 from subprocess import getstatusoutput
 from pytube import YouTube
 from aiohttp import web
 import random
 import pyromod.listen  # This patches the Client class with listen method
-from pyrogram import Client, filters
-from pyrogram.types import Message
+from pyrogram import Client, filters, idle
+from pyrogram.types import Message, CallbackQuery
 from pyrogram.errors import FloodWait
 # Removed problematic imports that don't exist in current Pyrogram version
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
@@ -43,7 +51,9 @@ bot = Client(
     "bot",
     api_id=API_ID,
     api_hash=API_HASH,
-    bot_token=BOT_TOKEN
+    bot_token=BOT_TOKEN,
+    # Allow parallel pre-uploads to actually push parts concurrently
+    max_concurrent_transmissions=max(1, bot_config.config.parallel_upload_lanes)
 )
 
 # Verify pyromod listen method is available
@@ -298,7 +308,7 @@ class LogChannelService:
             f"├── Uploaded: {uploaded}\n"
             f"├── Failed: {failed}\n"
             f"├── Success Rate: {success_rate:.1f}%\n\n"
-            f"⚡ **Method:** 5 Concurrent Downloads + Instant Sequential Uploads\n"
+            f"⚡ **Method:** Adaptive Concurrent Downloads + Instant Sequential Uploads\n"
             f"⏰ **Completed:** {timestamp}\n\n"
             f"🌟 **Bot:** {CREDIT}"
         )
@@ -324,8 +334,42 @@ async def initialize_bot_services():
     """Initialize services when bot starts"""
     print("🔄 Initializing log channel service...")
     await log_service.initialize()
+    await http_session.start()
+    await aria2_daemon.start()
     print("✅ All services initialized successfully!")
 
+async def shutdown_bot_services():
+    """Release shared resources when the bot stops"""
+    await ytdlp_pool.close()
+    await aria2_daemon.close()
+    await http_session.close()
+    await db_manager.close()
+    batch_journal.close()
+    quota_tracker.close()
+    await file_cache.close()
+    print("✅ Services shut down cleanly")
+
+async def run_bot():
+    """Start the client, idle until stopped, then drain batches and shut services down
+
+    ``idle`` returns on SIGTERM/SIGINT, which is how Render and Koyeb stop
+    the old instance on a deploy.
+    """
+    await bot.start()
+    try:
+        await offer_batch_resume()
+        await idle()
+    finally:
+        await drain_batches(bot_config.config.shutdown_grace_seconds)
+        # Jobs still asking their questions never started a batch
+        await job_runner.shutdown()
+        try:
+            # Handlers still waiting on a reply would hold the dispatcher open
+            await asyncio.wait_for(bot.stop(), timeout=15)
+        except asyncio.TimeoutError:
+            print("⚠️ Timed out waiting for handlers to stop")
+        await shutdown_bot_services()
+
 # Fix environment variable handling to prevent NoneType errors
 AUTH_USER_ENV = os.environ.get('AUTH_USERS', '7527795504')
 if AUTH_USER_ENV:
@@ -369,22 +413,14 @@ async def retry_pdf_download(url, name, m, max_retries=3):
             if "cwmediabkt99" in url:
                 await asyncio.sleep(2 ** attempt)  # Exponential backoff
                 url_clean = url.replace(" ", "%20")
-                scraper = cloudscraper.create_scraper()
-                response = scraper.get(url_clean)
-
-                if response.status_code == 200:
-                    with open(f'{name}.pdf', 'wb') as file:
-                        file.write(response.content)
-                    return True, f'{name}.pdf'
-                else:
-                    raise Exception(f"HTTP {response.status_code}: {response.reason}")
+                await helper.scraper_download(url_clean, f'{name}.pdf')
+                return True, f'{name}.pdf'
             else:
-                cmd = f'yt-dlp -o "{name}.pdf" "{url}" -R 25 --fragment-retries 25'
-                result = os.system(cmd)
-                if result == 0:  # Success
+                result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.pdf", url, "-R", "25", "--fragment-retries", "25"])
+                if result.ok:  # Success
                     return True, f'{name}.pdf'
                 else:
-                    raise Exception(f"yt-dlp failed with code {result}")
+                    raise Exception(f"yt-dlp {result.reason}")
 
         except Exception as e:
             if attempt == max_retries - 1:  # Last attempt
@@ -393,11 +429,11 @@ async def retry_pdf_download(url, name, m, max_retries=3):
 
     return False, "Max retries exceeded"
 
-async def retry_video_download(url, cmd, name, max_retries=3):
+async def retry_video_download(url, cmd, name, max_retries=3, progress=None):
     """Retry video downloads with helper functions"""
     for attempt in range(max_retries):
         try:
-            result = await helper.download_video(url, cmd, name)
+            result = await helper.download_video(url, cmd, name, progress=progress)
 
             if result:  # Success
                 return True, result
@@ -411,11 +447,11 @@ async def retry_video_download(url, cmd, name, max_retries=3):
 
     return False, "Max retries exceeded"
 
-async def retry_encrypted_download(url, cmd, name, appxkey, max_retries=3):
+async def retry_encrypted_download(url, cmd, name, appxkey, max_retries=3, progress=None):
     """Retry encrypted video downloads"""
     for attempt in range(max_retries):
         try:
-            result = await helper.download_and_decrypt_video(url, cmd, name, appxkey)
+            result = await helper.download_and_decrypt_video(url, cmd, name, appxkey, progress=progress)
 
             if result:  # Success
                 return True, result
@@ -429,11 +465,11 @@ async def retry_encrypted_download(url, cmd, name, appxkey, max_retries=3):
 
     return False, "Max retries exceeded"
 
-async def retry_drm_download(mpd, keys_string, path, name, quality, max_retries=3):
+async def retry_drm_download(mpd, keys_string, path, name, quality, max_retries=3, progress=None):
     """Retry DRM video downloads"""
     for attempt in range(max_retries):
         try:
-            result = await helper.decrypt_and_merge_video(mpd, keys_string, path, name, quality)
+            result = await helper.decrypt_and_merge_video(mpd, keys_string, path, name, quality, progress=progress)
 
             if result:  # Success
                 return True, result
@@ -453,22 +489,19 @@ async def retry_generic_download(url, name, download_type, max_retries=3):
         try:
             if download_type in ["jpg", "jpeg", "png"]:
                 ext = url.split('.')[-1]
-                cmd = f'yt-dlp -o "{name}.{ext}" "{url}" -R 25 --fragment-retries 25'
-                result = os.system(cmd)
+                result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.{ext}", url, "-R", "25", "--fragment-retries", "25"])
             elif download_type in ["mp3", "wav", "m4a"]:
                 ext = url.split('.')[-1]
-                cmd = f'yt-dlp -o "{name}.{ext}" "{url}" -R 25 --fragment-retries 25'
-                result = os.system(cmd)
+                result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.{ext}", url, "-R", "25", "--fragment-retries", "25"])
             elif download_type == "zip":
-                cmd = f'yt-dlp -o "{name}.zip" "{url}" -R 25 --fragment-retries 25'
-                result = os.system(cmd)
+                result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.zip", url, "-R", "25", "--fragment-retries", "25"])
             else:
                 raise Exception(f"Unsupported download type: {download_type}")
 
-            if result == 0:  # Success
+            if result.ok:  # Success
                 return True, f'{name}.{ext if download_type != "zip" else "zip"}'
             else:
-                raise Exception(f"Command failed with code {result}")
+                raise Exception(f"Command {result.reason}")
 
         except Exception as e:
             if attempt == max_retries - 1:  # Last attempt
@@ -882,14 +915,58 @@ async def mfile_handler(client: Client, m: Message):
         await m.reply_text(f"⚠️ An error occurred: {str(e)}")
 
 @bot.on_message(filters.command(["stop"]) )
-async def restart_handler(_, m):
+async def stop_handler(_, m):
     # Check if user is authorized
     if m.from_user.id not in AUTH_USERS:
         return await m.reply_text(f"❌ You are not authorized to use this command. Contact the bot owner {OWNER_USERNAME} for access.")
 
-    await m.reply_text("**🚦STOPPED🚦**", True)
+    # Users stop their own batches in this chat; the owner can stop any of them
+    user_id = None if m.from_user.id == OWNER else m.from_user.id
+    tokens = cancel_registry.find(chat_id=m.chat.id, user_id=user_id)
+    if not tokens:
+        return await m.reply_text("**ℹ️ No running batch to stop in this chat.**", True)
+
+    if len(m.command) > 1 and m.command[1].isdigit():
+        # /stop N skips item N and keeps the rest of the batch going
+        items = [token.find(m.command[1]) for token in tokens]
+        items = [item for item in items if item is not None]
+        for item in items:
+            item.cancel("skipped by user")
+        if not items:
+            return await m.reply_text(f"**ℹ️ Item {m.command[1]} is not queued or downloading.**", True)
+        return await m.reply_text(f"**⏭ Item {m.command[1]} cancelled, the batch continues.**", True)
+
+    for token in tokens:
+        token.cancel("stopped by user")
+    await m.reply_text(f"**🚦STOPPED🚦** {len(tokens)} batch(es). Other users' batches keep running.", True)
+
+@bot.on_message(filters.command(["restart"]) )
+async def restart_handler(_, m):
+    # Restarting kills every running batch, so only the owner may do it
+    if m.from_user.id != OWNER:
+        return await m.reply_text(f"❌ Only the bot owner {OWNER_USERNAME} can restart the bot.")
+
+    await m.reply_text("**🚦RESTARTING🚦**", True)
+    # exec keeps the pid but not the children: stop the aria2 daemon (it would
+    # keep its RPC port) and the yt-dlp workers, and flush the stores first
+    await shutdown_bot_services()
     os.execl(sys.executable, sys.executable, *sys.argv)
 
+@bot.on_message(filters.command(["uncache"]) & filters.private)
+async def uncache_handler(_, m: Message):
+    """Drop cached file_ids so the next request downloads again (e.g. a re-recorded lecture)"""
+    if m.from_user.id != OWNER:
+        return await m.reply_text(f"❌ Only the bot owner {OWNER_USERNAME} can clear the file cache.")
+    if len(m.command) < 2:
+        return await m.reply_text(
+            f"**Usage:** `/uncache URL` or `/uncache all`\n\n"
+            f"⚡ Cache hits: {file_cache.hits}, misses: {file_cache.misses}, duplicate contents: {file_cache.duplicates}"
+        )
+
+    target = m.command[1]
+    removed = await file_cache.invalidate(None if target.lower() == "all" else target)
+    await m.reply_text(f"🗑 Removed {removed} cached file(s)")
+
 @bot.on_message(filters.command(["start"]))
 async def start_command(bot: Client, message: Message):
     random_image_url = random.choice(image_urls)
@@ -940,7 +1017,8 @@ async def txt_handler(client: Client, m: Message):
         f"➥ /drm – Extract from .txt (Auto) 🔒\n"
         f"➥ /y2t – YouTube → .txt Converter 🔒\n"
         f"➥ /t2t – Text → .txt Generator 🔒\n"
-        f"➥ /stop – Cancel Running Task 🔒\n"
+        f"➥ /stop – Cancel Your Running Batch 🔒\n"
+        f"➥ /stop N – Skip Item N Of It 🔒\n"
         f"▰▰▰▰▰▰▰▰▰▰▰▰▰▰▰▰ \n"
         f"⚙️ 𝗧𝗼𝗼𝗹𝘀 & 𝗦𝗲𝘁𝘁𝗶𝗻𝗴𝘀: \n\n"
         f"➥ /cookies – Update YT Cookies 🔒\n"
@@ -952,6 +1030,8 @@ async def txt_handler(client: Client, m: Message):
         f"➥ /add_user xxxx – Add User ID\n"
         f"➥ /remove_user xxxx – Remove User ID\n"
         f"➥ /users – Total User List\n"
+        f"➥ /restart – Restart The Bot\n"
+        f"➥ /uncache URL|all – Forget Cached Uploads\n"
         f"▰▰▰▰▰▰▰▰▰▰▰▰▰▰▰▰\n"
         f"📁 𝐂𝐡𝐚𝐧𝐧𝐞𝐥𝐬: **(Auth Users)**\n\n"
         f"➥ /add_channel -100xxxx – Add\n"
@@ -1010,22 +1090,14 @@ async def retry_pdf_download_enhanced(url, name, m, max_retries=3):
             if "cwmediabkt99" in url:
                 await asyncio.sleep(2 ** attempt)
                 url_clean = url.replace(" ", "%20")
-                scraper = cloudscraper.create_scraper()
-                response = scraper.get(url_clean)
-
-                if response.status_code == 200:
-                    with open(f'{name}.pdf', 'wb') as file:
-                        file.write(response.content)
-                    return True, f'{name}.pdf'
-                else:
-                    raise Exception(f"HTTP {response.status_code}: {response.reason}")
+                await helper.scraper_download(url_clean, f'{name}.pdf')
+                return True, f'{name}.pdf'
             else:
-                cmd = f'yt-dlp -o "{name}.pdf" "{url}" -R 25 --fragment-retries 25'
-                result = os.system(cmd)
-                if result == 0:
+                result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.pdf", url, "-R", "25", "--fragment-retries", "25"])
+                if result.ok:
                     return True, f'{name}.pdf'
                 else:
-                    raise Exception(f"yt-dlp failed with code {result}")
+                    raise Exception(f"yt-dlp {result.reason}")
 
         except Exception as e:
             if attempt == max_retries - 1:
@@ -1046,17 +1118,19 @@ async def retry_ws_download(url, name, max_retries=3):
             await asyncio.sleep(2 ** attempt)
     return False, "Max retries exceeded"
 
-async def retry_media_download(url, name, file_type, max_retries=3):
+async def retry_media_download(url, name, file_type, max_retries=3, progress=None):
     """Retry media downloads (images, audio, etc.)"""
     for attempt in range(max_retries):
         try:
             ext = url.split('.')[-1]
-            cmd = f'yt-dlp -o "{name}.{ext}" "{url}" -R 25 --fragment-retries 25'
-            result = os.system(cmd)
-            if result == 0:
+            if url.startswith(("http://", "https://")):
+                await http_downloader.download(url, f'{name}.{ext}', progress=progress)
+                return True, f'{name}.{ext}'
+            result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.{ext}", url, "-R", "25", "--fragment-retries", "25"], progress=progress)
+            if result.ok:
                 return True, f'{name}.{ext}'
             else:
-                raise Exception(f"Command failed with code {result}")
+                raise Exception(f"Command {result.reason}")
         except Exception as e:
             if attempt == max_retries - 1:
                 return False, str(e)
@@ -1069,8 +1143,25 @@ async def retry_media_download(url, name, file_type, max_retries=3):
 # ENHANCED CONCURRENT DOWNLOAD-UPLOAD SYSTEM
 import asyncio
 from collections import deque
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple, Any
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, Any
+from bot.services.reorder_buffer import ReorderBuffer
+from bot.services.pre_upload import PreUploadService
+from bot.services.progress import DownloadProgress, ProgressTracker
+from bot.services.host_limiter import host_limiter
+from bot.services.backpressure import backpressure
+from bot.services.concurrency import AdaptiveConcurrency
+from bot.services.scheduler import download_scheduler
+from bot.services.task_classifier import task_classifier
+from bot.services.batch_journal import batch_journal, item_fingerprint
+from bot.services.cancellation import CancelToken, cancel_registry
+from bot.services.job_runner import job_runner
+from bot.services.quota import quota_tracker
+from bot.services.file_cache import CachedFile, cached_file, file_cache
+from bot.services.single_flight import Flight, single_flight
+from bot.utils.helpers import clean_link, normalize_url
+
+REPLAY_CHUNK = 100  # messages per forward_messages call (Telegram's limit)
 
 @dataclass
 class DownloadTask:
@@ -1084,23 +1175,54 @@ class DownloadTask:
     status: str = "pending"  # pending, downloading, completed, failed, uploading, uploaded
     retry_count: int = 0
     error_message: Optional[str] = None
+    pre_upload: Optional[asyncio.Task] = None  # Parallel pre-upload of the file parts
+    progress: Optional[DownloadProgress] = None  # Latest parsed download progress
+    host: str = ""  # Host the link points to, for per-host limits
+    file_size: int = 0  # Bytes on disk counted against the upload backlog
+    fast_lane: bool = False  # Small item downloaded on the fast lane workers
+    resume_path: Optional[str] = None  # Complete file left by an interrupted run
+    token: Optional[CancelToken] = None  # Cancels just this item
+    cached: Optional[CachedFile] = None  # Published before; resent by file_id
+    digest: Optional[str] = None  # SHA-256 of the downloaded file
+    flight: Optional[Flight] = None  # Download shared with other batches
+    primary: Optional["DownloadTask"] = None  # Earlier index of this batch with the same link
+    copies: List["DownloadTask"] = field(default_factory=list)  # Later indexes reusing this download
+    published: Optional[CachedFile] = None  # What this item was sent as, for its copies
+    charged: bool = False  # Counted against the owner's quota (really downloaded)
+
+    @property
+    def local_copy(self) -> bool:
+        """The file was downloaded (or shared) to disk, not just found in the URL cache"""
+        return bool(self.digest or self.flight)
 
 class ConcurrentDownloadUploadManager:
-    """Manages 5 concurrent downloads with instant sequential uploads"""
+    """Manages adaptive concurrent downloads with instant sequential uploads"""
 
-    def __init__(self, bot: Client, message: Message, max_concurrent: int = 5):
+    running: Set["ConcurrentDownloadUploadManager"] = set()  # Batches in progress, drained on shutdown
+    accepting = True  # Cleared on shutdown so no new batch starts
+
+    def __init__(self, bot: Client, message: Message):
         self.bot = bot
         self.message = message
-        self.max_concurrent = max_concurrent
-        self.download_semaphore = asyncio.Semaphore(max_concurrent)
+        self.concurrency = AdaptiveConcurrency(
+            minimum=bot_config.config.min_concurrent_downloads,
+            maximum=bot_config.config.max_concurrent_downloads
+        )
         self.upload_lock = asyncio.Lock()
+        self.pre_uploader = PreUploadService(bot, bot_config.config.parallel_upload_lanes)
 
         # Queues and tracking
         self.download_queue = deque()
-        self.upload_queue = asyncio.Queue()  # Changed to asyncio.Queue for async operations
+        self.fast_queue = deque()      # Small items served by the fast lane
+        self.upload_buffer = ReorderBuffer()  # Releases finished downloads in index order
         self.completed_downloads = {}  # index -> DownloadTask
-        self.active_downloads = {}     # index -> asyncio.Task
-        self.upload_sequence = 1       # Next expected upload sequence
+        self.active_downloads = {}     # index -> DownloadTask
+        self.status_message = None     # Message edited with live download progress
+        self.bytes_downloaded = 0      # Bytes of finished downloads, for throughput
+        self.journal_id = None         # Batch id in the crash-safe journal
+        self.token = None              # Cancels the whole batch
+        self.draining = False          # Shutting down: keep the batch for resume
+        self.finished = asyncio.Event()  # Set once process_batch returns
 
         # Statistics
         self.stats = {
@@ -1109,19 +1231,71 @@ class ConcurrentDownloadUploadManager:
             'uploaded': 0,
             'failed': 0,
             'active_downloads': 0,
-            'uploading': False
+            'uploading': False,
+            'backlog_bytes': 0,     # downloaded bytes waiting for upload (all batches)
+            'backlog_budget': backpressure.backlog_budget,
+            'paused_seconds': 0.0,  # time this batch's downloads waited on backpressure
+            'concurrency': self.concurrency.limit,
+            'peak_concurrency': self.concurrency.limit,
+            'fast_lane': 0,         # items sent to the fast lane
+            'resumed': 0,           # items already published before a restart
+            'cancelled': False,
+            'drained': False,       # stopped by a shutdown, kept for resume
+            'quota_deferred': 0,    # items that waited for the owner's quota
+            'quota_wait': 0.0,      # seconds until the owner is under quota again
+            'cache_hits': 0,        # items resent by file_id without downloading
+            'duplicates': 0,        # downloads whose bytes were already published
+            'coalesced': 0,         # items shared from another batch's download
+            'replayed': 0,          # items forwarded from an earlier run of the same list
+            'collapsed': 0          # repeated links of this batch sent from one download
         }
 
         # Configuration from original handler
         self.config = {}
 
-    async def process_batch(self, links: List, start_index: int, config: Dict):
-        """Main batch processing with concurrent downloads and instant uploads"""
+    async def process_batch(self, links: List, start_index: int, config: Dict, status_message: Optional[Message] = None,
+                            journal_id: Optional[int] = None):
+        """Main batch processing with concurrent downloads and instant uploads
+
+        Pass ``journal_id`` to resume an interrupted batch from the journal.
+        """
         self.config = config
+        self.status_message = status_message
         self.stats['total'] = len(links) - start_index + 1
-
-        # Initialize download tasks
+        self.upload_buffer = ReorderBuffer(start_index, len(links))
+
+        # Journal every transition so a crash or restart does not lose the batch
+        items = {}
+        if journal_id is None:
+            journal_id = batch_journal.start_batch(self.message.chat.id, self._owner_id(),
+                                                   config.get('batch_name', ''), links, config, start_index)
+            self.journal_id = journal_id
+            if bot_config.config.batch_replay:
+                # Items published by an earlier run of this list are forwarded in bulk
+                items = await self._replay_archived(links, start_index)
+        else:
+            items = batch_journal.load(journal_id)["items"]
+        self.journal_id = journal_id
+
+        # Cancelling the batch (/stop) stops only this batch's downloads and uploads
+        self.token = cancel_registry.register(CancelToken(
+            config.get('batch_name', ''), chat_id=self.message.chat.id, user_id=self._owner_id()
+        ))
+        self.token.on_cancel(self._on_cancel)
+        self.running.add(self)
+
+        # Initialize download tasks; a link repeated in the list is downloaded once
+        primaries = {}
         for i in range(start_index - 1, len(links)):
+            state = items.get(i + 1)
+            if state and state['status'] in ("uploaded", "replayed"):
+                # Published before the interruption, or forwarded from an earlier run
+                self.upload_buffer.skip(i + 1)
+                self.stats['resumed' if state['status'] == "uploaded" else 'replayed'] += 1
+                self.stats['downloaded'] += 1
+                self.stats['uploaded'] += 1
+                continue
+
             task = DownloadTask(
                 index=i + 1,
                 url="",  # Will be set during processing
@@ -1129,83 +1303,601 @@ class ConcurrentDownloadUploadManager:
                 link_data=links[i],
                 original_url=""  # Will be set during processing
             )
-            self.download_queue.append(task)
+            task.token = self.token.child(str(task.index))
+            if len(links[i]) > 1 and links[i][1]:
+                primary = primaries.setdefault(normalize_url(links[i][1]), task)
+                if primary is not task:
+                    # Sent with its own caption once the first occurrence is published
+                    task.primary = primary
+                    primary.copies.append(task)
+                    self.stats['collapsed'] += 1
+                    continue
+            if state and state['status'] == "completed":
+                task.resume_path = state['file_path']
+            if len(links[i]) > 1 and links[i][1]:
+                task.host = host_limiter.host_of(links[i][1])
+                task.fast_lane = bot_config.config.fast_lane_workers > 0 and task_classifier.is_small(links[i][1], task.host)
+            if task.fast_lane:
+                self.fast_queue.append(task)
+                self.stats['fast_lane'] += 1
+            else:
+                self.download_queue.append(task)
 
-        # Start concurrent processing
-        download_tasks = []
-        for _ in range(min(self.max_concurrent, len(self.download_queue))):
-            if self.download_queue:
-                task = asyncio.create_task(self._download_worker())
-                download_tasks.append(task)
+        # Concurrent batches queue for admission and share the global slots fairly
+        self.ticket = download_scheduler.register(self._owner_id(), config.get('batch_name', ''))
+        controller_task = reporter_task = None
 
-        # Start upload worker
-        upload_task = asyncio.create_task(self._upload_worker())
+        try:
+            await self._until_cancelled(self.token.attach(asyncio.create_task(self._wait_for_turn())))
+
+            # Start concurrent processing; the controller decides how many run at once
+            download_tasks = []
+            for _ in range(min(self.concurrency.maximum, len(self.download_queue))):
+                if self.download_queue:
+                    task = self.token.attach(asyncio.create_task(self._download_worker()))
+                    download_tasks.append(task)
+            for _ in range(min(bot_config.config.fast_lane_workers, len(self.fast_queue))):
+                download_tasks.append(self.token.attach(asyncio.create_task(self._fast_lane_worker())))
+            controller_task = asyncio.create_task(self._concurrency_controller())
+
+            # Start upload worker
+            upload_task = self.token.attach(asyncio.create_task(self._upload_worker()))
+            reporter_task = asyncio.create_task(self._progress_reporter()) if status_message else None
+
+            # Wait for all downloads to complete
+            await asyncio.gather(*download_tasks, return_exceptions=True)
+
+            # Signal upload worker to finish remaining uploads; a drained batch
+            # stops at the first missing index so the order survives the resume
+            self.upload_buffer.close(release_gaps=not self.draining)
+            await self._until_cancelled(upload_task)
+            # A cancelled batch is not offered for resume either
+            if not self.draining:
+                batch_journal.finish_batch(self.journal_id)
+        finally:
+            self.running.discard(self)
+            self.finished.set()
+            cancel_registry.unregister(self.token)
+            download_scheduler.unregister(self.ticket)
+            if controller_task:
+                controller_task.cancel()
+            if reporter_task:
+                reporter_task.cancel()
+            # Release whatever never reached the uploader (cancelled batch)
+            for task in self.completed_downloads.values():
+                backpressure.remove(task.file_size)
+                local_file = (task.file_path != "zip_handled" and task.primary is None
+                              and (task.cached is None or task.local_copy))
+                if self.token.cancelled and not self.draining and local_file:
+                    self._remove_file(task.file_path)
+            self.completed_downloads.clear()
+            self.stats['backlog_bytes'] = backpressure.backlog_bytes
+            self.stats['cancelled'] = self.token.cancelled and not self.draining
+            self.stats['drained'] = self.draining
 
-        # Wait for all downloads to complete
-        await asyncio.gather(*download_tasks, return_exceptions=True)
+        return self.stats
 
-        # Signal upload worker to finish remaining uploads
-        await self.upload_queue.put(None)  # Sentinel value
-        await upload_task
+    async def _until_cancelled(self, stage: asyncio.Task):
+        """Await a batch stage; cancelling the batch ends the stage instead of raising"""
+        try:
+            # Unlike awaiting the stage, asyncio.wait leaves it alone when this task
+            # is cancelled, so a shutdown is told apart from the batch's own cancel
+            await asyncio.wait([stage])
+        except asyncio.CancelledError:
+            stage.cancel()
+            raise
+        if not stage.cancelled():
+            stage.result()
+        elif not self.token.cancelled:
+            raise asyncio.CancelledError()
+
+    def _on_cancel(self):
+        """Drop everything still queued and stop pushing parts of unpublished files"""
+        self.download_queue.clear()
+        self.fast_queue.clear()
+        for task in self.completed_downloads.values():
+            if task.pre_upload is not None:
+                task.pre_upload.cancel()
+        print(f"⛔ Batch {self.config.get('batch_name', '')} cancelled: {self.token.reason}")
+
+    def drain(self):
+        """Start no more downloads; running downloads finish and upload in order"""
+        if self.draining:
+            return
+        self.draining = True
+        self.download_queue.clear()
+        self.fast_queue.clear()
+        print(f"⏳ Draining batch {self.config.get('batch_name', '')}")
+        if self.token and not self.ticket.admitted:
+            # Still queued behind other batches: nothing to finish
+            self.token.cancel("bot restarting")
+
+    def checkpoint(self):
+        """Stop a draining batch now, keeping finished files and partial downloads for resume"""
+        self.drain()
+        if self.token:
+            self.token.cancel("bot restarting")
+
+    def cancel_item(self, index: int) -> bool:
+        """Cancel one queued or downloading item; the rest of the batch continues"""
+        token = self.token.find(str(index)) if self.token else None
+        if token is None:
+            return False
+        token.cancel("skipped by user")
+        return True
+
+    @staticmethod
+    def _remove_file(path: Optional[str]):
+        try:
+            if path and os.path.isfile(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"⚠️ Could not remove {path}: {e}")
+
+    def _remove_partials(self, task: DownloadTask):
+        """Delete what a cancelled download left behind (.part, .ytdl, .aria2, fragments)"""
+        if not task.name:
+            return
+        markers = (".part", ".ytdl", ".aria2", ".temp", "Frag")
+        for folder in {".", self.config.get('path', '.')}:
+            for path in glob.glob(os.path.join(glob.escape(folder), f"{glob.escape(task.name)}*")):
+                if any(marker in path for marker in markers) or path == task.file_path:
+                    self._remove_file(path)
+
+    async def _follow_flight(self, task: DownloadTask) -> bool:
+        """Wait for another batch's download of the same item; False when this task downloads it"""
+        key = (normalize_url(task.original_url), *self._cache_key(task))
+        while True:
+            task.flight, leader = single_flight.join(key)
+            if leader:
+                return False
+            path = await single_flight.follow(task.flight, task.name)
+            if path:
+                task.file_path = path
+                task.status = "completed"
+                self.stats['downloaded'] += 1
+                self.stats['coalesced'] += 1
+                self.completed_downloads[task.index] = task
+                return True
+            # The leader failed; lead the next attempt unless another batch already does
+
+    def _cache_key(self, task: DownloadTask) -> Tuple[str, str]:
+        """Quality and kind an item is cached under; quality only matters for videos"""
+        kind = task_classifier.kind(task.original_url)
+        return ("" if kind == "small" else str(self.config.get('quality', '')), kind)
+
+    def _owner_id(self) -> int:
+        """User the batch's share of download slots is accounted to"""
+        if self.config.get('user_id'):
+            return self.config['user_id']
+        return self.message.from_user.id if self.message.from_user else self.message.chat.id
+
+    async def _replay_archived(self, links: List, start_index: int) -> Dict[int, Dict]:
+        """Forward the archived messages of items published before; returns their states by index
+
+        Consecutive items archived in the same chat go out in one
+        forward_messages call of up to 100 messages. Items whose archived
+        message was deleted, and items never published, are left to the
+        normal download path.
+        """
+        quality = self.config.get('quality', '')
+        keys = {i + 1: item_fingerprint(links[i], quality)
+                for i in range(start_index - 1, len(links)) if len(links[i]) > 1}
+        archived = batch_journal.archived(keys.values())
+        if not archived:
+            return {}
+
+        runs = []  # (source chat, [(index, message id), ...]) in batch order
+        for index, key in keys.items():
+            if key not in archived:
+                continue
+            chat_id, message_id = archived[key]
+            if runs and runs[-1][0] == chat_id and len(runs[-1][1]) < REPLAY_CHUNK:
+                runs[-1][1].append((index, message_id))
+            else:
+                runs.append((chat_id, [(index, message_id)]))
 
-        return self.stats
+        replayed = {}
+        for chat_id, run in runs:
+            try:
+                # The user may have deleted some of the originals since
+                found = await self.bot.get_messages(chat_id, [message_id for _, message_id in run])
+                alive = {message.id for message in found if not message.empty}
+                gone = [(index, message_id) for index, message_id in run if message_id not in alive]
+                batch_journal.unarchive(keys[index] for index, _ in gone)
+                run = [(index, message_id) for index, message_id in run if message_id in alive]
+                if not run:
+                    continue
+                while True:
+                    try:
+                        sent = await self.bot.forward_messages(self.message.chat.id, chat_id,
+                                                               [message_id for _, message_id in run])
+                        break
+                    except FloodWait as e:
+                        await asyncio.sleep(e.value)
+            except Exception as e:
+                print(f"⚠️ Could not replay {len(run)} archived items from {chat_id}: {e}")
+                continue
+            for (index, _), message in zip(run, sent):
+                batch_journal.record(self.journal_id, index, "uploaded", message_id=message.id)
+                replayed[index] = {"status": "replayed"}
+
+        if replayed:
+            print(f"📨 Replayed {len(replayed)} archived items of {self.config.get('batch_name', '')}")
+        return replayed
+
+    async def _wait_for_turn(self, interval: int = 15):
+        """Wait for admission while other batches run, showing the queue position"""
+        last_position = None
+        while not await download_scheduler.wait_admitted(self.ticket, timeout=interval):
+            position = download_scheduler.position(self.ticket)
+            if position == last_position or not self.status_message:
+                continue
+            last_position = position
+            try:
+                await self.status_message.edit(
+                    f"__**🎯Target Batch : {self.config.get('batch_name', 'Unknown')}**__\n\n"
+                    f"**⏳ Queued behind other batches — position {position}**\n"
+                    f"Downloads start automatically when a slot frees up."
+                )
+            except Exception as e:
+                print(f"⚠️ Failed to update queue position: {e}")
+
+    async def _next_task(self, queue: deque) -> Optional[DownloadTask]:
+        """Pick the first queued task whose host has a free slot and a closed breaker
+
+        Tasks for hosts whose breaker keeps reopening fail fast; tasks for a
+        host in cooldown stay queued while other hosts are served.
+        """
+        while queue:
+            for task in list(queue):
+                if task.token.cancelled:
+                    queue.remove(task)
+                    self._skip_cancelled(task)
+                elif host_limiter.is_down(task.host):
+                    queue.remove(task)
+                    await self._fail_fast(task)
+                elif host_limiter.can_start(task.host):
+                    queue.remove(task)
+                    host_limiter.acquire(task.host)
+                    return task
+
+            if not queue:
+                break
+            # Everything left waits on a busy or cooling-down host
+            cooldowns = [host_limiter.retry_in(task.host) for task in queue]
+            wake = min([c for c in cooldowns if c > 0], default=None)
+            await host_limiter.wait_for_change(timeout=wake)
+        return None
+
+    async def _fail_fast(self, task: DownloadTask):
+        """Fail a task without downloading because its host is down"""
+        task.status = "failed"
+        task.error_message = f"Host {task.host} is unavailable (circuit open)"
+        self.stats['failed'] += 1
+        self.upload_buffer.skip(task.index)
+        batch_journal.record(self.journal_id, task.index, "failed", error=task.error_message)
+        self._settle_copies(task)
+        await self._send_error_message(task, task.error_message)
+
+    def _skip_cancelled(self, task: DownloadTask):
+        """Give up on an item cancelled before its download started"""
+        task.status = "cancelled"
+        task.error_message = task.token.reason or "cancelled"
+        task.token.close()
+        self.upload_buffer.skip(task.index)
+        batch_journal.record(self.journal_id, task.index, "cancelled", error=task.error_message)
+        self._settle_copies(task)
+
+    def _settle_copies(self, task: DownloadTask):
+        """Hand the outcome of a download to the later indexes with the same link
+
+        Copies of a finished download go to the reorder buffer and are sent
+        by the file_id their primary is published as (a ZIP button is simply
+        sent again); copies of a failed or cancelled download end the same way.
+        A copy cancelled with /stop N is skipped whatever its primary did.
+        """
+        for copy in task.copies:
+            self._parse_link(copy)
+            copy.token.close()
+            if copy.token.cancelled:
+                copy.status = "cancelled"
+                copy.error_message = copy.token.reason
+                self.upload_buffer.skip(copy.index)
+                batch_journal.record(self.journal_id, copy.index, "cancelled", error=copy.error_message)
+                continue
+            if task.status == "completed":
+                copy.url = task.url
+                copy.file_path = task.file_path
+                copy.status = "completed"
+                self.stats['downloaded'] += 1
+                self.completed_downloads[copy.index] = copy
+                self.upload_buffer.put(copy.index, copy)
+                continue
+            copy.status = task.status
+            copy.error_message = f"Same link as {str(task.index).zfill(3)}: {task.error_message}"
+            if copy.status == "failed":
+                self.stats['failed'] += 1
+            self.upload_buffer.skip(copy.index)
+            batch_journal.record(self.journal_id, copy.index, copy.status, error=copy.error_message)
 
     async def _download_worker(self):
-        """Worker that processes downloads with semaphore control"""
+        """Worker that processes downloads under the adaptive limit and per-host control"""
         while self.download_queue:
-            async with self.download_semaphore:
-                if not self.download_queue:
+            await self._wait_for_quota()
+            await self.concurrency.acquire()
+            task = None
+            try:
+                task = await self._next_task(self.download_queue)
+                if task is None:
                     break
 
-                task = self.download_queue.popleft()
-                self.stats['active_downloads'] += 1
+                # Hold new downloads while finished files pile up ahead of the uploader
+                await self._wait_for_capacity(task)
 
+                # Global ceiling shared fairly with other users' batches
+                await download_scheduler.acquire(self.ticket)
                 try:
-                    # Process the download task
-                    await self._process_download_task(task)
+                    # /stop N may have landed while the item waited for room or a slot
+                    if task.token.cancelled:
+                        host_limiter.release(task.host, success=None)
+                        self._skip_cancelled(task)
+                    else:
+                        await self._run_task(task)
+                finally:
+                    download_scheduler.release(self.ticket)
+            finally:
+                outcome = None if task is None or task.status == "cancelled" else task.status == "completed"
+                await self.concurrency.release(outcome)
+
+    async def _fast_lane_worker(self):
+        """Worker for small items, on the global slots kept for them so they never wait behind long videos
+
+        Finished items sit in the reorder buffer and publish as soon as their
+        turn comes.
+        """
+        while self.fast_queue:
+            await self._wait_for_quota()
+            task = await self._next_task(self.fast_queue)
+            if task is None:
+                break
+            await self._wait_for_capacity(task)
 
-                    # Instant upload trigger
-                    if task.status == "completed":
-                        await self._trigger_instant_upload(task)
+            # Small items take a global slot too, from the share kept for them;
+            # only the adaptive per-batch limit is left out of this lane
+            await download_scheduler.acquire(self.ticket, small=True)
+            try:
+                if task.token.cancelled:
+                    host_limiter.release(task.host, success=None)
+                    self._skip_cancelled(task)
+                else:
+                    await self._run_task(task)
+            finally:
+                download_scheduler.release(self.ticket, small=True)
+
+    async def _run_task(self, task: DownloadTask):
+        """Download one task taken from a queue and hand it to the uploader"""
+        self.stats['active_downloads'] += 1
+        self.active_downloads[task.index] = task
+        batch_journal.record(self.journal_id, task.index, "downloading")
+        started = time.time()
+        worker = asyncio.current_task()
 
-                except Exception as e:
-                    task.status = "failed"
-                    task.error_message = str(e)
-                    self.stats['failed'] += 1
-                    await self._send_error_message(task, str(e))
+        try:
+            # Cancelling the item cancels this worker while it runs the item
+            task.token.attach(worker)
+
+            # Process the download task
+            await self._process_download_task(task)
+
+            # Instant upload trigger
+            if task.status == "completed":
+                if task.cached is None:
+                    task_classifier.record(task.link_data[1], task.host, time.time() - started)
+                batch_journal.record(self.journal_id, task.index, "completed", file_path=task.file_path)
+                await self._trigger_instant_upload(task)
+
+        except asyncio.CancelledError:
+            # Subprocesses were killed with the cancellation; clear their leftovers
+            task.status = "cancelled"
+            task.error_message = task.token.reason or "cancelled"
+            # A restart keeps .part/.aria2 files so the resumed download continues them
+            if not self.draining:
+                self._remove_partials(task)
+            # Only this item was cancelled (its token is set, the batch's is not):
+            # swallow it so the worker keeps going
+            if self.token.cancelled or not task.token.cancelled:
+                raise
 
-                finally:
-                    self.stats['active_downloads'] -= 1
+        except Exception as e:
+            task.status = "failed"
+            task.error_message = str(e)
+            self.stats['failed'] += 1
+            await self._send_error_message(task, str(e))
+
+        finally:
+            task.token.detach(worker)
+            task.token.close()
+            self.stats['active_downloads'] -= 1
+            pulled = task.file_size or (task.progress.downloaded_bytes if task.progress else 0)
+            if task.charged:
+                quota_tracker.record(self._owner_id(), nbytes=pulled)
+            if not task.fast_lane:
+                self.bytes_downloaded += pulled
+            self.active_downloads.pop(task.index, None)
+            host_limiter.release(task.host, success=None if task.status == "cancelled" else task.status == "completed")
+            # Failed tasks leave a tombstone so later uploads are not held back
+            if task.status != "completed":
+                batch_journal.record(self.journal_id, task.index, task.status, error=task.error_message)
+                self.upload_buffer.skip(task.index)
+            self._settle_copies(task)
+
+    async def _concurrency_controller(self):
+        """Periodically resize the download limit from throughput, failures and upload depth"""
+        interval = max(1, bot_config.config.concurrency_adjust_interval)
+        while True:
+            total = self.bytes_downloaded + sum(
+                task.progress.downloaded_bytes for task in list(self.active_downloads.values())
+                if task.progress and not task.fast_lane
+            )
+            previous = self.concurrency.limit
+            reason = await self.concurrency.adjust(total, self.upload_buffer.pending)
+            if reason:
+                print(f"⚙️ Download concurrency {previous} → {self.concurrency.limit} ({reason})")
+            self.stats['concurrency'] = self.concurrency.limit
+            self.stats['peak_concurrency'] = self.concurrency.peak
+            await asyncio.sleep(interval)
+
+    async def _wait_for_quota(self):
+        """Defer the next download while the batch owner is over their hourly or daily quota
+
+        Nothing is counted here: the item is charged in _charge_quota once
+        it turns out to need a real download.
+        """
+        if not bot_config.config.batch_quota:
+            return
+
+        def deferred(delay: float):
+            self.stats['quota_wait'] = delay
+
+        waited = await quota_tracker.admit(self._owner_id(), on_wait=deferred, charge=False)
+        if waited:
+            self.stats['quota_wait'] = 0.0
+            self.stats['quota_deferred'] += 1
+            print(f"🧮 Download for user {self._owner_id()} deferred {waited:.0f}s by quota")
+
+    def _charge_quota(self, task: DownloadTask):
+        """Count an item that is really downloaded against the batch owner's quota"""
+        if bot_config.config.batch_quota:
+            quota_tracker.record(self._owner_id(), items=1)
+            task.charged = True
+
+    async def _wait_for_capacity(self, task: DownloadTask):
+        """Pause while the upload backlog or memory is over budget
+
+        The index the upload worker needs next is never held back, otherwise
+        the backlog could not drain.
+        """
+        paused = await backpressure.wait(bypass=lambda: task.index <= self.upload_buffer.next_index)
+        if paused:
+            self.stats['paused_seconds'] += paused
+            print(f"⏸️ Download {task.index} waited {paused:.1f}s for uploads to catch up")
+
+    def _format_progress(self, task: DownloadTask) -> str:
+        """One status line for an active download"""
+        label = f"`{str(task.index).zfill(3)}` {task.name[:30]}"
+        progress = task.progress
+        if progress is None:
+            return f"• {label} — starting..."
+
+        parts = []
+        if progress.percent is not None:
+            parts.append(f"{progress.percent:.1f}%")
+        done = helper.human_readable_size(progress.downloaded_bytes)
+        parts.append(f"{done} / {helper.human_readable_size(progress.total_bytes)}" if progress.total_bytes else done)
+        if progress.speed:
+            parts.append(f"{helper.human_readable_size(progress.speed)}/s")
+        if progress.eta is not None:
+            parts.append(f"ETA {progress.eta}s")
+        if progress.fragment_count:
+            parts.append(f"frag {progress.fragment_index}/{progress.fragment_count}")
+        if progress.connections:
+            parts.append(f"CN {progress.connections}")
+        return f"• {label} — {' | '.join(parts)}"
+
+    async def _progress_reporter(self, interval: int = 15):
+        """Periodically edit the status message with live progress of active downloads"""
+        last_text = None
+        while True:
+            await asyncio.sleep(interval)
+            active = sorted(self.active_downloads.values(), key=lambda t: t.index)
+            text = (
+                f"__**🎯Target Batch : {self.config.get('batch_name', 'Unknown')}**__\n\n"
+                f"**📥 Downloaded:** {self.stats['downloaded']}/{self.stats['total']}  "
+                f"**📤 Uploaded:** {self.stats['uploaded']}  **❌ Failed:** {self.stats['failed']}  "
+                f"**⚙️ Parallel:** {self.concurrency.active}/{self.concurrency.limit}\n\n"
+                + "\n".join(self._format_progress(task) for task in active)
+            )
+            if self.stats['quota_wait']:
+                text += (
+                    f"\n\n🧮 Download quota reached: the batch continues in "
+                    f"~{int(self.stats['quota_wait'] // 60) + 1} min"
+                )
+            reason = backpressure.over_limit()
+            if reason:
+                text += (
+                    f"\n\n⏸️ Downloads paused ({reason}): "
+                    f"{helper.human_readable_size(backpressure.backlog_bytes)} waiting for upload"
+                )
+            if text == last_text:
+                continue
+            try:
+                await self.status_message.edit(text)
+                last_text = text
+            except Exception as e:
+                print(f"⚠️ Failed to update progress message: {e}")
+
+    def _parse_link(self, task: DownloadTask):
+        """Extract URL and name from link data (same logic as original)"""
+        if not task.link_data or len(task.link_data) < 2:
+            raise Exception(f"Invalid link data at index {task.index}")
+
+        link_protocol = task.link_data[0] if task.link_data[0] else "https"
+        link_url = task.link_data[1] if task.link_data[1] else ""
+
+        if not link_url:
+            raise Exception(f"Empty URL at index {task.index}")
+
+        # Links are cleaned when the file is parsed; journals written before that are cleaned here
+        task.original_url = "https://" + clean_link(link_url)
+        task.url = task.original_url
+
+        name1 = link_protocol.replace("(", "[").replace(")", "]").replace("_", "").replace("\t", "").replace(":", "").replace("/", "").replace("+", "").replace("#", "").replace("|", "").replace("@", "").replace("*", "").replace(".", "").replace("https", "").replace("http", "").strip()
+        task.name = f'{name1[:60]}' if name1 else f'file_{task.index}'
 
     async def _process_download_task(self, task: DownloadTask):
         """Process individual download task with retry logic"""
-        # Extract URL and name from link data (same logic as original)
         try:
-            if not task.link_data or len(task.link_data) < 2:
-                raise Exception(f"Invalid link data at index {task.index}")
+            self._parse_link(task)
+            url = task.url
 
-            link_protocol = task.link_data[0] if task.link_data[0] else "https"
-            link_url = task.link_data[1] if task.link_data[1] else ""
-
-            if not link_url:
-                raise Exception(f"Empty URL at index {task.index}")
-
-            # URL processing (same as original)
-            Vxy = link_url.replace("file/d/","uc?export=download&id=").replace("www.youtube-nocookie.com/embed", "youtu.be").replace("?modestbranding=1", "").replace("/view?usp=sharing","")
-            url = "https://" + Vxy
-            task.original_url = "https://" + Vxy
-            task.url = url
+            # Reuse the complete file an interrupted run already downloaded
+            if task.resume_path and (task.resume_path == "zip_handled" or os.path.exists(task.resume_path)):
+                task.file_path = task.resume_path
+                task.status = "completed"
+                self.stats['downloaded'] += 1
+                self.completed_downloads[task.index] = task
+                return
 
-            name1 = link_protocol.replace("(", "[").replace(")", "]").replace("_", "").replace("\t", "").replace(":", "").replace("/", "").replace("+", "").replace("#", "").replace("|", "").replace("@", "").replace("*", "").replace(".", "").replace("https", "").replace("http", "").strip()
-            task.name = f'{name1[:60]}' if name1 else f'file_{task.index}'
+            # Published before by any batch: resend by file_id, no download or upload
+            task.cached = await file_cache.get(task.original_url, *self._cache_key(task))
+            if task.cached:
+                task.file_path = task.cached.file_name
+                task.status = "completed"
+                self.stats['downloaded'] += 1
+                self.stats['cache_hits'] += 1
+                self.completed_downloads[task.index] = task
+                return
 
-            # Apply URL transformations (same as original)
-            url = await self._apply_url_transformations(url)
-            task.url = url
+            # Another batch downloading the same item right now shares its file
+            if await self._follow_flight(task):
+                return
 
-            # Download with retry logic
-            task.status = "downloading"
-            success, result = await self._download_with_retry(task)
+            success = False
+            try:
+                # Apply URL transformations (same as original)
+                url = await self._apply_url_transformations(url)
+                task.url = url
+
+                # Download with retry logic
+                task.status = "downloading"
+                self._charge_quota(task)
+                success, result = await self._download_with_retry(task)
+            finally:
+                if success:
+                    single_flight.land(task.flight, result)
+                else:
+                    single_flight.abort(task.flight)
 
             if success:
                 task.file_path = result
@@ -1225,69 +1917,96 @@ class ConcurrentDownloadUploadManager:
 
     async def _trigger_instant_upload(self, task: DownloadTask):
         """Trigger instant upload when download completes"""
-        # Add to upload queue immediately
-        await self.upload_queue.put(task)
+        # Start pushing the file parts right away; publishing still waits for its turn
+        local_file = task.file_path != "zip_handled" and task.cached is None
+        if local_file and file_cache.enabled:
+            # The same bytes published under another URL are sent by file_id instead of uploaded
+            try:
+                task.digest = await file_cache.digest(task.file_path)
+                task.cached = await file_cache.get_content(task.digest)
+            except Exception as e:
+                # Dedup is an optimization: the item is uploaded as usual
+                task.digest = None
+                print(f"⚠️ Could not hash {task.file_path}: {e}")
+            if task.cached:
+                self.stats['duplicates'] += 1
+
+        if self.pre_uploader.enabled and local_file and task.cached is None:
+            task.pre_upload = asyncio.create_task(self._prepare_upload(task))
+
+        if local_file:
+            task.file_size = backpressure.file_size(task.file_path)
+            backpressure.add(task.file_size)
+            self.stats['backlog_bytes'] = backpressure.backlog_bytes
+
+        # Hand over to the reorder buffer; the upload worker wakes when its turn comes
+        self.upload_buffer.put(task.index, task)
+
+    async def _prepare_upload(self, task: DownloadTask):
+        """Save the file parts on Telegram ahead of the ordered publish"""
+        path = task.file_path
+
+        if ".pdf" in path or path.endswith(".html") or any(ext in path for ext in [".mp3", ".wav", ".m4a"]):
+            return await self.pre_uploader.prepare(task.index, "document", path)
+        elif any(ext in path for ext in [".jpg", ".jpeg", ".png"]):
+            return await self.pre_uploader.prepare(task.index, "photo", path)
+
+        # Video files get the same thumbnail and duration as helper.send_vid
+        thumb = self.config.get('thumb', '/d')
+        if thumb == "/d":
+            thumb = await helper.generate_thumbnail(path)
+        try:
+            dur = int(await helper.get_duration(path))
+        except Exception:
+            dur = 0
+
+        return await self.pre_uploader.prepare(
+            task.index, "video", path, thumb_path=thumb,
+            duration=dur, width=1280, height=720
+        )
 
     async def _upload_worker(self):
         """Worker that handles sequential uploads maintaining order"""
         while True:
-            # Get next task from upload queue
-            task = await self.upload_queue.get()
+            # Waits until the next index is ready (failed indices are skipped)
+            task = await self.upload_buffer.get()
 
-            # Check for sentinel value (end of processing)
+            # Buffer drained and closed (end of processing)
             if task is None:
                 break
 
-            async with self.upload_lock:
-                # Check if this is the next expected sequence
-                if task.index == self.upload_sequence:
-                    await self._upload_task(task)
-                    self.upload_sequence += 1
-
-                    # Check if any queued tasks can now be uploaded
-                    await self._process_queued_uploads()
-                else:
-                    # Not the right sequence, put back in queue
-                    await self.upload_queue.put(task)
-                    await asyncio.sleep(0.1)  # Small delay to prevent busy waiting
-
-    async def _process_queued_uploads(self):
-        """Process any queued uploads that are now in sequence"""
-        uploaded_any = True
-        while uploaded_any:
-            uploaded_any = False
-
-            # Check if next sequence is available
-            if self.upload_sequence in self.completed_downloads:
-                task = self.completed_downloads[self.upload_sequence]
-                if task.status == "completed":
+            try:
+                async with self.upload_lock:
                     await self._upload_task(task)
-                    self.upload_sequence += 1
-                    uploaded_any = True
+            finally:
+                # The file is gone (or given up on); let paused downloads continue
+                backpressure.remove(task.file_size)
+                self.stats['backlog_bytes'] = backpressure.backlog_bytes
+                self.completed_downloads.pop(task.index, None)
 
     async def _apply_url_transformations(self, url: str) -> str:
         """Apply URL transformations (same logic as original)"""
         # Vision IAS transformation
         if "visionias" in url:
-            async with ClientSession() as session:
-                async with session.get(url, headers={
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                    'Cache-Control': 'no-cache',
-                    'Connection': 'keep-alive',
-                    'Pragma': 'no-cache',
-                    'Referer': 'http://www.visionias.in/',
-                    'Sec-Fetch-Dest': 'iframe',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'cross-site',
-                    'Upgrade-Insecure-Requests': '1',
-                    'User-Agent': 'Mozilla/5.0 (Linux; Android 12; RMX2121) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Mobile Safari/537.36',
-                    'sec-ch-ua': '"Chromium";v="107", "Not=A?Brand";v="24"',
-                    'sec-ch-ua-mobile': '?1',
-                    'sec-ch-ua-platform': '"Android"',
-                }) as resp:
-                    text = await resp.text()
-                    url = re.search(r"(https://.*?playlist.m3u8.*?)\"", text).group(1)
+            session = await http_session.get()
+            async with session.get(url, headers={
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9',
+                'Accept-Language': 'en-US,en;q=0.9',
+                'Cache-Control': 'no-cache',
+                'Connection': 'keep-alive',
+                'Pragma': 'no-cache',
+                'Referer': 'http://www.visionias.in/',
+                'Sec-Fetch-Dest': 'iframe',
+                'Sec-Fetch-Mode': 'navigate',
+                'Sec-Fetch-Site': 'cross-site',
+                'Upgrade-Insecure-Requests': '1',
+                'User-Agent': 'Mozilla/5.0 (Linux; Android 12; RMX2121) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Mobile Safari/537.36',
+                'sec-ch-ua': '"Chromium";v="107", "Not=A?Brand";v="24"',
+                'sec-ch-ua-mobile': '?1',
+                'sec-ch-ua-platform': '"Android"',
+            }) as resp:
+                text = await resp.text()
+                url = re.search(r"(https://.*?playlist.m3u8.*?)\"", text).group(1)
 
         # ClassPlus transformations
         if "https://cpvod.testbook.com/" in url:
@@ -1307,14 +2026,18 @@ class ConcurrentDownloadUploadManager:
                 'accept-encoding': 'gzip'
             }
             params = (('url', f'{url}'))
-            response = requests.get('https://api.classplusapp.com/cams/uploader/video/jw-signed-url', headers=headers, params=params)
-            url = response.json()['url']
+            session = await http_session.get()
+            async with session.get('https://api.classplusapp.com/cams/uploader/video/jw-signed-url', headers=headers, params=[params]) as response:
+                url = (await response.json(content_type=None))['url']
         elif 'videos.classplusapp' in url or "tencdn.classplusapp" in url or "webvideos.classplusapp.com" in url:
-            url = requests.get(f'https://api.classplusapp.com/cams/uploader/video/jw-signed-url?url={url}', headers={'x-access-token': f'{token_cp}'}).json()['url']
+            session = await http_session.get()
+            async with session.get(f'https://api.classplusapp.com/cams/uploader/video/jw-signed-url?url={url}', headers={'x-access-token': f'{token_cp}'}) as response:
+                url = (await response.json(content_type=None))['url']
         elif 'media-cdn.classplusapp.com' in url or 'media-cdn-alisg.classplusapp.com' in url or 'media-cdn-a.classplusapp.com' in url:
             headers = {'x-access-token': f'{token_cp}', "X-CDN-Tag": "empty"}
-            response = requests.get(f'https://api.classplusapp.com/cams/uploader/video/jw-signed-url?url={url}', headers=headers)
-            url = response.json()['url']
+            session = await http_session.get()
+            async with session.get(f'https://api.classplusapp.com/cams/uploader/video/jw-signed-url?url={url}', headers=headers) as response:
+                url = (await response.json(content_type=None))['url']
         elif "childId" in url and "parentId" in url:
             url = f"https://anonymousrajputplayer-9ab2f2730a02.herokuapp.com/pw?url={url}&token={self.config.get('pw_token', '')}"
         elif "d1d34p8vz63oiq" in url or "sec1.pw.live" in url:
@@ -1332,41 +2055,43 @@ class ConcurrentDownloadUploadManager:
         """Download with retry logic maintaining original 3-retry system"""
         url = task.url
         name = task.name
+        # Parsed yt-dlp/aria2c output lands on task.progress as it happens
+        progress = ProgressTracker(on_event=lambda event: setattr(task, 'progress', event))
 
         # Determine download type and use appropriate retry function
         if "drive" in url:
-            return await retry_drive_download(url, name)
+            return await retry_drive_download(url, name, progress=progress)
         elif ".pdf" in url:
-            return await retry_pdf_download_enhanced(url, name, self.message)
+            return await retry_pdf_download_enhanced(url, name, self.message, progress=progress)
         elif ".ws" in url and url.endswith(".ws"):
-            return await retry_ws_download(url, name)
+            return await retry_ws_download(url, name, progress=progress)
         elif ".zip" in url:
             # Handle ZIP files (no actual download, just return success)
             return True, "zip_handled"
         elif any(ext in url for ext in [".jpg", ".jpeg", ".png"]):
-            return await retry_media_download(url, name, "image")
+            return await retry_media_download(url, name, "image", progress=progress)
         elif any(ext in url for ext in [".mp3", ".wav", ".m4a"]):
-            return await retry_media_download(url, name, "audio")
+            return await retry_media_download(url, name, "audio", progress=progress)
         elif 'encrypted.m' in url:
             appxkey = url.split('*')[1] if '*' in url else ""
             url = url.split('*')[0] if '*' in url else url
             cmd = self._build_download_command(url, name)
-            return await retry_encrypted_download(url, cmd, name, appxkey)
+            return await retry_encrypted_download(url, cmd, name, appxkey, progress=progress)
         elif 'drmcdni' in url or 'drm/wv' in url:
             # Handle DRM content
-            mpd, keys = helper.get_mps_and_keys(url)
+            mpd, keys = await helper.get_mps_and_keys(url)
             if not mpd or not keys:
                 return False, "Failed to get MPD or keys from API"
             keys_string = " ".join([f"--key {key}" for key in keys])
-            return await retry_drm_download(mpd, keys_string, self.config.get('path', './downloads'), name, self.config.get('quality', '720'))
+            return await retry_drm_download(mpd, keys_string, self.config.get('path', './downloads'), name, self.config.get('quality', '720'), progress=progress)
         elif url.endswith('.m3u8') or 'classplusapp.com' in url:
             # Handle HLS streams and ClassPlus URLs specifically
             cmd = self._build_download_command(url, name)
-            return await retry_hls_download(url, cmd, name)
+            return await retry_hls_download(url, cmd, name, progress=progress)
         else:
             # Regular video download
             cmd = self._build_download_command(url, name)
-            return await retry_video_download(url, cmd, name)
+            return await retry_video_download(url, cmd, name, progress=progress)
 
     def _build_download_command(self, url: str, name: str) -> str:
         """Build download command based on URL type"""
@@ -1409,26 +2134,43 @@ class ConcurrentDownloadUploadManager:
             # Upload file and get the message
             uploaded_message = None
 
-            # Handle different file types
-            if task.file_path == "zip_handled":
-                # Handle ZIP files with inline button
-                BUTTONSZIP = InlineKeyboardMarkup([[InlineKeyboardButton(text="🎥 ZIP STREAM IN PLAYER", url=f"{task.url}")]])
-                uploaded_message = await self.bot.send_photo(chat_id=self.message.chat.id, photo=photozip, caption=cc, reply_markup=BUTTONSZIP)
-            elif ".pdf" in task.file_path:
-                uploaded_message = await self.bot.send_document(chat_id=self.message.chat.id, document=task.file_path, caption=cc)
-                os.remove(task.file_path)
-            elif any(ext in task.file_path for ext in [".jpg", ".jpeg", ".png"]):
-                uploaded_message = await self.bot.send_photo(chat_id=self.message.chat.id, photo=task.file_path, caption=cc)
-                os.remove(task.file_path)
-            elif any(ext in task.file_path for ext in [".mp3", ".wav", ".m4a"]):
-                uploaded_message = await self.bot.send_document(chat_id=self.message.chat.id, document=task.file_path, caption=cc)
-                os.remove(task.file_path)
-            elif task.file_path.endswith(".html"):
-                uploaded_message = await self.bot.send_document(chat_id=self.message.chat.id, document=task.file_path, caption=cc)
-                os.remove(task.file_path)
+            if task.primary is not None and task.file_path != "zip_handled":
+                # Same link earlier in this batch: send what it was published as
+                task.cached = task.primary.published
+                if task.cached is None:
+                    raise Exception(f"same link as {str(task.primary.index).zfill(3)}, which was not uploaded")
+
+            if task.cached is None and task.local_copy:
+                # An earlier item of this batch may have published the same bytes meanwhile
+                if task.digest:
+                    task.cached = await file_cache.get_content(task.digest)
+                if task.cached is None and task.flight is not None:
+                    # ...or the batch this download was shared with
+                    task.cached = task.flight.published
+                if task.cached:
+                    self.stats['duplicates'] += 1
+                    if task.pre_upload is not None:
+                        task.pre_upload.cancel()
+                        task.pre_upload = None
+
+            if task.cached is not None:
+                uploaded_message = await self._send_cached(task, cc)
+            elif task.pre_upload is not None:
+                uploaded_message = await self._publish_pre_uploaded(task, cc)
             else:
-                # Video files
-                uploaded_message = await helper.send_vid(self.bot, self.message, cc, task.file_path, self.config.get('thumb', '/d'), task.name, None)
+                uploaded_message = await self._send_file(task, cc)
+
+            # Later requests for the same item or the same bytes are resent by file_id
+            if task.file_path != "zip_handled":
+                file_name = os.path.basename(task.file_path)
+                if task.copies:
+                    task.published = cached_file(uploaded_message, file_name)
+                if task.flight is not None and task.cached is None:
+                    task.flight.published = cached_file(uploaded_message, file_name)
+                if task.cached is None or task.local_copy:
+                    await file_cache.put(task.original_url, *self._cache_key(task), uploaded_message, file_name)
+                if task.cached is None and task.digest:
+                    await file_cache.put_content(task.digest, uploaded_message, file_name)
 
             # Log to log channels if upload was successful
             if uploaded_message and log_service.enabled:
@@ -1454,15 +2196,91 @@ class ConcurrentDownloadUploadManager:
 
             task.status = "uploaded"
             self.stats['uploaded'] += 1
+            batch_journal.record(self.journal_id, task.index, "uploaded",
+                                 message_id=getattr(uploaded_message, 'id', None))
+            if uploaded_message and bot_config.config.batch_replay:
+                # Submitting this list again forwards the message instead
+                batch_journal.archive(item_fingerprint(task.link_data, self.config.get('quality', '')),
+                                      self.message.chat.id, uploaded_message.id)
 
         except Exception as e:
             task.status = "upload_failed"
             task.error_message = f"Upload failed: {str(e)}"
+            batch_journal.record(self.journal_id, task.index, "upload_failed", error=task.error_message)
             await self._send_error_message(task, f"Upload failed: {str(e)}")
 
         finally:
             self.stats['uploading'] = False
 
+    async def _send_file(self, task: DownloadTask, cc: str):
+        """Upload and send the file in one step"""
+        uploaded_message = None
+
+        # Handle different file types
+        if task.file_path == "zip_handled":
+            # Handle ZIP files with inline button
+            BUTTONSZIP = InlineKeyboardMarkup([[InlineKeyboardButton(text="🎥 ZIP STREAM IN PLAYER", url=f"{task.url}")]])
+            uploaded_message = await self.bot.send_photo(chat_id=self.message.chat.id, photo=photozip, caption=cc, reply_markup=BUTTONSZIP)
+        elif ".pdf" in task.file_path:
+            uploaded_message = await self.bot.send_document(chat_id=self.message.chat.id, document=task.file_path, caption=cc)
+            os.remove(task.file_path)
+        elif any(ext in task.file_path for ext in [".jpg", ".jpeg", ".png"]):
+            uploaded_message = await self.bot.send_photo(chat_id=self.message.chat.id, photo=task.file_path, caption=cc)
+            os.remove(task.file_path)
+        elif any(ext in task.file_path for ext in [".mp3", ".wav", ".m4a"]):
+            uploaded_message = await self.bot.send_document(chat_id=self.message.chat.id, document=task.file_path, caption=cc)
+            os.remove(task.file_path)
+        elif task.file_path.endswith(".html"):
+            uploaded_message = await self.bot.send_document(chat_id=self.message.chat.id, document=task.file_path, caption=cc)
+            os.remove(task.file_path)
+        else:
+            # Video files
+            uploaded_message = await helper.send_vid(self.bot, self.message, cc, task.file_path, self.config.get('thumb', '/d'), task.name, None)
+
+        return uploaded_message
+
+    async def _send_cached(self, task: DownloadTask, cc: str):
+        """Send an item by its cached file_id
+
+        A duplicate whose file is still on disk falls back to a real upload
+        when the file_id no longer works; a URL cache hit has no file to fall
+        back to, so it fails and the next request downloads it again.
+        """
+        try:
+            uploaded_message = await file_cache.send(self.bot, self.message.chat.id, task.cached, cc)
+        except Exception as e:
+            if not task.local_copy:
+                await file_cache.invalidate(task.original_url)
+                raise
+            if task.digest:
+                await file_cache.invalidate_content(task.digest)
+            print(f"⚠️ Cached copy of {task.index} is gone, uploading it: {e}")
+            task.cached = None
+            return await self._send_file(task, cc)
+
+        if task.local_copy:
+            self._remove_file(task.file_path)
+        return uploaded_message
+
+    async def _publish_pre_uploaded(self, task: DownloadTask, cc: str):
+        """Publish a file whose parts were pushed to Telegram ahead of its turn"""
+        try:
+            prepared = await task.pre_upload
+        except Exception as e:
+            print(f"⚠️ Pre-upload failed for {task.index}, uploading directly: {e}")
+            return await self._send_file(task, cc)
+
+        try:
+            return await self.pre_uploader.publish(self.message.chat.id, prepared, cc)
+        finally:
+            # Only delete the thumbnail if it was generated for this file
+            cleanup = [prepared.path]
+            if prepared.thumb_path == f"{prepared.path}.jpg":
+                cleanup.append(prepared.thumb_path)
+            for path in cleanup:
+                if os.path.exists(path):
+                    os.remove(path)
+
     def _build_caption(self, task: DownloadTask) -> str:
         """Build caption for uploaded file"""
         config = self.config
@@ -1499,77 +2317,76 @@ class ConcurrentDownloadUploadManager:
         )
 
 # Add missing helper functions for the enhanced system
-async def retry_drive_download(url, name, max_retries=3):
+async def retry_drive_download(url, name, max_retries=3, progress=None):
     """Retry Google Drive downloads"""
     for attempt in range(max_retries):
         try:
-            cmd = f'yt-dlp -o "{name}.%(ext)s" "{url}" -R 25 --fragment-retries 25'
-            result = os.system(cmd)
-            if result == 0:
+            result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.%(ext)s", url, "-R", "25", "--fragment-retries", "25"], progress=progress)
+            if result.ok:
                 # Find the downloaded file
                 for ext in ['.pdf', '.mp4', '.mkv', '.webm']:
                     if os.path.exists(f"{name}{ext}"):
                         return True, f"{name}{ext}"
                 return False, "Downloaded file not found"
             else:
-                raise Exception(f"Command failed with code {result}")
+                raise Exception(f"Command {result.reason}")
         except Exception as e:
             if attempt == max_retries - 1:
                 return False, str(e)
             await asyncio.sleep(2 ** attempt)
     return False, "Max retries exceeded"
 
-async def retry_pdf_download_enhanced(url, name, message, max_retries=3):
+async def retry_pdf_download_enhanced(url, name, message, max_retries=3, progress=None):
     """Enhanced PDF download with retry logic"""
     for attempt in range(max_retries):
         try:
             if "cwmediabkt99" in url:
                 await asyncio.sleep(2 ** attempt)
                 url_clean = url.replace(" ", "%20")
-                scraper = cloudscraper.create_scraper()
-                response = scraper.get(url_clean)
-
-                if response.status_code == 200:
-                    with open(f'{name}.pdf', 'wb') as file:
-                        file.write(response.content)
-                    return True, f'{name}.pdf'
-                else:
-                    raise Exception(f"HTTP {response.status_code}: {response.reason}")
+                await helper.scraper_download(url_clean, f'{name}.pdf')
+                return True, f'{name}.pdf'
+            elif url.startswith(("http://", "https://")):
+                await http_downloader.download(url, f'{name}.pdf', progress=progress)
+                return True, f'{name}.pdf'
             else:
-                cmd = f'yt-dlp -o "{name}.pdf" "{url}" -R 25 --fragment-retries 25'
-                result = os.system(cmd)
-                if result == 0:
+                result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.pdf", url, "-R", "25", "--fragment-retries", "25"], progress=progress)
+                if result.ok:
                     return True, f'{name}.pdf'
                 else:
-                    raise Exception(f"yt-dlp failed with code {result}")
+                    raise Exception(f"yt-dlp {result.reason}")
         except Exception as e:
             if attempt == max_retries - 1:
                 return False, str(e)
             await asyncio.sleep(2 ** attempt)
     return False, "Max retries exceeded"
 
-async def retry_ws_download(url, name, max_retries=3):
+async def retry_ws_download(url, name, max_retries=3, progress=None):
     """Retry .ws file downloads"""
     for attempt in range(max_retries):
         try:
-            cmd = f'yt-dlp -o "{name}.html" "{url}" -R 25 --fragment-retries 25'
-            result = os.system(cmd)
-            if result == 0:
+            if url.startswith(("http://", "https://")):
+                await http_downloader.download(url, f'{name}.html', progress=progress)
+                return True, f'{name}.html'
+            result = await ytdlp_pool.run(["yt-dlp", "-o", f"{name}.html", url, "-R", "25", "--fragment-retries", "25"], progress=progress)
+            if result.ok:
                 return True, f'{name}.html'
             else:
-                raise Exception(f"Command failed with code {result}")
+                raise Exception(f"Command {result.reason}")
         except Exception as e:
             if attempt == max_retries - 1:
                 return False, str(e)
             await asyncio.sleep(2 ** attempt)
     return False, "Max retries exceeded"
 
-async def retry_hls_download(url, cmd, name, max_retries=3):
+async def retry_hls_download(url, cmd, name, max_retries=3, progress=None):
     """Retry HLS (.m3u8) downloads with enhanced ClassPlus support"""
     for attempt in range(max_retries):
         try:
             # Enhanced command for HLS streams with better error handling
-            if 'classplusapp.com' in url:
+            if aria2_daemon.enabled:
+                # download_video picks the transfer engine; no aria2c per item
+                enhanced_cmd = f'{cmd} --hls-prefer-ffmpeg --no-check-certificate' if 'classplusapp.com' in url else f'{cmd} --hls-prefer-ffmpeg'
+            elif 'classplusapp.com' in url:
                 # Special handling for ClassPlus HLS streams
                 enhanced_cmd = f'{cmd} --hls-prefer-ffmpeg --no-check-certificate --external-downloader aria2c --downloader-args "aria2c: -x 8 -j 8 -s 8"'
             else:
@@ -1577,7 +2394,7 @@ async def retry_hls_download(url, cmd, name, max_retries=3):
                 enhanced_cmd = f'{cmd} --hls-prefer-ffmpeg --external-downloader aria2c --downloader-args "aria2c: -x 16 -j 32"'
 
             print(f"HLS Download attempt {attempt + 1}: {enhanced_cmd}")
-            result = await helper.download_video(url, enhanced_cmd, name)
+            result = await helper.download_video(url, enhanced_cmd, name, progress=progress)
 
             if result:  # Success
                 return True, result
@@ -1593,6 +2410,43 @@ async def retry_hls_download(url, cmd, name, max_retries=3):
     return False, "Max retries exceeded"
 
 # ENHANCED /drm COMMAND WITH CONCURRENT PROCESSING
+def batch_completion_text(final_stats: Dict, b_name: str) -> str:
+    """Completion message with detailed statistics for a finished batch"""
+    notes = f"♻️ **Already Uploaded Before Restart:** {final_stats['resumed']}\n" if final_stats['resumed'] else ""
+    if final_stats['quota_deferred']:
+        notes += f"🧮 **Deferred By Quota:** {final_stats['quota_deferred']}\n"
+    if final_stats['cache_hits']:
+        notes += f"⚡ **Resent From Cache:** {final_stats['cache_hits']}\n"
+    if final_stats['duplicates']:
+        notes += f"🧬 **Duplicates Not Re-uploaded:** {final_stats['duplicates']}\n"
+    if final_stats['coalesced']:
+        notes += f"🔗 **Shared With Another Batch:** {final_stats['coalesced']}\n"
+    if final_stats['collapsed']:
+        notes += f"🪞 **Repeated Links Downloaded Once:** {final_stats['collapsed']}\n"
+    if final_stats['replayed']:
+        notes += f"📨 **Forwarded From An Earlier Run:** {final_stats['replayed']}\n"
+    if final_stats['drained']:
+        return (
+            f"⏸️ **BATCH PAUSED FOR A BOT RESTART** ⏸️\n\n"
+            f"📤 **Uploaded So Far:** {final_stats['uploaded']}/{final_stats['total']}\n"
+            f"✨ **BATCH NAME:** `{b_name}`\n\n"
+            f"You will be offered to resume it once the bot is back; finished downloads are reused."
+        )
+    title = "⛔ **BATCH CANCELLED** ⛔" if final_stats['cancelled'] else "📊 **CONCURRENT BATCH PROCESSING COMPLETED** 📊"
+    return (
+        f"{title}\n\n"
+        f"✅ **Successful Downloads:** {final_stats['downloaded']}\n"
+        f"📤 **Successful Uploads:** {final_stats['uploaded']}\n"
+        f"❌ **Failed Downloads:** {final_stats['failed']}\n"
+        f"📊 **Total Processed:** {final_stats['total']}\n"
+        f"📈 **Success Rate:** {(final_stats['downloaded']/final_stats['total'])*100:.1f}%\n"
+        f"⏸️ **Paused For Uploads:** {int(final_stats['paused_seconds'])}s\n"
+        f"{notes}\n"
+        f"⚡ **Processing Method:** Adaptive Concurrent Downloads (peak {final_stats['peak_concurrency']}) + Instant Sequential Uploads\n"
+        f"✨ **BATCH NAME:** `{b_name}`\n\n"
+        f"⋅ ─ ENHANCED CONCURRENT PROCESSING WITH 3-RETRY LOGIC ─ ⋅"
+    )
+
 @bot.on_message(filters.command(["drm"]))
 async def txt_handler_with_concurrent_processing(bot: Client, m: Message):
     # Enhanced authorization check - support both users and channels
@@ -1609,6 +2463,15 @@ async def txt_handler_with_concurrent_processing(bot: Client, m: Message):
     if not is_authorized:
         return await m.reply_text(f"❌ You are not authorized to use this command. Contact the bot owner {OWNER_USERNAME} for access.")
 
+    if not ConcurrentDownloadUploadManager.accepting:
+        return await m.reply_text("♻️ The bot is restarting. Send /drm again in a minute.")
+
+    # The questions and the batch run as a background job so this handler
+    # worker is free again for everyone else's commands
+    job_runner.submit(drm_job(bot, m), "drm", chat_id=m.chat.id, user_id=m.from_user.id if m.from_user else None)
+
+async def drm_job(bot: Client, m: Message):
+    """Ask for the batch options, then download and upload the whole batch"""
     # Initialize the concurrent download-upload manager
     manager = ConcurrentDownloadUploadManager(bot, m)
 
@@ -1650,8 +2513,9 @@ async def txt_handler_with_concurrent_processing(bot: Client, m: Message):
             if i and "://" in i:  # Check if line is not empty
                 split_result = i.split("://", 1)
                 if len(split_result) >= 2:  # Ensure split was successful
-                    url = split_result[1]
-                    links.append(split_result)
+                    # Rewritten and stripped of tracking parameters, so repeats compare equal
+                    url = clean_link(split_result[1])
+                    links.append([split_result[0], url])
                     if ".pdf" in url:
                         pdf_count += 1
                     elif url.endswith((".png", ".jpeg", ".jpg")):
@@ -1768,14 +2632,17 @@ async def txt_handler_with_concurrent_processing(bot: Client, m: Message):
     if input6.photo:
         thumb = await input6.download()
     elif raw_text6.startswith("http://") or raw_text6.startswith("https://"):
-        getstatusoutput(f"wget '{raw_text6}' -O 'thumb.jpg'")
+        await process_supervisor.run(["wget", raw_text6, "-O", "thumb.jpg"])
         thumb = "thumb.jpg"
     else:
         thumb = raw_text6
     await editable.delete()
 
+    if not ConcurrentDownloadUploadManager.accepting:
+        return await m.reply_text("♻️ The bot is restarting. Send /drm again in a minute.")
+
     # Start concurrent processing
-    progress_msg = await m.reply_text(f"__**🎯Target Batch : {b_name}**__\n\n**🚀 Starting Concurrent Processing...**\n**📥 Downloads: 5 simultaneous**\n**📤 Uploads: Instant sequential**")
+    progress_msg = await m.reply_text(f"__**🎯Target Batch : {b_name}**__\n\n**🚀 Starting Concurrent Processing...**\n**📥 Downloads: adaptive, shared fairly with other batches**\n**📤 Uploads: Instant sequential**")
 
     # Prepare configuration for the manager
     config = {
@@ -1786,25 +2653,16 @@ async def txt_handler_with_concurrent_processing(bot: Client, m: Message):
         'pw_token': raw_text4,
         'thumb': thumb,
         'path': path,
-        'start_index': int(raw_text)
+        'start_index': int(raw_text),
+        'user_id': original_user_id
     }
 
     try:
         # Process batch with concurrent downloads and instant uploads
-        final_stats = await manager.process_batch(links, int(raw_text), config)
+        final_stats = await manager.process_batch(links, int(raw_text), config, status_message=progress_msg)
 
         # Enhanced completion message with detailed statistics
-        await progress_msg.edit(
-            f"📊 **CONCURRENT BATCH PROCESSING COMPLETED** 📊\n\n"
-            f"✅ **Successful Downloads:** {final_stats['downloaded']}\n"
-            f"📤 **Successful Uploads:** {final_stats['uploaded']}\n"
-            f"❌ **Failed Downloads:** {final_stats['failed']}\n"
-            f"📊 **Total Processed:** {final_stats['total']}\n"
-            f"📈 **Success Rate:** {(final_stats['downloaded']/final_stats['total'])*100:.1f}%\n\n"
-            f"⚡ **Processing Method:** 5 Concurrent Downloads + Instant Sequential Uploads\n"
-            f"✨ **BATCH NAME:** `{b_name}`\n\n"
-            f"⋅ ─ ENHANCED CONCURRENT PROCESSING WITH 3-RETRY LOGIC ─ ⋅"
-        )
+        await progress_msg.edit(batch_completion_text(final_stats, b_name))
 
         # Log batch summary to log channels
         if log_service.enabled:
@@ -1833,6 +2691,101 @@ async def txt_handler_with_concurrent_processing(bot: Client, m: Message):
         await progress_msg.edit(f"❌ **Batch processing failed:** {str(e)}")
         await m.reply_text(f"⚠️ **Error in concurrent processing:** {str(e)}")
 
+@bot.on_callback_query(filters.regex(r"^(resume|discard)_batch:(\d+)$"))
+async def resume_batch_handler(bot: Client, query: CallbackQuery):
+    """Resume or drop a batch interrupted by a crash or restart"""
+    action, batch_id = query.matches[0].group(1), int(query.matches[0].group(2))
+    batch = batch_journal.load(batch_id)
+    if batch is None:
+        return await query.answer("This batch is no longer available.", show_alert=True)
+    if query.from_user.id != batch['user_id'] and query.from_user.id not in AUTH_USERS:
+        return await query.answer("❌ You are not authorized to manage this batch.", show_alert=True)
+
+    if action == "discard":
+        batch_journal.discard(batch_id)
+        await query.answer("Batch discarded")
+        return await query.message.edit(f"🗑 **Interrupted batch discarded:** `{batch['name']}`")
+
+    if not ConcurrentDownloadUploadManager.accepting:
+        return await query.answer("♻️ The bot is restarting. Try again in a minute.", show_alert=True)
+
+    if any(job.name == f"resume:{batch_id}" for job in job_runner.running()):
+        return await query.answer("This batch is already resuming.")
+
+    await query.answer("Resuming batch")
+    job_runner.submit(resume_job(bot, query.message, batch), f"resume:{batch_id}",
+                      chat_id=batch['chat_id'], user_id=batch['user_id'])
+
+async def resume_job(bot: Client, message: Message, batch: Dict):
+    """Run an interrupted batch again from its journal"""
+    config = batch['config']
+    if config.get('thumb') not in ("/d", None) and not os.path.exists(config['thumb']):
+        # A downloaded thumbnail did not survive the restart
+        config['thumb'] = "/d"
+
+    await message.edit(
+        f"__**🎯Target Batch : {batch['name']}**__\n\n"
+        f"**♻️ Resuming interrupted batch...**\n"
+        f"**⏭ Items already uploaded are skipped**"
+    )
+    manager = ConcurrentDownloadUploadManager(bot, message)
+    try:
+        final_stats = await manager.process_batch(batch['links'], batch['start_index'], config,
+                                                  status_message=message, journal_id=batch['id'])
+        await message.edit(batch_completion_text(final_stats, batch['name']))
+    except Exception as e:
+        await message.edit(f"❌ **Batch processing failed:** {str(e)}")
+
+async def drain_batches(grace: float):
+    """Stop taking batches and let running ones finish uploading within ``grace`` seconds
+
+    Batches still running after the grace period are checkpointed: uploads
+    already published and finished files stay in the journal, downloads in
+    flight keep their partial files, and the batch is offered for resume
+    on the next start.
+    """
+    ConcurrentDownloadUploadManager.accepting = False
+    managers = list(ConcurrentDownloadUploadManager.running)
+    if not managers and not cancel_registry.tokens:
+        return
+    print(f"⏳ Draining {len(managers)} batch(es) for up to {grace}s...")
+    for manager in managers:
+        manager.drain()
+
+    waiters = [asyncio.create_task(manager.finished.wait()) for manager in managers]
+    if waiters:
+        _, pending = await asyncio.wait(waiters, timeout=grace)
+        for waiter in pending:
+            waiter.cancel()
+
+    # Out of time: checkpoint what is left, including /stop-able jobs of other handlers
+    for manager in managers:
+        if not manager.finished.is_set():
+            manager.checkpoint()
+    cancel_registry.cancel(reason="bot restarting")
+    if managers:
+        await asyncio.wait([asyncio.create_task(manager.finished.wait()) for manager in managers], timeout=5)
+    print("✅ Batches drained")
+
+async def offer_batch_resume():
+    """Ask the owners of batches interrupted by a crash or restart whether to resume them"""
+    for batch in batch_journal.interrupted():
+        buttons = InlineKeyboardMarkup([[
+            InlineKeyboardButton("▶️ Resume", callback_data=f"resume_batch:{batch['id']}"),
+            InlineKeyboardButton("🗑 Discard", callback_data=f"discard_batch:{batch['id']}")
+        ]])
+        try:
+            await bot.send_message(
+                batch['chat_id'],
+                f"⚠️ **Batch interrupted by a restart**\n\n"
+                f"✨ **BATCH NAME:** `{batch['name']}`\n"
+                f"📤 **Uploaded:** {batch['uploaded']}/{batch['total']}\n\n"
+                f"Resume to continue where it stopped; finished downloads are reused.",
+                reply_markup=buttons
+            )
+        except Exception as e:
+            print(f"⚠️ Could not offer resume for batch {batch['id']}: {e}")
+
 # Single link text handler with authorization
 @bot.on_message(filters.text & filters.private)
 async def text_handler(bot: Client, m: Message):
@@ -1888,8 +2841,8 @@ if __name__ == "__main__":
                 await initialize_bot_services()
                 bot._services_initialized = True
 
-        # Start the bot normally
-        bot.run()
+        # Start the bot and close shared services on the way out
+        bot.run(run_bot())
     except Exception as e:
         print(f"❌ Failed to start bot: {str(e)}")
         logging.error(f"Failed to start bot: {str(e)}")
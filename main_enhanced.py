@@ -16,6 +16,8 @@ from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from config.settings import config, API_ID, API_HASH, BOT_TOKEN, OWNER, CREDIT
 from database.models import db_manager, user_manager, channel_manager
 from bot.services.log_channel import LogChannelService
+from bot.services.cancellation import cancel_registry
+from bot.services.scheduler import download_scheduler
 from bot.commands.admin import AdminCommands
 from bot.handlers.download_handler import EnhancedDownloadHandler
 from bot.utils.decorators import authorized_only, admin_only, secure_command
@@ -270,6 +272,7 @@ class MedusaBot:
             
             uptime = datetime.now() - self.start_time
             uptime_str = f"{uptime.days}d {uptime.seconds//3600}h {(uptime.seconds//60)%60}m"
+            slots = "".join(f"• {line}\n" for line in download_scheduler.snapshot())
             
             stats_text = (
                 f"📊 **Bot Statistics**\n\n"
@@ -281,6 +284,7 @@ class MedusaBot:
                 f"📥 **Total Downloads:** {self.total_downloads}\n"
                 f"🤖 **Bot Version:** Enhanced v2.0\n"
                 f"💾 **Database:** {'🟢 Connected' if db_manager.pool else '🔴 Disconnected'}\n\n"
+                f"**Download Slots:**\n{slots}\n"
                 f"**System Info:**\n"
                 f"• Python: {sys.version.split()[0]}\n"
                 f"• Platform: {sys.platform}\n"
@@ -394,10 +398,13 @@ class MedusaBot:
     
     async def handle_stop(self, message: Message):
         """Handle stop command"""
-        await message.reply_text("🛑 **Stopping current operations...**")
-        # Cancel active downloads for this user
-        # ... (implement stop logic)
-        await message.reply_text("✅ **Operations stopped successfully.**")
+        # Cancel only this user's batches in this chat; other users keep running
+        tokens = cancel_registry.cancel(chat_id=message.chat.id, user_id=message.from_user.id,
+                                        reason="stopped by user")
+        if not tokens:
+            await message.reply_text("ℹ️ **No running operations to stop.**")
+            return
+        await message.reply_text(f"✅ **Stopped {len(tokens)} running operation(s).**")
     
     async def handle_logs(self, message: Message):
         """Handle logs command"""